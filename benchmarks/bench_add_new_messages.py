@@ -0,0 +1,108 @@
+# benchmarks/bench_add_new_messages.py
+"""
+So sánh cách thêm tin nhắn cũ (SELECT MAX + INSERT từng dòng + UPDATE) với
+câu lệnh bulk APPEND_MESSAGES_SQL khi nhiều luồng cùng ghi vào một phiên.
+
+Đếm số round trip tới database mỗi lượt, thời gian chạy và số messenger_order
+bị trùng. Cần database đã chạy `python -m src.dbtools.migrations`.
+
+    python -m benchmarks.bench_add_new_messages --writers 8 --turns 50
+"""
+import argparse
+import threading
+import time
+
+import psycopg2
+from langchain_core.messages import HumanMessage, AIMessage
+
+from src.core.database import get_db_connection
+from src.core.session_manager import (
+    APPEND_MESSAGES_SQL, append_messages_params, message_type_of, get_or_create_user, create_new_session,
+    delete_session
+)
+
+BENCH_USER = "bench_add_new_messages"
+
+
+def legacy_add_new_messages(conn, session_id, new_messages) -> int:
+    """Cách cũ của add_new_messages. Trả về số round trip đã dùng."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(messenger_order), 0) FROM chat_messenger WHERE session_id = %s;",
+                    (session_id,))
+        last_order = cur.fetchone()[0]
+        for i, msg in enumerate(new_messages):
+            cur.execute(
+                "INSERT INTO chat_messenger (session_id, messenger_type, content, messenger_order) VALUES (%s, %s, %s, %s);",
+                (session_id, message_type_of(msg), msg.content, last_order + i + 1)
+            )
+        cur.execute("UPDATE chat_session SET updated_at = NOW() WHERE id = %s;", (session_id,))
+    conn.commit()
+    return len(new_messages) + 3
+
+
+def bulk_add_new_messages(conn, session_id, new_messages) -> int:
+    """Cách mới: một câu lệnh + commit."""
+    with conn.cursor() as cur:
+        cur.execute(APPEND_MESSAGES_SQL, append_messages_params(session_id, new_messages))
+        cur.fetchall()
+    conn.commit()
+    return 2
+
+
+def run(method, session_id, writers, turns):
+    round_trips = [0] * writers
+    errors = []
+
+    def writer(idx):
+        conn = get_db_connection()
+        try:
+            for turn in range(turns):
+                messages = [HumanMessage(content=f"w{idx} q{turn}"), AIMessage(content=f"w{idx} a{turn}")]
+                try:
+                    round_trips[idx] += method(conn, session_id, messages)
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*), COUNT(*) - COUNT(DISTINCT messenger_order)
+                FROM chat_messenger WHERE session_id = %s;
+            """, (session_id,))
+            rows, duplicates = cur.fetchone()
+    finally:
+        conn.close()
+
+    total_turns = writers * turns
+    print(f"{method.__name__:<26} {elapsed:8.2f}s  {total_turns / elapsed:9.1f} lượt/s  "
+          f"{sum(round_trips) / total_turns:5.1f} round trip/lượt  {rows:6d} dòng  "
+          f"{duplicates:5d} order trùng  {len(errors)} lỗi")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    get_or_create_user(BENCH_USER)
+    for method in (legacy_add_new_messages, bulk_add_new_messages):
+        session_id = create_new_session(BENCH_USER, f"bench {method.__name__}")
+        try:
+            run(method, session_id, args.writers, args.turns)
+        finally:
+            delete_session(session_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_embedding_backends.py
+"""
+So sánh các backend embedding (torch, ONNX float32, ONNX int8): thời gian nạp,
+số lượt encode mỗi giây (từng câu, như lượt truy vấn), RSS của tiến trình sau
+khi nạp và độ lệch cosine so với vector của torch. Mỗi backend chạy trong một
+tiến trình riêng để số đo bộ nhớ không lẫn nhau.
+
+    python -m benchmarks.bench_embedding_backends --sentences 200
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+SENTENCES = [
+    "Ngữ pháp て形 dùng để nối các động từ như thế nào?",
+    "Phân biệt は và が trong câu giới thiệu bản thân.",
+    "Từ vựng N5 về gia đình: 家族, 父, 母, 兄, 姉.",
+    "Cách chia động từ nhóm 2 sang thể quá khứ.",
+    "Khi nào dùng 〜たことがある để nói về trải nghiệm?",
+]
+
+# (nhãn, backend, quantization)
+VARIANTS = [("torch", "torch", ""), ("onnx-fp32", "onnx", ""), ("onnx-int8", "onnx", None)]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(backend: str, quantization: str, count: int):
+    from src.core.embedding import load_embedding_model
+
+    start = time.perf_counter()
+    model = load_embedding_model(backend, None if quantization == "default" else quantization)
+    load_seconds = time.perf_counter() - start
+    model.encode("warm-up")
+    texts = [f"{SENTENCES[i % len(SENTENCES)]} ({i})" for i in range(count)]
+    start = time.perf_counter()
+    vectors = [model.encode(text) for text in texts]
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "load_s": load_seconds,
+        "encodes_per_s": count / elapsed,
+        "rss_mb": _rss_mb(),
+        "vectors": np.asarray(vectors, dtype=np.float32).tolist(),
+    }))
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.sentences)
+        return
+
+    reference = None
+    for label, backend, quantization in VARIANTS:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_embedding_backends", "--sentences", str(args.sentences),
+             "--child", backend, "default" if quantization is None else quantization],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{label:>10}: lỗi - {proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        vectors = np.asarray(result["vectors"], dtype=np.float32)
+        if reference is None:
+            reference = vectors
+        cosine = _cosine_rows(reference, vectors)
+        print(f"{label:>10}: nạp {result['load_s']:5.1f}s  {result['encodes_per_s']:7.1f} encode/s  "
+              f"RSS {result['rss_mb']:7.1f} MB  cosine với torch: min={cosine.min():.4f} mean={cosine.mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
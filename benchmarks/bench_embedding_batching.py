@@ -0,0 +1,74 @@
+# benchmarks/bench_embedding_batching.py
+"""
+So sánh encode từng câu (model.encode(text) trong mỗi luồng) với EmbeddingBatcher
+khi nhiều luồng cùng encode câu truy vấn: thông lượng (câu/giây) và độ trễ
+p50 / p99 của mỗi lời gọi. Không dùng cache embedding (mỗi câu là duy nhất).
+
+    python -m benchmarks.bench_embedding_batching --threads 16 --requests 50
+"""
+import argparse
+import threading
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from src.core.embedding import EmbeddingBatcher, get_embedding_model
+
+
+def run(encode: Callable[[str], object], threads: int, requests: int) -> dict:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(worker_id: int):
+        local = []
+        barrier.wait()
+        for i in range(requests):
+            text = f"Câu hỏi số {i} của người dùng {worker_id}: ngữ pháp てform dùng khi nào?"
+            start = time.perf_counter()
+            encode(text)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="Số câu mỗi luồng.")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    model = get_embedding_model()
+    model.encode("warm-up")
+
+    results = {"từng câu": run(model.encode, args.threads, args.requests)}
+    batcher = EmbeddingBatcher(lambda texts: model.encode(texts, batch_size=len(texts)),
+                               max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    results["gom lô"] = run(batcher.encode, args.threads, args.requests)
+    batcher.close()
+
+    for name, r in results.items():
+        print(f"{name:>9}: {r['throughput']:8.1f} câu/s  p50={r['p50_ms']:7.1f}ms  p99={r['p99_ms']:7.1f}ms")
+    print(f"Lô: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_filtered_search.py
+"""
+So sánh tìm kiếm vector có bộ lọc level / skill_type theo hai dạng điều kiện:
+`LOWER(cột) = LOWER(%s)` (trước migration 0010) và `cột = %s` với giá trị đã
+chuẩn hóa (sau migration 0010, dùng được index vector partial). Với mỗi tổ hợp
+bộ lọc (theo giá trị chuẩn hóa) đang có trong bảng: độ trễ p50 / p95, số dòng
+trả về trung bình (so với k), recall@k so với quét tuần tự chính xác và index
+được planner chọn.
+
+Câu truy vấn là đoạn đầu của các chunk chọn ngẫu nhiên trong bảng. Chạy trước
+và sau `python -m src.dbtools.migrations` để thấy khác biệt của index partial.
+
+    python -m benchmarks.bench_filtered_search --table content_chunks --queries 50 -k 5
+"""
+import argparse
+import random
+import re
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.core.database import (
+    get_db_connection, chunk_search_query, chunk_filter_sql, vector_search_settings_sql,
+    quote_identifier, CANONICAL_FILTER_COLUMNS,
+)
+from src.core.embedding import encode_query_vector
+
+
+def lower_filter_sql(filters: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """Dạng điều kiện cũ: so sánh không phân biệt hoa thường bằng LOWER() hai vế."""
+    return [f"LOWER({quote_identifier(column)}) = LOWER(%s)" for column in filters], list(filters.values())
+
+
+def truth_filter_sql(filters: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """Điều kiện của kết quả chuẩn: so với dạng chuẩn của giá trị đang lưu, đúng cả trước và sau migration."""
+    return ([f"NULLIF(UPPER(BTRIM({quote_identifier(column)})), '') = %s" for column in filters],
+            list(filters.values()))
+
+
+def _run(conn, query: str, params: tuple, setup_sql: str) -> List[int]:
+    with conn.cursor() as cur:
+        cur.execute(setup_sql)
+        cur.execute(query, params)
+        ids = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    return ids
+
+
+def _plan_index(conn, query: str, params: tuple) -> str:
+    with conn.cursor() as cur:
+        cur.execute(vector_search_settings_sql())
+        cur.execute("EXPLAIN " + query, params)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+    conn.rollback()
+    match = re.search(r"Index Scan using (\S+)", plan)
+    return match.group(1) if match else "Seq Scan"
+
+
+def filter_combinations(conn, table: str) -> List[Dict[str, str]]:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT DISTINCT NULLIF(UPPER(BTRIM(level)), ''), NULLIF(UPPER(BTRIM(skill_type)), '') "
+                    f"FROM {quote_identifier(table)} WHERE level IS NOT NULL AND skill_type IS NOT NULL ORDER BY 1, 2;")
+        pairs = cur.fetchall()
+    conn.rollback()
+    combos = [{"level": level} for level in dict.fromkeys(level for level, _ in pairs)]
+    combos += [{"skill_type": skill} for skill in dict.fromkeys(skill for _, skill in pairs)]
+    combos += [{"level": level, "skill_type": skill} for level, skill in pairs]
+    return combos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="content_chunks")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT chunk_text FROM {quote_identifier(args.table)} WHERE chunk_text IS NOT NULL;")
+            texts = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+        random.Random(args.seed).shuffle(texts)
+        vectors = [encode_query_vector(text[:200]) for text in texts[:args.queries]]
+        combos = filter_combinations(conn, args.table)
+        print(f"Bảng {args.table}: {len(texts)} chunk, {len(vectors)} truy vấn, k={args.k}, "
+              f"{len(combos)} tổ hợp bộ lọc")
+
+        for filters in combos:
+            canonical_clauses, canonical_params = chunk_filter_sql(filters, CANONICAL_FILTER_COLUMNS)
+            truth_clauses, truth_params = truth_filter_sql(filters)
+            truths = []
+            for vector in vectors:
+                query, params = chunk_search_query(args.table, ("id",), vector, args.k,
+                                                   truth_clauses, truth_params, mode="exact")
+                truths.append(set(_run(conn, query, params, "SET LOCAL enable_indexscan = off;")))
+
+            label = ", ".join(f"{column}={value}" for column, value in filters.items())
+            for form, (clauses, where_params) in (("LOWER()", lower_filter_sql(filters)),
+                                                  ("chuẩn hóa", (canonical_clauses, canonical_params))):
+                latencies, returned, recalls = [], [], []
+                for vector, truth in zip(vectors, truths):
+                    query, params = chunk_search_query(args.table, ("id",), vector, args.k,
+                                                       clauses, where_params, mode="exact")
+                    start = time.perf_counter()
+                    ids = _run(conn, query, params, vector_search_settings_sql())
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    returned.append(len(ids))
+                    recalls.append(len(truth & set(ids)) / max(len(truth), 1))
+                query, params = chunk_search_query(args.table, ("id",), vectors[0], args.k,
+                                                   clauses, where_params, mode="exact")
+                print(f"  [{label}] {form:>9}: p50={np.percentile(latencies, 50):6.2f} ms "
+                      f"p95={np.percentile(latencies, 95):6.2f} ms  dòng={np.mean(returned):.2f}/{args.k}  "
+                      f"recall@{args.k}={np.mean(recalls):.3f}  index={_plan_index(conn, query, params)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
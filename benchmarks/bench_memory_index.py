@@ -0,0 +1,83 @@
+# benchmarks/bench_memory_index.py
+"""
+So sánh index vector trong bộ nhớ (memory_index.py) với truy vấn pgvector cho
+cùng các câu truy vấn: thời gian nạp index, độ trễ p50 / p95 mỗi lượt tìm
+(có và không có bộ lọc) và độ trùng top-k với kết quả của pgvector.
+
+Câu truy vấn là đoạn đầu của các chunk chọn ngẫu nhiên trong bảng, encode sẵn
+trước khi đo (chỉ đo phần tìm kiếm). Cần migration 0008 (cột change_version).
+
+    python -m benchmarks.bench_memory_index --table content_chunks --queries 200 -k 3
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from src.core.database import execute_sql_query, chunk_search_query, chunk_filter_sql, execute_vector_query
+from src.core.embedding import encode_query, to_pgvector
+from src.core.memory_index import MemoryVectorIndex
+
+COLUMNS = ("chunk_text", "level")
+
+
+def _timed(search: Callable[[np.ndarray], List[dict]], vectors: List[np.ndarray]):
+    latencies, results = [], []
+    for vector in vectors:
+        start = time.perf_counter()
+        results.append(search(vector))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="content_chunks")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = execute_sql_query(f'SELECT chunk_text, level FROM "{args.table}" WHERE chunk_text IS NOT NULL;')
+    if not rows:
+        print(f"Bảng {args.table} không có dữ liệu.")
+        return
+    random.Random(args.seed).shuffle(rows)
+    samples = rows[:args.queries]
+    vectors = [encode_query(row["chunk_text"][:200]) for row in samples]
+
+    index = MemoryVectorIndex(args.table, refresh_interval=3600, max_staleness=3600)
+    start = time.perf_counter()
+    if not index.refresh():
+        return
+    print(f"Bảng {args.table}: nạp {index.stats()['rows']} dòng vào bộ nhớ trong "
+          f"{time.perf_counter() - start:.2f}s ({index.stats()['matrix_bytes'] / 2 ** 20:.1f} MB vector), "
+          f"{len(vectors)} truy vấn, k={args.k}")
+
+    for label, use_filter in (("không lọc", False), ("lọc level", True)):
+        filters = [{"level": row["level"]} if use_filter and row["level"] else None for row in samples]
+        iterator = iter(filters)
+
+        def sql_search(vector):
+            where_clauses, where_params = chunk_filter_sql(next(iterator), ("level",))
+            query, params = chunk_search_query(args.table, COLUMNS, to_pgvector(vector), args.k,
+                                               where_clauses, where_params, mode="exact")
+            return execute_vector_query(query, params)
+
+        sql_p50, sql_p95, sql_results = _timed(sql_search, vectors)
+        iterator = iter(filters)
+        mem_p50, mem_p95, mem_results = _timed(
+            lambda vector: index.search(vector, args.k, COLUMNS, next(iterator), ("level",)), vectors)
+
+        overlap = np.mean([
+            len({r["chunk_text"] for r in a} & {r["chunk_text"] for r in b}) / max(len(a), 1)
+            for a, b in zip(sql_results, mem_results)
+        ])
+        print(f"  [{label}] pgvector: p50={sql_p50:6.3f} ms p95={sql_p95:6.3f} ms | "
+              f"bộ nhớ: p50={mem_p50:6.3f} ms p95={mem_p95:6.3f} ms | trùng top-{args.k}: {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
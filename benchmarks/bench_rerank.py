@@ -0,0 +1,91 @@
+# benchmarks/bench_rerank.py
+"""
+Đo bước xếp hạng lại bằng cross-encoder (reranker.py) trên dữ liệu thật: với
+mỗi câu truy vấn, lấy `--candidates` ứng viên theo vector rồi so thứ tự ANN với
+thứ tự sau khi xếp hạng lại (hit@k, MRR của chunk nguồn), cùng độ trễ p50 / p95
+của lượt chấm điểm và số lượt phải giữ thứ tự ANN dưới ngân sách `--budget-ms`.
+
+Câu truy vấn là một đoạn ở giữa của các chunk chọn ngẫu nhiên (không phải đoạn
+đầu, để chunk nguồn không luôn đứng đầu theo vector); chunk nguồn là đáp án.
+
+    python -m benchmarks.bench_rerank --table content_chunks --queries 50 --candidates 20 -k 3
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from src.config import settings
+from src.core.database import execute_sql_query, search_chunk_rows
+from src.core.embedding import encode_query
+from src.core.reranker import CrossEncoderReranker
+
+COLUMNS = ("id", "chunk_text")
+
+
+def _rank(rows, target_id) -> int:
+    """Thứ hạng (từ 1) của chunk nguồn trong `rows`; 0 nếu không có."""
+    return next((i + 1 for i, row in enumerate(rows) if row["id"] == target_id), 0)
+
+
+def _summary(label: str, ranks, k: int):
+    ranks = np.asarray(ranks)
+    mrr = np.mean([1 / rank if rank else 0.0 for rank in ranks])
+    print(f"  {label:>12}: hit@1={np.mean((ranks == 1)):.3f} hit@{k}={np.mean((ranks > 0) & (ranks <= k)):.3f} "
+          f"MRR={mrr:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="content_chunks")
+    parser.add_argument("--model", default=settings.RERANK_MODEL_NAME)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=settings.RERANK_CANDIDATES)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=settings.RERANK_BUDGET_MS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = execute_sql_query(f'SELECT id, chunk_text FROM "{args.table}" WHERE chunk_text IS NOT NULL;')
+    if not rows:
+        print(f"Bảng {args.table} không có dữ liệu.")
+        return
+    random.Random(args.seed).shuffle(rows)
+    samples = []
+    for row in rows[:args.queries]:
+        words = row["chunk_text"].split()
+        middle = len(words) // 2
+        samples.append((" ".join(words[max(0, middle - 10):middle + 10]), row["id"]))
+
+    reranker = CrossEncoderReranker(args.model, budget_ms=args.budget_ms, max_length=settings.RERANK_MAX_LENGTH)
+    start = time.perf_counter()
+    reranker.warm_up()
+    print(f"Bảng {args.table}: {len(samples)} truy vấn, {args.candidates} ứng viên, k={args.k}, "
+          f"nạp model {time.perf_counter() - start:.2f}s ({reranker.ms_per_pair:.2f} ms / cặp)")
+
+    candidates = [search_chunk_rows(args.table, COLUMNS, encode_query(query), args.candidates)
+                  for query, _ in samples]
+
+    # Chất lượng: chấm toàn bộ ứng viên, không giới hạn thời gian
+    ann_ranks, rerank_ranks, latencies = [], [], []
+    for (query, target_id), rows in zip(samples, candidates):
+        start = time.perf_counter()
+        scores = reranker._model.predict([(query, row["chunk_text"]) for row in rows], show_progress_bar=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ann_ranks.append(_rank(rows, target_id))
+        rerank_ranks.append(_rank([rows[i] for i in np.argsort(-np.asarray(scores), kind="stable")], target_id))
+    _summary("ANN", ann_ranks, args.k)
+    _summary("xếp hạng lại", rerank_ranks, args.k)
+    print(f"  chấm {args.candidates} ứng viên: p50={np.percentile(latencies, 50):.1f} ms "
+          f"p95={np.percentile(latencies, 95):.1f} ms")
+
+    # Dưới ngân sách: đường đi thật của rerank() (cắt bớt / giữ thứ tự ANN khi quá giờ)
+    budget_ranks = [_rank(reranker.rerank(query, rows, args.k), target_id)
+                    for (query, target_id), rows in zip(samples, candidates)]
+    _summary(f"≤{args.budget_ms:g} ms", budget_ranks, args.k)
+    print(f"  {reranker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
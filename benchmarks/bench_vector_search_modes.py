@@ -0,0 +1,104 @@
+# benchmarks/bench_vector_search_modes.py
+"""
+So sánh các VECTOR_SEARCH_MODE (exact, halfvec, binary) trên bảng chunk thật:
+recall@k so với kết quả quét tuần tự chính xác (`<=>` không dùng index) và độ
+trễ p50 / p95 của mỗi truy vấn, cùng kích thước các index vector.
+
+Câu truy vấn là đoạn đầu của các chunk chọn ngẫu nhiên trong bảng, encode bằng
+model embedding hiện tại. Chế độ halfvec / binary cần pgvector >= 0.7 và index
+của migration 0007.
+
+    python -m benchmarks.bench_vector_search_modes --table content_chunks --queries 100 -k 5
+"""
+import argparse
+import random
+import time
+from typing import List, Optional, Set
+
+import numpy as np
+import psycopg2
+
+from src.config import settings
+from src.core.database import get_db_connection, chunk_search_query, vector_search_settings_sql, VECTOR_SEARCH_MODES
+from src.core.embedding import encode_query_vector
+from src.dbtools.migrations import index_sizes, vector_index_name, quantized_index_names
+
+
+def _run(cur, query: str, params: tuple, setup_sql: str = "") -> List[int]:
+    if setup_sql:
+        cur.execute(setup_sql)
+    cur.execute(query, params)
+    return [row[0] for row in cur.fetchall()]
+
+
+def ground_truth(conn, table: str, vector: str, k: int) -> List[int]:
+    """Top-k chính xác: quét tuần tự, không dùng index ANN."""
+    query, params = chunk_search_query(table, ("id",), vector, k, mode="exact")
+    with conn.cursor() as cur:
+        ids = _run(cur, query, params, "SET LOCAL enable_indexscan = off;")
+    conn.rollback()
+    return ids
+
+
+def measure_mode(conn, table: str, mode: str, vectors: List[str], truths: List[Set[int]], k: int) -> Optional[dict]:
+    latencies = []
+    recalls = []
+    try:
+        for vector, truth in zip(vectors, truths):
+            query, params = chunk_search_query(table, ("id",), vector, k, mode=mode)
+            with conn.cursor() as cur:
+                start = time.perf_counter()
+                ids = _run(cur, query, params, vector_search_settings_sql())
+                latencies.append((time.perf_counter() - start) * 1000)
+            conn.rollback()
+            recalls.append(len(truth & set(ids)) / max(len(truth), 1))
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"{mode:>8}: không chạy được - {str(e).strip().splitlines()[0]}")
+        return None
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="content_chunks")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT chunk_text FROM "{args.table}" WHERE chunk_text IS NOT NULL;')
+            texts = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+        random.Random(args.seed).shuffle(texts)
+        vectors = [encode_query_vector(text[:200]) for text in texts[:args.queries]]
+        print(f"Bảng {args.table}: {len(texts)} chunk, {len(vectors)} truy vấn, k={args.k}, "
+              f"ứng viên rerank={settings.VECTOR_RERANK_CANDIDATES}, ef_search={settings.VECTOR_HNSW_EF_SEARCH}")
+
+        truths = [set(ground_truth(conn, args.table, vector, args.k)) for vector in vectors]
+        for mode in VECTOR_SEARCH_MODES:
+            result = measure_mode(conn, args.table, mode, vectors, truths, args.k)
+            if result:
+                print(f"{mode:>8}: recall@{args.k}={result['recall']:.3f}  "
+                      f"p50={result['p50_ms']:6.2f} ms  p95={result['p95_ms']:6.2f} ms")
+
+        print("Kích thước index:")
+        names = (vector_index_name(args.table),) + quantized_index_names(args.table)
+        for name, size, valid in index_sizes(conn, names):
+            print(f"    {name}: {size}{'' if valid else ' (INVALID)'}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/profile_startup.py
+"""
+Đo thời gian khởi động (import) của các điểm vào của ứng dụng bằng
+`python -X importtime`, mỗi module chạy trong một tiến trình mới.
+
+In tổng thời gian import, module có nạp model embedding hay không, và các
+module / package tốn thời gian nhất.
+
+    python -m benchmarks.profile_startup
+    python -m benchmarks.profile_startup --module src.api.main --top 30
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ("main_cli", "src.core.session_manager", "src.api.main")
+
+# "import time:       123 |       4567 |   package.module"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_CHILD_CODE = (
+    "import importlib, sys; importlib.import_module(sys.argv[1]); "
+    "from src.core.embedding import is_embedding_model_loaded; "
+    "print('EMBEDDING_MODEL_LOADED=%s' % is_embedding_model_loaded())"
+)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, độ sâu) cho mỗi dòng của -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def self_time_by_package(rows: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Tổng self time (µs) theo package cấp cao nhất (torch, transformers, src...)."""
+    totals = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        totals[module.split(".")[0]] += self_us
+    return dict(totals)
+
+
+def profile_module(module: str) -> Tuple[float, bool, List[Tuple[str, int, int, int]]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD_CODE, module],
+        capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(f"[Lỗi] Không thể import {module}:\n{proc.stderr.splitlines()[-1] if proc.stderr else ''}")
+    return elapsed, "EMBEDDING_MODEL_LOADED=True" in proc.stdout, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module cần đo (mặc định: các điểm vào chính).")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for module in args.module or DEFAULT_MODULES:
+        elapsed, model_loaded, rows = profile_module(module)
+        print(f"\n=== {module}: {elapsed:.2f}s (tiến trình), model embedding đã nạp: {model_loaded} ===")
+        print("  Module tốn thời gian nhất (cumulative):")
+        for name, _, cumulative_us, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"    {cumulative_us / 1000:9.1f} ms  {name}")
+        print("  Theo package (self):")
+        packages = sorted(self_time_by_package(rows).items(), key=lambda item: item[1], reverse=True)
+        for package, self_us in packages[:args.top]:
+            print(f"    {self_us / 1000:9.1f} ms  {package}")
+
+
+if __name__ == "__main__":
+    main()
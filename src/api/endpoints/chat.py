@@ -4,8 +4,9 @@ from fastapi import APIRouter, Body, HTTPException
 from ..schemas import ChatRequest, ChatResponse, ChatEditRequest, ChatInitiateRequest, ChatInitiateResponse
 from ...features.qna.agent import initialize_qna_agent
 from ...features.planner.agent import initialize_planning_agent # Cần để điều phối
-from ...core.session_manager import load_session_data, add_new_messages, rewind_last_turn, create_new_session
+from ...core.async_session_manager import load_session_data, add_new_messages, rewind_last_turn, create_new_session
 from ...core.llm import get_llm # Cần để tự đặt tên session
+from ...core.agent_metrics import ainvoke_agent
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
@@ -42,7 +43,7 @@ async def initiate_and_invoke(request: ChatInitiateRequest = Body(...)):
         session_name = f"Phiên {session_type}"
 
     # 2. Tạo session mới trong DB
-    session_id = create_new_session(
+    session_id = await create_new_session(
         user_id=request.user_id,
         session_name=session_name,
         session_type=session_type,
@@ -53,7 +54,7 @@ async def initiate_and_invoke(request: ChatInitiateRequest = Body(...)):
 
     # 3. Lưu tin nhắn đầu tiên của người dùng
     human_msg = HumanMessage(content=request.first_message)
-    add_new_messages(session_id, [human_msg])
+    await add_new_messages(session_id, [human_msg])
 
     # 4. Điều phối và xử lý tin nhắn đầu tiên
     chat_history = [human_msg]  # Lịch sử ban đầu chỉ có 1 tin nhắn
@@ -64,15 +65,15 @@ async def initiate_and_invoke(request: ChatInitiateRequest = Body(...)):
     }
 
     if session_type == "PLANNER":
-        result = planner_agent_executor.invoke(input_data)
+        result = await ainvoke_agent(planner_agent_executor, input_data, "planner")
     else:  # Mặc định xử lý bằng QnA Agent
-        result = qna_agent_executor.invoke(input_data)
+        result = await ainvoke_agent(qna_agent_executor, input_data, "qna")
 
     ai_response_text = result.get('output', "Lỗi: Agent không có output.")
 
     # 5. Lưu tin nhắn trả lời của AI
     ai_msg = AIMessage(content=ai_response_text)
-    add_new_messages(session_id, [ai_msg])
+    await add_new_messages(session_id, [ai_msg])
 
     return ChatInitiateResponse(
         session_id=session_id,
@@ -82,7 +83,7 @@ async def initiate_and_invoke(request: ChatInitiateRequest = Body(...)):
 
 @router.post("/invoke", response_model=ChatResponse)
 async def invoke_assistant(request: ChatRequest):
-    session_data = load_session_data(request.session_id)
+    session_data = await load_session_data(request.session_id)
     if not session_data:
         raise HTTPException(status_code=404, detail=f"Phiên ID {request.session_id} không tồn tại.")
 
@@ -91,24 +92,24 @@ async def invoke_assistant(request: ChatRequest):
         "input": request.user_input,
         "chat_history": session_data["history"]
     }
-    result = qna_agent_executor.invoke(input_data)
+    result = await ainvoke_agent(qna_agent_executor, input_data, "qna")
     ai_response_text = result.get('output', "Lỗi: Agent không có output.")
 
     human_msg = HumanMessage(content=request.user_input)
     ai_msg = AIMessage(content=ai_response_text)
-    add_new_messages(request.session_id, [human_msg, ai_msg])
+    await add_new_messages(request.session_id, [human_msg, ai_msg])
 
     return ChatResponse(session_id=str(request.session_id), ai_response=ai_response_text)
 
 
 @router.post("/edit_and_resubmit", response_model=ChatResponse)
 async def edit_and_resubmit_message(request: ChatEditRequest = Body(...)):
-    success = rewind_last_turn(request.session_id)
+    success = await rewind_last_turn(request.session_id)
     if not success:
         raise HTTPException(status_code=404,
                             detail=f"Không tìm thấy phiên {request.session_id} hoặc không đủ tin nhắn để sửa.")
 
-    session_data = load_session_data(request.session_id)
+    session_data = await load_session_data(request.session_id)
     if not session_data:
         raise HTTPException(status_code=404, detail=f"Phiên ID {request.session_id} không tồn tại.")
 
@@ -117,11 +118,11 @@ async def edit_and_resubmit_message(request: ChatEditRequest = Body(...)):
         "input": request.corrected_input,
         "chat_history": session_data["history"]
     }
-    result = qna_agent_executor.invoke(input_data)
+    result = await ainvoke_agent(qna_agent_executor, input_data, "qna")
     ai_response_text = result.get('output', "Lỗi: Agent không có output.")
 
     human_msg = HumanMessage(content=request.corrected_input)
     ai_msg = AIMessage(content=ai_response_text)
-    add_new_messages(request.session_id, [human_msg, ai_msg])
+    await add_new_messages(request.session_id, [human_msg, ai_msg])
 
     return ChatResponse(session_id=str(request.session_id), ai_response=ai_response_text)
@@ -5,8 +5,9 @@ from ...features.planner.agent import initialize_planning_agent
 from ...features.learning.agent import initialize_learning_agent
 from ...features.reviewer.agent import initialize_reviewer_agent
 from ...features.speaking.agent import initialize_speaking_agent
-from ...core.session_manager import create_new_session, add_new_messages, load_session_data, rewind_last_turn
-from ...core.database import execute_sql_query
+from ...core.async_session_manager import create_new_session, add_new_messages, load_session_data, rewind_last_turn
+from ...core.async_database import execute_sql_query
+from ...core.agent_metrics import ainvoke_agent
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_openai import ChatOpenAI
 
@@ -41,12 +42,12 @@ async def chat_dispatcher(request: ChatRequest = Body(...)):
     # Nếu frontend gửi kèm redirect_to (chuyển agent), tạo session mới với intent mới và gửi lại câu hỏi gốc
     if hasattr(request, "redirect_to") and getattr(request, "redirect_to", None):
         intent = request.redirect_to
-        session_id = create_new_session(request.user_id, f"Session {intent}", session_type=intent)
+        session_id = await create_new_session(request.user_id, f"Session {intent}", session_type=intent)
         user_input = getattr(request, "original_question", request.user_input)
     else:
         user_input = request.user_input
         if session_id:
-            session_data = load_session_data(session_id)
+            session_data = await load_session_data(session_id)
             if not session_data:
                 raise HTTPException(status_code=404, detail=f"Phiên ID {session_id} không tồn tại.")
             session_type = session_data.get("type", None)
@@ -61,7 +62,7 @@ async def chat_dispatcher(request: ChatRequest = Body(...)):
             intent = session_type.lower() if session_type else detected_intent
         else:
             intent = detect_intent_llm(user_input)
-            session_id = create_new_session(request.user_id, f"Session {intent}", session_type=intent)
+            session_id = await create_new_session(request.user_id, f"Session {intent}", session_type=intent)
     agent_map = {
         "qna": qna_agent_executor,
         "planner": planner_agent_executor,
@@ -74,9 +75,9 @@ async def chat_dispatcher(request: ChatRequest = Body(...)):
         return ChatResponse(session_id=session_id, ai_response="Xin lỗi, tôi chưa hỗ trợ chức năng này.")
     context = request.dict()
     context["session_id"] = session_id
-    ai_result = agent.invoke({"context": context})
+    ai_result = await ainvoke_agent(agent, {"context": context}, intent)
     ai_response = ai_result.get("output", "Xin hãy cung cấp thêm thông tin.")
-    add_new_messages(session_id, [
+    await add_new_messages(session_id, [
         HumanMessage(content=user_input),
         AIMessage(content=ai_response)
     ])
@@ -84,10 +85,10 @@ async def chat_dispatcher(request: ChatRequest = Body(...)):
 
 @router.post("/chat/edit_and_resubmit", response_model=ChatResponse)
 async def edit_and_resubmit_message(request: ChatEditRequest = Body(...)):
-    success = rewind_last_turn(request.session_id)
+    success = await rewind_last_turn(request.session_id)
     if not success:
         raise HTTPException(status_code=404, detail=f"Không tìm thấy phiên {request.session_id} hoặc không đủ tin nhắn để sửa.")
-    session_data = load_session_data(request.session_id)
+    session_data = await load_session_data(request.session_id)
     if not session_data:
         raise HTTPException(status_code=404, detail=f"Phiên ID {request.session_id} không tồn tại.")
     session_type = session_data.get("type", "qna").lower()
@@ -104,9 +105,9 @@ async def edit_and_resubmit_message(request: ChatEditRequest = Body(...)):
         "speaking": initialize_speaking_agent(),
     }
     agent = agent_map.get(session_type, agent_map["qna"])
-    result = agent.invoke(input_data)
+    result = await ainvoke_agent(agent, input_data, session_type if session_type in agent_map else "qna")
     ai_response_text = result.get('output', "Lỗi: Agent không có output.")
     human_msg = HumanMessage(content=request.corrected_input)
     ai_msg = AIMessage(content=ai_response_text)
-    add_new_messages(request.session_id, [human_msg, ai_msg])
+    await add_new_messages(request.session_id, [human_msg, ai_msg])
     return ChatResponse(session_id=request.session_id, ai_response=ai_response_text)
\ No newline at end of file
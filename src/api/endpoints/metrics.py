@@ -0,0 +1,138 @@
+# src/api/endpoints/metrics.py
+
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query
+
+from ...core.connection_pool import get_pool_stats
+from ...core.async_database import get_async_pool_stats
+from ...core.history_cache import history_cache
+from ...core.session_manager import write_behind_queue
+from ...core.context_manager import task_context_cache
+from ...core.query_metrics import query_metrics, explain_slow_query
+from ...core.embedding import embedding_cache, embedding_batcher, embedding_executor
+from ...core.memory_index import memory_indexes
+from ...core.retrieval_cache import retrieval_cache
+from ...core.reranker import reranker
+from ...core.agent_metrics import agent_turn_metrics
+from ...core.vocabulary_index import vocabulary_index
+
+router = APIRouter()
+
+
+@router.get("/db_pool")
+async def get_db_pool_metrics():
+    """Số liệu của pool kết nối: số lần mượn, thời gian chờ, số kết nối đang dùng."""
+    return {"sync": get_pool_stats(), "async": get_async_pool_stats()}
+
+
+@router.get("/history_cache")
+async def get_history_cache_metrics():
+    """Số liệu của cache lịch sử chat trong tiến trình: số phiên, hit/miss."""
+    return history_cache.stats()
+
+
+@router.get("/write_behind")
+async def get_write_behind_metrics():
+    """Số liệu của hàng đợi ghi trễ tin nhắn chat (nếu được bật)."""
+    if not write_behind_queue:
+        return {"enabled": False}
+    return {"enabled": True, **write_behind_queue.stats()}
+
+
+@router.get("/task_context_cache")
+async def get_task_context_cache_metrics():
+    """Số liệu của cache task context: số mục, hit/miss."""
+    return task_context_cache.stats()
+
+
+@router.get("/embedding_cache")
+async def get_embedding_cache_metrics():
+    """Số liệu của cache embedding câu truy vấn: số mục, dung lượng, hit/miss."""
+    return embedding_cache.stats()
+
+
+@router.get("/embedding_batcher")
+async def get_embedding_batcher_metrics():
+    """Số liệu gom lô encode: số lô, kích thước lô trung bình / lớn nhất."""
+    if not embedding_batcher:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_batcher.stats()}
+
+
+@router.get("/embedding_executor")
+async def get_embedding_executor_metrics():
+    """Pool worker encode của API: chế độ (thread/process), số worker, độ sâu hàng đợi."""
+    if not embedding_executor:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_executor.stats()}
+
+
+@router.get("/retrieval_cache")
+async def get_retrieval_cache_metrics():
+    """Số liệu của cache kết quả truy xuất: số mục, hit/miss, tỉ lệ hit, thế hệ bộ tài liệu đã biết."""
+    return retrieval_cache.stats()
+
+
+@router.get("/rerank")
+async def get_rerank_metrics():
+    """Bước rerank cross-encoder: số lượt xếp hạng lại / quá ngân sách / bỏ qua, thời gian p50 / p95."""
+    if not reranker:
+        return {"enabled": False}
+    return {"enabled": True, **reranker.stats()}
+
+
+@router.get("/agent_turns")
+async def get_agent_turn_metrics():
+    """Số lượt lặp (lần gọi LLM) và số lần gọi tool trung bình mỗi lượt chat, theo agent."""
+    return agent_turn_metrics.stats()
+
+
+@router.delete("/agent_turns")
+async def reset_agent_turn_metrics():
+    """Xóa số liệu lượt chat của các agent (vd: trước khi so sánh bật / tắt rerank)."""
+    agent_turn_metrics.reset()
+    return {"reset": True}
+
+
+@router.get("/vocabulary_index")
+async def get_vocabulary_index_metrics():
+    """Index tra cứu từ vựng trong bộ nhớ: số mục / khóa, số lần nạp lại, tỉ lệ tra trúng."""
+    return vocabulary_index.stats()
+
+
+@router.get("/memory_index")
+async def get_memory_index_metrics():
+    """Index vector trong bộ nhớ: số dòng, phiên bản, tuổi dữ liệu, số lượt phải quay về SQL."""
+    return {"enabled": bool(memory_indexes), "indexes": [index.stats() for index in memory_indexes.values()]}
+
+
+@router.get("/db_queries")
+async def get_db_query_metrics(
+        top: int = Query(20, ge=1, le=500),
+        order_by: str = Query("total_ms", pattern="^(total_ms|count|max_ms|avg_ms|rows|errors)$")
+):
+    """Histogram độ trễ theo fingerprint câu lệnh SQL và thời gian chờ mượn kết nối."""
+    return query_metrics.snapshot(top=top, order_by=order_by)
+
+
+@router.get("/db_queries/slow")
+async def get_slow_queries():
+    """Slow-query log: các câu lệnh gần đây chạy lâu hơn DB_SLOW_QUERY_MS."""
+    return query_metrics.slow_queries()
+
+
+@router.post("/db_queries/slow/{entry_id}/explain")
+async def explain_slow_query_entry(entry_id: int):
+    """Chạy EXPLAIN cho một câu lệnh trong slow-query log và lưu kế hoạch vào log."""
+    plan = await asyncio.to_thread(explain_slow_query, entry_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy câu lệnh hoặc không thể EXPLAIN.")
+    return {"id": entry_id, "plan": plan}
+
+
+@router.delete("/db_queries")
+async def reset_db_query_metrics():
+    """Xóa số liệu câu lệnh SQL và slow-query log (vd: trước một lượt đo)."""
+    query_metrics.reset()
+    return {"reset": True}
@@ -1,18 +1,19 @@
 # src/api/endpoints/sessions.py
 
-from fastapi import APIRouter, HTTPException, Path, Body, status, Response, Request
+from fastapi import APIRouter, HTTPException, Path, Body, Query, status, Response, Request
 from typing import List, Optional
 from datetime import datetime, timezone
 
 from ..schemas import SessionListResponse, HistoryResponse, Message, SessionCreateRequest, SessionInfo, \
     SessionRenameRequest
-from ...core.session_manager import (
+from ...core.async_session_manager import (
     list_sessions_for_user,
     load_chat_history,
     create_new_session,
     get_or_create_user,
     delete_session,
-    rename_session, find_session
+    rename_session, find_session,
+    encode_session_cursor
 )
 from langchain_core.messages import HumanMessage, AIMessage
 
@@ -26,9 +27,9 @@ async def create_new_chat_session(request: SessionCreateRequest = Body(...)):
     """
     print(f"API: Nhận yêu cầu tạo phiên '{request.session_type}' cho user '{request.user_id}'")
 
-    get_or_create_user(request.user_id)
+    await get_or_create_user(request.user_id)
 
-    new_session_id = create_new_session(
+    new_session_id = await create_new_session(
         user_id=request.user_id,
         session_name=request.session_name,
         session_type=request.session_type,
@@ -49,14 +50,27 @@ async def create_new_chat_session(request: SessionCreateRequest = Body(...)):
 
 
 @router.get("/user/{user_id}", response_model=SessionListResponse)
-async def get_user_sessions(user_id: str = Path(..., description="ID của người dùng")):
-    user_sessions = list_sessions_for_user(user_id)
-    return SessionListResponse(user_id=user_id, sessions=user_sessions)
+async def get_user_sessions(
+        user_id: str = Path(..., description="ID của người dùng"),
+        limit: int = Query(50, ge=1, le=200, description="Số phiên tối đa mỗi trang"),
+        cursor: Optional[str] = Query(None, description="Giá trị next_cursor của trang trước")
+):
+    try:
+        # Lấy dư một dòng để biết còn trang tiếp theo hay không
+        user_sessions = await list_sessions_for_user(user_id, limit + 1, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    next_cursor = None
+    if len(user_sessions) > limit:
+        user_sessions = user_sessions[:limit]
+        next_cursor = encode_session_cursor(user_sessions[-1])
+    return SessionListResponse(user_id=user_id, sessions=user_sessions, next_cursor=next_cursor)
 
 
 @router.get("/{session_id}/history", response_model=HistoryResponse)
 async def get_session_history(session_id: int = Path(..., description="ID của phiên")):
-    history_messages = load_chat_history(session_id)
+    history_messages = await load_chat_history(session_id)
     if not history_messages:
         raise HTTPException(status_code=404, detail=f"Không tìm thấy lịch sử cho phiên ID {session_id}.")
 
@@ -72,7 +86,7 @@ async def get_session_history(session_id: int = Path(..., description="ID của
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chat_session(session_id: int = Path(..., description="ID của phiên cần xóa")):
-    success = delete_session(session_id)
+    success = await delete_session(session_id)
     if not success:
         raise HTTPException(status_code=404, detail=f"Không tìm thấy phiên ID {session_id} để xóa.")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -81,7 +95,7 @@ async def delete_chat_session(session_id: int = Path(..., description="ID của
 @router.put("/{session_id}/rename", response_model=SessionInfo)
 async def rename_chat_session(session_id: int = Path(..., description="ID của phiên"),
                               request: SessionRenameRequest = Body(...)):
-    success = rename_session(session_id, request.new_name)
+    success = await rename_session(session_id, request.new_name)
     if not success:
         raise HTTPException(status_code=404, detail=f"Không tìm thấy phiên ID {session_id} để đổi tên.")
     return SessionInfo(id=session_id, session_name=request.new_name, updated_at=datetime.now(timezone.utc))
@@ -107,7 +121,7 @@ async def find_existing_session(request: Request):
 
     print(f"API: Nhận yêu cầu tìm phiên: user='{user_id}', type='{session_type}', context={context}")
 
-    session_info = find_session(user_id, session_type, context if context else None)
+    session_info = await find_session(user_id, session_type, context if context else None)
 
     if session_info:
         return session_info
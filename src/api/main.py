@@ -1,11 +1,19 @@
 # src/api/main.py
+import asyncio
 
 from fastapi import FastAPI
 # === BƯỚC 1: IMPORT CORSMiddleware ===
 from fastapi.middleware.cors import CORSMiddleware
 
 # Giả sử bạn có các router này
-from .endpoints import chat, sessions, planner, learning, reviewer, speaking, dispatcher
+from .endpoints import chat, sessions, planner, learning, reviewer, speaking, dispatcher, metrics
+from ..core.connection_pool import close_engine
+from ..core.async_database import close_async_pool
+from ..core.session_manager import write_behind_queue
+from ..core.embedding import warm_up_embedding_model, embedding_executor
+from ..core.memory_index import memory_indexes, warm_up_memory_indexes
+from ..core.reranker import reranker
+from ..config import settings
 
 # Khởi tạo ứng dụng FastAPI
 app = FastAPI(
@@ -30,6 +38,31 @@ app.add_middleware(
 app.include_router(sessions.router, prefix="/sessions", tags=["Session Management"])
 app.include_router(planner.router, prefix="/planner", tags=["Learning Path Planner"])
 app.include_router(dispatcher.router, prefix="", tags=["Dispatcher"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
+
+
+@app.on_event("startup")
+async def warm_up_models():
+    if settings.EMBEDDING_WARMUP_ON_STARTUP:
+        # Nạp model trong luồng riêng để không chặn event loop
+        elapsed = await asyncio.to_thread(warm_up_embedding_model)
+        print(f"[Startup] Warm-up model embedding mất {elapsed:.2f}s.")
+    if memory_indexes:
+        await asyncio.to_thread(warm_up_memory_indexes)
+    if reranker:
+        await asyncio.to_thread(reranker.warm_up)
+
+
+@app.on_event("shutdown")
+async def shutdown_db_pool():
+    if write_behind_queue:
+        # Ghi nốt các tin nhắn đang chờ trước khi đóng pool
+        write_behind_queue.close()
+    if embedding_executor:
+        embedding_executor.shutdown()
+    await close_async_pool()
+    close_engine()
+
 
 @app.get("/", tags=["Root"])
 async def read_root():
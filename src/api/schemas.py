@@ -14,6 +14,7 @@ class SessionInfo(BaseModel):
 class SessionListResponse(BaseModel):
     user_id: str
     sessions: List[SessionInfo]
+    next_cursor: Optional[str] = Field(None, description="Truyền vào tham số `cursor` để lấy trang tiếp theo; null nếu đã hết.")
 
 class SessionCreateRequest(BaseModel):
     user_id: str = Field(..., description="ID của người dùng đang tạo phiên.")
@@ -10,11 +10,107 @@ DB_NAME = os.getenv("DB_NAME", "agentic_rag_db")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE_SECONDS", 30))
+# Số dòng mỗi lần tải về của stream_sql_query (server-side cursor)
+DB_STREAM_ITERSIZE = int(os.getenv("DB_STREAM_ITERSIZE", 2000))
+# Đo thời gian từng câu lệnh SQL (xem core/query_metrics.py, /metrics/db_queries)
+DB_QUERY_METRICS_ENABLED = os.getenv("DB_QUERY_METRICS_ENABLED", "true").lower() == "true"
+# Câu lệnh chạy lâu hơn ngưỡng này (ms) được ghi vào slow-query log (0 = tắt)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", 100))
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DEFAULT_LLM_MODEL = os.getenv("DEFAULT_LLM_MODEL", "gpt-3.5-turbo")
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
 EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", 384))
+# Backend chạy model embedding: "torch" hoặc "onnx" (ONNX Runtime, xem core/embedding.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# Lượng tử hóa int8 động cho backend onnx: avx2, avx512, avx512_vnni, arm64 (rỗng = float32)
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "data/onnx_models")
+# Nạp sẵn model embedding khi API khởi động (false = nạp ở lượt truy vấn đầu tiên)
+EMBEDDING_WARMUP_ON_STARTUP = os.getenv("EMBEDDING_WARMUP_ON_STARTUP", "true").lower() == "true"
+# Cache LRU embedding của câu truy vấn (EMBEDDING_CACHE_MAX_BYTES = 0 để tắt; TTL 0 = không hết hạn)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 0))
+# Gom các lượt encode câu truy vấn đồng thời thành một lô (xem EmbeddingBatcher)
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 2))
+# Nơi chạy encode: "thread" (thread pool), "process" (process pool, vector trả về qua
+# shared memory) hoặc rỗng (ngay trong luồng gọi)
+EMBEDDING_EXECUTOR = os.getenv("EMBEDDING_EXECUTOR", "thread").lower()
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", 2))
+# Số luồng intra-op của torch / ONNX Runtime cho mỗi model (0 = mặc định của thư viện)
+EMBEDDING_INTRA_OP_THREADS = int(os.getenv("EMBEDDING_INTRA_OP_THREADS", 0))
+# Cache embedding trên đĩa cho các script nạp dữ liệu (rỗng = tắt)
+EMBEDDING_DISK_CACHE_DIR = os.getenv("EMBEDDING_DISK_CACHE_DIR", "data/embedding_cache")
+
+# Cửa sổ lịch sử chat đưa vào agent mỗi lượt (0 = không giới hạn)
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", 20))
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", 4000))
+# Cache lịch sử trong tiến trình (CHAT_HISTORY_CACHE_MAX_SESSIONS = 0 để tắt)
+CHAT_HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("CHAT_HISTORY_CACHE_MAX_SESSIONS", 1000))
+CHAT_HISTORY_CACHE_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_CACHE_MAX_MESSAGES", 200))
+# Ghi trễ tin nhắn chat: gom các lượt trong tiến trình và ghi theo lô
+CHAT_WRITE_BEHIND_ENABLED = os.getenv("CHAT_WRITE_BEHIND_ENABLED", "false").lower() == "true"
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS", 200))
+CHAT_WRITE_BEHIND_MAX_BATCH = int(os.getenv("CHAT_WRITE_BEHIND_MAX_BATCH", 100))
+# Số lần ghi lỗi tối đa của một phiên trước khi bỏ các tin nhắn đang chờ của phiên đó
+CHAT_WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_BEHIND_MAX_ATTEMPTS", 5))
+# Cache task context trong tiến trình (TASK_CONTEXT_CACHE_MAX_ENTRIES = 0 để tắt)
+TASK_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("TASK_CONTEXT_CACHE_MAX_ENTRIES", 2000))
+TASK_CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("TASK_CONTEXT_CACHE_TTL_SECONDS", 300))
 
 RAG_CONTENT_CHUNK_TABLE = os.getenv("RAG_CONTENT_CHUNK_TABLE", "contentchunks")
+# Tìm kiếm kết hợp từ vựng (n-gram ký tự) + vector, gộp bằng reciprocal rank fusion.
+# Phần từ vựng chỉ chạy trên index trong bộ nhớ (VECTOR_MEMORY_INDEX_TABLES); không có thì chỉ dùng vector
+RAG_HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "false").lower() == "true"
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", 20))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", 60))
+# Cache kết quả truy xuất theo thế hệ bộ tài liệu (RETRIEVAL_CACHE_MAX_ENTRIES = 0 để tắt; cần migration 0009)
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", 2048))
+RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS = float(os.getenv("RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS", 5))
+# Xếp hạng lại RERANK_CANDIDATES ứng viên bằng cross-encoder trên CPU, tối đa
+# RERANK_BUDGET_MS mỗi lượt (quá ngân sách thì giữ thứ tự ANN)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 150))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 256))
+# Khi ước lượng ms / cặp vượt ngân sách, mỗi chừng này giây vẫn cho một lượt chấm để đo lại
+RERANK_PROBE_SECONDS = float(os.getenv("RERANK_PROBE_SECONDS", 30))
+# Đa dạng hóa kết quả truy xuất: lấy RAG_MMR_CANDIDATES ứng viên, bỏ chunk gần trùng
+# (tỉ lệ shingle ký tự chung >= RAG_DEDUP_THRESHOLD) rồi chọn top-k bằng MMR
+RAG_DIVERSIFY = os.getenv("RAG_DIVERSIFY", "true").lower() == "true"
+RAG_MMR_CANDIDATES = int(os.getenv("RAG_MMR_CANDIDATES", 12))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", 0.7))
+RAG_DEDUP_SHINGLE_SIZE = int(os.getenv("RAG_DEDUP_SHINGLE_SIZE", 5))
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", 0.8))
+
+# Index ANN cho cột embedding (dùng khi chạy migration): "hnsw" hoặc "ivfflat"
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", 16))
+VECTOR_INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_INDEX_HNSW_EF_CONSTRUCTION", 64))
+VECTOR_INDEX_IVFFLAT_LISTS = int(os.getenv("VECTOR_INDEX_IVFFLAT_LISTS", 100))
+VECTOR_INDEX_MAINTENANCE_WORK_MEM = os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "256MB")
+# Tham số tìm kiếm ANN cho mỗi truy vấn (0 = dùng mặc định của pgvector)
+VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", 40))
+VECTOR_IVFFLAT_PROBES = int(os.getenv("VECTOR_IVFFLAT_PROBES", 10))
+# Cách tìm chunk: "exact" (cosine trên vector đầy đủ), "halfvec" hoặc "binary"
+# (tìm ứng viên qua index halfvec / nhị phân rồi xếp lại bằng cosine đầy đủ; cần pgvector >= 0.7)
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "exact").lower()
+VECTOR_RERANK_CANDIDATES = int(os.getenv("VECTOR_RERANK_CANDIDATES", 40))
+# Bản sao trong bộ nhớ của các bảng chunk (tìm top-k bằng NumPy, không qua
+# pgvector). Danh sách bảng cách nhau bởi dấu phẩy, rỗng = tắt; cần migration 0008.
+VECTOR_MEMORY_INDEX_TABLES = [t.strip() for t in os.getenv("VECTOR_MEMORY_INDEX_TABLES", "").split(",") if t.strip()]
+VECTOR_MEMORY_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_MEMORY_INDEX_REFRESH_SECONDS", 30))
+# Quá thời gian này kể từ lần làm mới thành công cuối cùng thì quay về truy vấn SQL
+VECTOR_MEMORY_INDEX_MAX_STALENESS_SECONDS = float(os.getenv("VECTOR_MEMORY_INDEX_MAX_STALENESS_SECONDS", 300))
+# Nạp lại toàn bộ bảng định kỳ (ngoài các lần làm mới theo change_version); 0 = tắt
+VECTOR_MEMORY_INDEX_FULL_RELOAD_SECONDS = float(os.getenv("VECTOR_MEMORY_INDEX_FULL_RELOAD_SECONDS", 3600))
 
 CMS_API_BASE_URL = os.getenv("CMS_API_BASE_URL", "http://localhost:8080/api")
\ No newline at end of file
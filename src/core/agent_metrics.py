@@ -0,0 +1,93 @@
+# src/core/agent_metrics.py
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Số lượt lặp (số lần gọi LLM) và số lần gọi tool của mỗi lượt chat theo từng
+# agent. Mỗi lượt tool trả về ngữ cảnh không đúng thường kéo theo thêm một vòng
+# LLM + tool, nên đây là chỉ số để so sánh các thay đổi ở bước truy xuất (vd:
+# bật / tắt RERANK_ENABLED) theo độ trễ thực tế của cả lượt chat.
+
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+
+
+class AgentTurnCounter(BaseCallbackHandler):
+    """Callback đếm số lần gọi LLM / tool trong một lần ainvoke của AgentExecutor."""
+
+    # Chạy ngay trong event loop thay vì qua thread pool (chỉ tăng bộ đếm)
+    run_inline = True
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tool_calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_calls += 1
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+
+
+class _AgentStats:
+    __slots__ = ("turns", "llm_calls", "tool_calls", "total_ms", "iterations")
+
+    def __init__(self):
+        self.turns = 0
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.total_ms = 0.0
+        self.iterations = [0] * (len(ITERATION_BUCKETS) + 1)
+
+
+class AgentTurnMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: Dict[str, _AgentStats] = defaultdict(_AgentStats)
+
+    def record(self, agent: str, counter: AgentTurnCounter, duration_ms: float):
+        index = next((i for i, bound in enumerate(ITERATION_BUCKETS) if counter.llm_calls <= bound),
+                     len(ITERATION_BUCKETS))
+        with self._lock:
+            stats = self._agents[agent]
+            stats.turns += 1
+            stats.llm_calls += counter.llm_calls
+            stats.tool_calls += counter.tool_calls
+            stats.total_ms += duration_ms
+            stats.iterations[index] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in ITERATION_BUCKETS] + ["inf"]
+        with self._lock:
+            return {
+                agent: {
+                    "turns": stats.turns,
+                    "avg_iterations": round(stats.llm_calls / stats.turns, 3),
+                    "avg_tool_calls": round(stats.tool_calls / stats.turns, 3),
+                    "avg_turn_ms": round(stats.total_ms / stats.turns, 1),
+                    "iterations": dict(zip(labels, stats.iterations)),
+                }
+                for agent, stats in self._agents.items() if stats.turns
+            }
+
+    def reset(self):
+        with self._lock:
+            self._agents.clear()
+
+
+agent_turn_metrics = AgentTurnMetrics()
+
+
+async def ainvoke_agent(agent, input_data: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """agent.ainvoke(input_data) kèm ghi nhận số lượt lặp / số lần gọi tool vào agent_turn_metrics."""
+    counter = AgentTurnCounter()
+    start = time.perf_counter()
+    try:
+        return await agent.ainvoke(input_data, config={"callbacks": [counter]})
+    finally:
+        agent_turn_metrics.record(name, counter, (time.perf_counter() - start) * 1000)
@@ -0,0 +1,117 @@
+# src/core/async_context_manager.py
+
+import json
+from typing import Optional, Dict, Any
+
+from .async_database import async_db_connection
+from .context_manager import task_context_cache, build_update_query
+
+# Bản bất đồng bộ của context_manager.py cho các endpoint FastAPI.
+# Dùng chung cache task_context_cache với bản đồng bộ.
+
+
+async def save_task_context(session_id: int, intent_name: str, status: str, context_data: Dict[str, Any]):
+    """
+    Lưu hoặc cập nhật trạng thái của một nhiệm vụ vào database.
+    Sử dụng ON CONFLICT để tự động UPDATE nếu đã tồn tại.
+    """
+    try:
+        async with async_db_connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO task_contexts (session_id, intent_name, status, context_data, updated_at)
+                VALUES (%s, %s, %s, %s, NOW())
+                ON CONFLICT (session_id, intent_name) DO UPDATE SET
+                    status = EXCLUDED.status,
+                    context_data = EXCLUDED.context_data,
+                    updated_at = NOW();
+                """,
+                (session_id, intent_name, status, json.dumps(context_data))
+            )
+        task_context_cache.put(session_id, intent_name, {"status": status, "data": context_data or {}})
+        print(f"[Context Manager] Đã lưu context cho session {session_id}, intent {intent_name}")
+    except Exception as e:
+        print(f"[Lỗi] Không thể lưu task context: {e}")
+        task_context_cache.invalidate(session_id, intent_name)
+
+
+async def update_task_context(
+        session_id: int,
+        intent_name: str,
+        updates: Dict[Any, Any],
+        status: Optional[str] = None
+) -> bool:
+    """Cập nhật một phần context_data theo đường dẫn bằng jsonb_set (xem context_manager)."""
+    if not updates and status is None: return True
+    query, params, normalized = build_update_query(updates, status)
+    updated = False
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute(query, params + [session_id, intent_name])
+            updated = cur.rowcount > 0
+        if updated:
+            task_context_cache.apply_updates(session_id, intent_name, normalized, status)
+        else:
+            task_context_cache.put(session_id, intent_name, None)
+    except Exception as e:
+        print(f"[Lỗi] Không thể cập nhật task context: {e}")
+        task_context_cache.invalidate(session_id, intent_name)
+    return updated
+
+
+async def load_task_context(session_id: int, intent_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Tải trạng thái của một nhiệm vụ cụ thể (từ cache nếu có, ngược lại từ database).
+    """
+    cached, context = task_context_cache.get(session_id, intent_name)
+    if cached:
+        return context
+
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute(
+                "SELECT status, context_data FROM task_contexts WHERE session_id = %s AND intent_name = %s;",
+                (session_id, intent_name)
+            )
+            result = await cur.fetchone()
+            if result:
+                status, context_data = result
+                context = {"status": status, "data": context_data or {}}
+                print(f"[Context Manager] Đã tải context cho session {session_id}, intent {intent_name}")
+            task_context_cache.put(session_id, intent_name, context)
+    except Exception as e:
+        print(f"[Lỗi] Không thể tải task context: {e}")
+
+    return context
+
+
+async def clear_task_context(session_id: int, intent_name: str):
+    """
+    Xóa trạng thái của một nhiệm vụ sau khi nó đã hoàn thành.
+    """
+    try:
+        async with async_db_connection() as conn:
+            await conn.execute(
+                "DELETE FROM task_contexts WHERE session_id = %s AND intent_name = %s;",
+                (session_id, intent_name)
+            )
+        task_context_cache.put(session_id, intent_name, None)
+        print(f"[Context Manager] Đã xóa context cho session {session_id}, intent {intent_name}")
+    except Exception as e:
+        print(f"[Lỗi] Không thể xóa task context: {e}")
+        task_context_cache.invalidate(session_id, intent_name)
+
+
+async def clear_session_task_contexts(session_id: int) -> int:
+    """Xóa toàn bộ context của một phiên đã kết thúc. Trả về số context đã xóa."""
+    deleted = 0
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute("DELETE FROM task_contexts WHERE session_id = %s;", (session_id,))
+            deleted = cur.rowcount
+        print(f"[Context Manager] Đã xóa {deleted} context của session {session_id}")
+    except Exception as e:
+        print(f"[Lỗi] Không thể xóa các task context của phiên: {e}")
+    finally:
+        task_context_cache.invalidate_session(session_id)
+    return deleted
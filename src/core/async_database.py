@@ -0,0 +1,213 @@
+# src/core/async_database.py
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Sequence
+
+import numpy as np
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import namedtuple_row
+from psycopg_pool import AsyncConnectionPool
+
+from src.config import settings
+from src.core.query_metrics import query_metrics, query_text
+from src.core.database import (
+    vector_search_settings_sql, chunk_search_query, chunk_search_many_query, chunk_filter_sql, group_ranked_rows,
+)
+from src.core.embedding import to_pgvector
+from src.core.memory_index import get_memory_index
+
+# Bản bất đồng bộ của database.py, dùng cho các endpoint FastAPI (async def)
+# để I/O database không chặn event loop. main_cli.py và các script nạp dữ liệu
+# vẫn dùng bản đồng bộ.
+
+class InstrumentedAsyncCursor(psycopg.AsyncCursor):
+    """Bản bất đồng bộ của query_metrics.InstrumentedCursor cho các kết nối psycopg 3."""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = await super().execute(query, params, **kwargs)
+            error = False
+            return result
+        finally:
+            self._record(query, params, start, error)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = await super().executemany(query, params_seq, **kwargs)
+            error = False
+            return result
+        finally:
+            self._record(query, None, start, error)
+
+    def _record(self, query, params, start: float, error: bool):
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            text = query_text(query, self)
+        except Exception:
+            return
+        sample = None
+        if query_metrics.slow_query_ms > 0 and duration_ms >= query_metrics.slow_query_ms:
+            try:
+                sample = psycopg.AsyncClientCursor(self.connection).mogrify(query, params)
+            except Exception:
+                sample = None
+        query_metrics.record(text, duration_ms, rows=self.rowcount, error=error, source="async", sample=sample)
+
+
+_async_pool: Optional[AsyncConnectionPool] = None
+_async_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """Trả về pool bất đồng bộ dùng chung, mở pool ở lần gọi đầu tiên."""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                conninfo = make_conninfo(
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    dbname=settings.DB_NAME,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASSWORD
+                )
+                pool = AsyncConnectionPool(
+                    conninfo,
+                    min_size=settings.DB_POOL_MIN_SIZE,
+                    max_size=settings.DB_POOL_MAX_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    check=AsyncConnectionPool.check_connection,
+                    kwargs={"cursor_factory": InstrumentedAsyncCursor} if settings.DB_QUERY_METRICS_ENABLED else None,
+                    open=False
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Mượn một kết nối bất đồng bộ từ pool. Giao dịch được commit khi khối lệnh
+    kết thúc bình thường và rollback nếu có ngoại lệ.
+
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur: ...
+    """
+    pool = await get_async_pool()
+    start = time.perf_counter()
+    async with pool.connection() as conn:
+        query_metrics.record_pool_wait((time.perf_counter() - start) * 1000)
+        yield conn
+
+
+async def execute_sql_query(query: str, params: tuple = None, setup_sql: str = None) -> List[Dict[str, Any]]:
+    """
+    Bản bất đồng bộ của database.execute_sql_query: thực thi một câu lệnh SELECT
+    và trả về danh sách các dictionary. Trả về danh sách rỗng nếu có lỗi.
+    `setup_sql` (ví dụ các lệnh SET LOCAL) chạy trước trong cùng giao dịch.
+    """
+    results = []
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                if setup_sql:
+                    # psycopg 3 không cho gửi nhiều lệnh cùng tham số trong một execute
+                    await cur.execute(setup_sql)
+                await cur.execute(query, params or ())
+                if cur.description:
+                    colnames = [desc[0] for desc in cur.description]
+                    for row in await cur.fetchall():
+                        results.append(dict(zip(colnames, row)))
+            # Giống bản đồng bộ: hàm này không commit thay đổi
+            await conn.rollback()
+    except psycopg.Error as e:
+        # Bao gồm cả PoolTimeout khi chờ kết nối quá lâu
+        print(f"Lỗi khi thực thi câu lệnh SQL (async): {e}")
+
+    return results
+
+
+async def execute_vector_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
+    """Bản bất đồng bộ của database.execute_vector_query (áp dụng hnsw.ef_search / ivfflat.probes)."""
+    return await execute_sql_query(query, params, setup_sql=vector_search_settings_sql())
+
+
+async def search_chunk_rows(table: str, columns: Sequence[str], query_vector: np.ndarray, top_k: int,
+                            filters: Dict[str, Any] = None, ignore_case: Sequence[str] = (),
+                            mode: str = None) -> List[Dict[str, Any]]:
+    """
+    Bản bất đồng bộ của database.search_chunk_rows. Phép nhân ma trận của index
+    trong bộ nhớ chạy trong thread pool để không chặn event loop.
+    """
+    index = get_memory_index(table)
+    rows = await asyncio.to_thread(index.search, query_vector, top_k, columns, filters,
+                                   ignore_case) if index else None
+    if rows is not None:
+        return rows
+    where_clauses, where_params = chunk_filter_sql(filters, ignore_case)
+    query, params = chunk_search_query(table, columns, to_pgvector(query_vector), top_k,
+                                       where_clauses, where_params, mode)
+    return await execute_vector_query(query, params)
+
+
+async def search_chunk_rows_many(table: str, columns: Sequence[str], query_vectors: np.ndarray, top_k: int,
+                                 filters: Dict[str, Any] = None, ignore_case: Sequence[str] = (),
+                                 mode: str = None) -> List[List[Dict[str, Any]]]:
+    """Bản bất đồng bộ của database.search_chunk_rows_many."""
+    if not len(query_vectors):
+        return []
+    index = get_memory_index(table)
+    results = await asyncio.to_thread(index.search_many, query_vectors, top_k, columns, filters,
+                                      ignore_case) if index else None
+    if results is not None:
+        return results
+    where_clauses, where_params = chunk_filter_sql(filters, ignore_case)
+    query, params = chunk_search_many_query(table, columns, [to_pgvector(v) for v in query_vectors], top_k,
+                                            where_clauses, where_params, mode)
+    return group_ranked_rows(await execute_vector_query(query, params), len(query_vectors), columns)
+
+
+async def stream_sql_query(query: str, params: tuple = None, itersize: int = None,
+                           named: bool = False) -> AsyncIterator[tuple]:
+    """
+    Bản bất đồng bộ của database.stream_sql_query: đọc kết quả qua server-side
+    cursor, mỗi lần `itersize` dòng, trả về tuple hoặc namedtuple.
+
+        async for row in stream_sql_query("SELECT ..."):
+            ...
+    """
+    try:
+        async with async_db_connection() as conn:
+            row_factory = namedtuple_row if named else None
+            cursor_kwargs = {"row_factory": row_factory} if row_factory else {}
+            async with conn.cursor(name=f"stream_{uuid.uuid4().hex}", **cursor_kwargs) as cur:
+                cur.itersize = itersize or settings.DB_STREAM_ITERSIZE
+                await cur.execute(query, params or ())
+                async for row in cur:
+                    yield row
+            await conn.rollback()
+    except psycopg.Error as e:
+        print(f"Lỗi khi đọc streaming câu lệnh SQL (async): {e}")
+
+
+def get_async_pool_stats() -> Dict[str, Any]:
+    """Số liệu của pool bất đồng bộ (rỗng nếu pool chưa được mở)."""
+    if _async_pool is None:
+        return {}
+    return _async_pool.get_stats()
+
+
+async def close_async_pool():
+    """Đóng pool bất đồng bộ (gọi khi tắt ứng dụng)."""
+    global _async_pool
+    pool, _async_pool = _async_pool, None
+    if pool is not None:
+        await pool.close()
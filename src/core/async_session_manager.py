@@ -0,0 +1,324 @@
+# src/core/async_session_manager.py
+import asyncio
+import json
+from typing import List, Dict, Any, Optional
+from langchain_core.messages import BaseMessage
+import psycopg
+
+from .async_database import async_db_connection
+from .history_cache import history_cache, history_window, CachedSession
+from .context_manager import task_context_cache
+from .session_manager import (
+    row_to_message, message_type_of, format_history_for_prompt, TAIL_HISTORY_SQL, NEW_HISTORY_SQL,
+    APPEND_MESSAGES_SQL, append_messages_params, list_sessions_query, encode_session_cursor,
+    write_behind_queue, pending_batches, merge_pending, cached_history
+)
+
+# Bản bất đồng bộ của session_manager.py cho các endpoint FastAPI.
+# Các hàm giữ nguyên tên, tham số và giá trị trả về như bản đồng bộ.
+
+
+async def get_or_create_user(user_id: str) -> bool:
+    """Kiểm tra user_id có tồn tại không, nếu không thì tạo mới."""
+    try:
+        async with async_db_connection() as conn:
+            await conn.execute('INSERT INTO "User" (id) VALUES (%s) ON CONFLICT (id) DO NOTHING;', (user_id,))
+        print(f"Đã xác thực hoặc tạo người dùng: {user_id}")
+        return True
+    except psycopg.Error as e:
+        print(f"Lỗi khi get/create user: {e}")
+        return False
+
+
+async def list_sessions_for_user(
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Lấy danh sách các phiên làm việc của một người dùng, sắp xếp theo thời gian
+    cập nhật gần nhất, phân trang keyset bằng `limit` và `cursor`.
+    Ném ValueError nếu con trỏ không hợp lệ.
+    """
+    query, params = list_sessions_query(user_id, limit, cursor)
+    sessions = []
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute(query, params)
+            for row in await cur.fetchall():
+                sessions.append({"id": row[0], "session_name": row[1], "updated_at": row[2]})
+    except psycopg.Error as e:
+        print(f"Lỗi khi liệt kê các phiên: {e}")
+    return sessions
+
+
+async def create_new_session(
+        user_id: str,
+        session_name: str,
+        session_type: str = 'GENERAL',
+        context: Optional[Dict[str, Any]] = None
+) -> Optional[int]:
+    """Tạo một phiên mới với loại và ngữ cảnh cụ thể."""
+    session_id = None
+    try:
+        async with async_db_connection() as conn:
+            context_json = json.dumps(context) if context else None
+            cur = await conn.execute(
+                """
+                INSERT INTO chat_session (user_id, session_name, session_type, context)
+                VALUES (%s, %s, %s, %s) RETURNING id;
+                """,
+                (user_id, session_name, session_type.upper(), context_json)
+            )
+            session_id = (await cur.fetchone())[0]
+        print(f"Đã tạo phiên '{session_name}' (Loại: {session_type}) với ID: {session_id}")
+    except psycopg.Error as e:
+        print(f"Lỗi khi tạo phiên mới: {e}")
+        session_id = None
+    return session_id
+
+
+async def _load_cached_session(conn, session_id: int) -> Optional[CachedSession]:
+    """Bản bất đồng bộ của session_manager._load_cached_session."""
+    entry = history_cache.get(session_id)
+    if entry is not None:
+        last_order, message_count = history_cache.position(entry)
+        cur = await conn.execute(NEW_HISTORY_SQL, (last_order, last_order, session_id))
+        rows = await cur.fetchall()
+        if not rows:
+            history_cache.invalidate(session_id)
+            return None
+        if rows[0][3] >= message_count:
+            history_cache.extend(session_id, [row[:3] for row in rows if row[0] is not None], row_to_message)
+            return entry
+        # Tin nhắn trong cache đã bị xóa (rewind_last_turn ở tiến trình khác): tải lại
+        history_cache.invalidate(session_id)
+
+    cur = await conn.execute(
+        "SELECT user_id, session_type, context FROM chat_session WHERE id = %s;",
+        (session_id,)
+    )
+    session_info = await cur.fetchone()
+    if not session_info:
+        return None
+    user_id, session_type, context = session_info
+    cur = await conn.execute(TAIL_HISTORY_SQL, (session_id, history_cache.max_messages))
+    rows = list(reversed(await cur.fetchall()))
+    return history_cache.store(session_id, user_id, session_type, context, [row[:3] for row in rows],
+                               row_to_message, rows[-1][3] if rows else 0)
+
+
+async def load_session_data(
+        session_id: int,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Tải dữ liệu của một phiên: loại, context và phần đuôi lịch sử chat
+    (giới hạn theo số lượt / ngân sách token, phục vụ từ cache trong tiến trình).
+    """
+    session_data = None
+    try:
+        async with async_db_connection() as conn:
+            batches = pending_batches(session_id)
+            entry = await _load_cached_session(conn, session_id)
+            if not entry:
+                print(f"[Lỗi] Không tìm thấy session với ID {session_id}")
+                return None
+
+            session_data = {
+                "user_id": entry.user_id,
+                "type": entry.session_type,
+                "context": entry.context,
+                "history": history_window(cached_history(entry, batches), max_turns, max_tokens)
+            }
+            print(f"[Thông báo] Đã tải thành công dữ liệu cho phiên {session_id} (Loại: {entry.session_type})")
+    except psycopg.Error as e:
+        print(f"Lỗi] Không thể tải dữ liệu phiên: {e}")
+
+    return session_data
+
+
+async def load_recent_history(
+        session_id: int,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None
+) -> List[BaseMessage]:
+    """Tải phần đuôi lịch sử chat của một phiên (mặc định theo settings)."""
+    history = []
+    try:
+        async with async_db_connection() as conn:
+            batches = pending_batches(session_id)
+            entry = await _load_cached_session(conn, session_id)
+            if entry:
+                history = history_window(cached_history(entry, batches), max_turns, max_tokens)
+    except psycopg.Error as e:
+        print(f"Lỗi khi tải lịch sử chat: {e}")
+    return history
+
+
+async def load_chat_history(session_id: int) -> List[BaseMessage]:
+    """Tải lịch sử chat của một phiên từ database bằng ID số của phiên."""
+    history = []
+    try:
+        async with async_db_connection() as conn:
+            batches = pending_batches(session_id)
+            cur = await conn.execute(
+                "SELECT messenger_order, messenger_type, content FROM chat_messenger WHERE session_id = %s ORDER BY messenger_order ASC;",
+                (session_id,)
+            )
+            rows = await cur.fetchall()
+            history = [row_to_message(msg_type, content) for _, msg_type, content in rows]
+            history = merge_pending(history, rows[-1][0] if rows else 0, batches)
+    except psycopg.Error as e:
+        print(f"Lỗi khi tải lịch sử chat: {e}")
+    return history
+
+
+async def add_new_messages(session_id: int, new_messages: List[BaseMessage]):
+    """Thêm các tin nhắn mới vào một phiên đã có (một câu lệnh, an toàn khi ghi đồng thời)."""
+    if not new_messages: return
+    if write_behind_queue:
+        write_behind_queue.enqueue(session_id, new_messages)
+        return
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute(APPEND_MESSAGES_SQL, append_messages_params(session_id, new_messages))
+            orders = [row[0] for row in await cur.fetchall()]
+        if not orders:
+            print(f"[Lỗi] Không tìm thấy session với ID {session_id}")
+            return
+        history_cache.append_messages(session_id, min(orders), new_messages)
+    except psycopg.Error as e:
+        print(f"Lỗi khi thêm tin nhắn mới: {e}")
+
+
+async def delete_session(session_id: int) -> bool:
+    """
+    Xóa một phiên trò chuyện và tất cả các tin nhắn liên quan khỏi database.
+    Trả về True nếu xóa thành công, False nếu không tìm thấy phiên.
+    """
+    deleted_rows = 0
+    if write_behind_queue:
+        write_behind_queue.discard(session_id)
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute("DELETE FROM chat_session WHERE id = %s;", (session_id,))
+            deleted_rows = cur.rowcount
+        history_cache.invalidate(session_id)
+        task_context_cache.invalidate_session(session_id)
+        if deleted_rows > 0:
+            print(f"[Thông báo] Đã xóa thành công phiên có ID: {session_id}")
+    except psycopg.Error as e:
+        print(f"[Lỗi] Không thể xóa phiên {session_id}: {e}")
+        deleted_rows = 0
+
+    return deleted_rows > 0
+
+
+async def rename_session(session_id: int, new_name: str) -> bool:
+    """
+    Cập nhật lại tên của một phiên trò chuyện.
+    Trả về True nếu cập nhật thành công, False nếu không tìm thấy phiên.
+    """
+    updated_rows = 0
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute(
+                "UPDATE chat_session SET session_name = %s, updated_at = NOW() WHERE id = %s;",
+                (new_name, session_id)
+            )
+            updated_rows = cur.rowcount
+        if updated_rows > 0:
+            print(f"[Thông báo] Đã đổi tên phiên {session_id} thành '{new_name}'")
+    except psycopg.Error as e:
+        print(f"[Lỗi] Không thể đổi tên phiên {session_id}: {e}")
+        updated_rows = 0
+
+    return updated_rows > 0
+
+
+async def rewind_last_turn(session_id: int) -> bool:
+    """
+    Xóa 2 tin nhắn cuối cùng (một cặp Human-AI) khỏi một phiên trong database.
+    Trả về True nếu xóa thành công, False nếu có lỗi hoặc không có đủ tin nhắn để xóa.
+    """
+    success = False
+    if write_behind_queue:
+        # Lượt cuối có thể vẫn đang nằm trong hàng đợi ghi trễ
+        await asyncio.to_thread(write_behind_queue.flush, session_id)
+    try:
+        async with async_db_connection() as conn:
+            cur = await conn.execute(
+                "SELECT id FROM chat_messenger WHERE session_id = %s ORDER BY messenger_order DESC LIMIT 2;",
+                (session_id,)
+            )
+            rows_to_delete = await cur.fetchall()
+
+            if len(rows_to_delete) >= 2:
+                # psycopg 3 không hỗ trợ "IN %s" với tuple, dùng "= ANY(%s)" với list
+                await conn.execute(
+                    "DELETE FROM chat_messenger WHERE id = ANY(%s);",
+                    ([row[0] for row in rows_to_delete],)
+                )
+                await conn.execute("""
+                    UPDATE chat_session
+                    SET updated_at = (SELECT timestamp
+                                      FROM chat_messenger
+                                      WHERE session_id = %s
+                                      ORDER BY messenger_order DESC
+                                      LIMIT 1)
+                    WHERE id = %s;
+                """, (session_id, session_id))
+                history_cache.invalidate(session_id)
+                print(f"[Thông báo] Đã tua lại lượt nói cuối cùng cho phiên {session_id}")
+                success = True
+            else:
+                print("[Cảnh báo] Không có đủ tin nhắn để thực hiện thao tác sửa.")
+    except psycopg.Error as e:
+        print(f"[Lỗi] Không thể tua lại phiên: {e}")
+        success = False
+    return success
+
+
+async def find_session(
+        user_id: str,
+        session_type: str,
+        context: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Tìm một phiên làm việc duy nhất dựa trên user_id, loại phiên, và ngữ cảnh.
+    Trả về thông tin tóm tắt của phiên nếu tìm thấy, ngược lại trả về None.
+    """
+    session_info = None
+    try:
+        async with async_db_connection() as conn:
+            query = """
+                    SELECT id, session_name, updated_at
+                    FROM "chat_session"
+                    WHERE user_id = %s
+                      AND session_type = %s
+                    """
+            params = [user_id, session_type.upper()]
+
+            if context:
+                query += " AND context @> %s"
+                params.append(json.dumps(context))
+
+            query += " ORDER BY updated_at DESC LIMIT 1;"
+
+            cur = await conn.execute(query, tuple(params))
+            result = await cur.fetchone()
+
+            if result:
+                session_info = {
+                    "id": result[0],
+                    "session_name": result[1],
+                    "updated_at": result[2]
+                }
+                print(
+                    f"[Session Manager] Đã tìm thấy phiên '{session_type}' tồn tại cho user '{user_id}' với ID: {result[0]}")
+    except psycopg.Error as e:
+        print(f"[Lỗi] Không thể tìm phiên: {e}")
+
+    return session_info
@@ -0,0 +1,272 @@
+# src/core/connection_pool.py
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Optional, Dict, Any
+
+import psycopg2
+from psycopg2 import extensions
+
+from src.config import settings
+from src.core.query_metrics import query_metrics, InstrumentedCursor
+
+
+class PooledConnection:
+    """
+    Lớp bọc quanh một kết nối psycopg2 được mượn từ pool.
+    Gọi close() sẽ trả kết nối về pool thay vì đóng hẳn, nhờ vậy các hàm
+    theo mẫu `conn = get_db_connection() ... finally: conn.close()` vẫn dùng được.
+    Nếu đối tượng bị thu hồi mà chưa close() (nhánh lỗi bỏ quên finally), một
+    weakref.finalize đóng hẳn kết nối gốc và trả slot để pool không bị hụt dần;
+    số lần này được đếm ở "leaked" của stats().
+    """
+
+    def __init__(self, engine: "ConnectionPoolEngine", raw_conn):
+        self._engine = engine
+        self._conn = raw_conn
+        # Không giữ tham chiếu tới self: finalizer chỉ biết engine và kết nối gốc
+        self._finalizer = weakref.finalize(self, engine.reclaim_leaked, raw_conn)
+        self._finalizer.atexit = False
+
+    @property
+    def raw(self):
+        """Kết nối psycopg2 gốc (dùng khi thư viện khác yêu cầu đúng kiểu connection)."""
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._finalizer.detach()
+            self._engine.release(conn)
+
+    def _raw_or_raise(self):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise psycopg2.InterfaceError("Kết nối đã được trả về pool.")
+        return conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw_or_raise(), name)
+
+    def __setattr__(self, name, value):
+        # Các thuộc tính công khai (vd: autocommit) được gán trên kết nối gốc
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw_or_raise(), name, value)
+
+
+class ConnectionPoolEngine:
+    """
+    Pool kết nối dùng chung cho toàn tiến trình.
+    - Giới hạn số kết nối đồng thời bằng min/max size.
+    - Khi pool hết chỗ, người gọi sẽ chờ tối đa `timeout` giây.
+    - Kiểm tra sức khỏe kết nối trước khi cho mượn (kết nối đã đóng hoặc
+      nhàn rỗi quá lâu sẽ được ping lại bằng `SELECT 1`).
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, healthcheck_idle_seconds: float, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_idle_seconds = healthcheck_idle_seconds
+        self._connect_kwargs = connect_kwargs
+
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._prefill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: Dict[int, float] = {}
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._leaked = 0
+        self._in_use = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _new_connection(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._lock:
+            self._size += 1
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        with self._lock:
+            self._size -= 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _prefill(self):
+        with self._prefill_lock:
+            for _ in range(max(self.minconn - self._size, 0)):
+                conn = self._new_connection()
+                self._last_used[id(conn)] = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < self.healthcheck_idle_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout_healthy(self):
+        if self._size < self.minconn:
+            self._prefill()
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                # Đã giữ được một slot nên chắc chắn tổng số kết nối chưa vượt maxconn
+                return self._new_connection()
+            if self._is_healthy(conn):
+                return conn
+            with self._stats_lock:
+                self._discarded += 1
+            self._discard(conn)
+
+    def connect(self) -> Optional[PooledConnection]:
+        """
+        Mượn một kết nối từ pool. Trả về None nếu chờ quá `timeout` giây.
+        Ném psycopg2.Error nếu không thể tạo kết nối tới database.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._timeouts += 1
+            print(f"[Pool] Hết thời gian chờ kết nối sau {self.timeout}s (max_size={self.maxconn}).")
+            return None
+        waited = time.perf_counter() - start
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._stats_lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        query_metrics.record_pool_wait((time.perf_counter() - start) * 1000)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Trả kết nối về pool, rollback giao dịch dở dang và khôi phục autocommit."""
+        try:
+            keep = not self._closed and not conn.closed \
+                and conn.info.transaction_status != extensions.TRANSACTION_STATUS_UNKNOWN
+            if keep:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+                self._last_used[id(conn)] = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                self._discard(conn)
+        except psycopg2.Error as e:
+            print(f"[Pool] Lỗi khi trả kết nối về pool: {e}")
+            self._discard(conn)
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def reclaim_leaked(self, conn):
+        """
+        Gọi bởi finalizer của PooledConnection bị thu hồi khi chưa close(): không
+        biết trạng thái giao dịch nên đóng hẳn kết nối gốc, rồi trả slot.
+        """
+        with self._stats_lock:
+            self._leaked += 1
+            self._in_use -= 1
+        print("[Pool] Một kết nối bị bỏ mà không close(); đã đóng kết nối và trả slot về pool.")
+        try:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "leaked": self._leaked,
+                "wait_total_ms": round(self._wait_total * 1000, 3),
+                "wait_avg_ms": round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+    def close_all(self):
+        """Đóng các kết nối nhàn rỗi; kết nối đang được mượn sẽ bị đóng khi trả về."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+
+_engine: Optional[ConnectionPoolEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ConnectionPoolEngine:
+    """Trả về pool dùng chung của tiến trình, khởi tạo từ settings ở lần gọi đầu tiên."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                instrumentation = {"cursor_factory": InstrumentedCursor} if settings.DB_QUERY_METRICS_ENABLED else {}
+                _engine = ConnectionPoolEngine(
+                    minconn=settings.DB_POOL_MIN_SIZE,
+                    maxconn=settings.DB_POOL_MAX_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    healthcheck_idle_seconds=settings.DB_POOL_HEALTHCHECK_IDLE_SECONDS,
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    dbname=settings.DB_NAME,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASSWORD,
+                    **instrumentation
+                )
+    return _engine
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Số liệu của pool: số lần mượn, thời gian chờ, số kết nối đang dùng..."""
+    return get_engine().stats()
+
+
+def close_engine():
+    """Đóng toàn bộ kết nối trong pool (gọi khi tắt ứng dụng)."""
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.close_all()
@@ -1,12 +1,160 @@
 # src/core/context_manager.py
 
+import copy
 import json
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 
+from src.config import settings
 # Giả định bạn có file quản lý DB tập trung
 from .database import get_db_connection
 
 
+class TaskContextCache:
+    """
+    Cache write-through trong tiến trình cho task_contexts, khóa theo
+    (session_id, intent_name). Lưu cả kết quả "không có context" để các lượt
+    kiểm tra lặp lại không phải hỏi database. Mỗi mục hết hạn sau `ttl` giây
+    để thay đổi từ tiến trình khác vẫn được nhìn thấy.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, session_id: int, intent_name: str):
+        """Trả về (True, context hoặc None) nếu có trong cache, ngược lại (False, None)."""
+        key = (session_id, intent_name)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = item[1]
+        return True, (None if value is self._MISSING else copy.deepcopy(value))
+
+    def put(self, session_id: int, intent_name: str, context: Optional[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        value = self._MISSING if context is None else copy.deepcopy(context)
+        with self._lock:
+            self._entries[(session_id, intent_name)] = (time.monotonic(), value)
+            self._entries.move_to_end((session_id, intent_name))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def apply_updates(self, session_id: int, intent_name: str, updates: List[Tuple[List[str], Any]],
+                      status: Optional[str]):
+        """Áp dụng các cập nhật theo đường dẫn lên bản trong cache (cùng ngữ nghĩa với jsonb_set)."""
+        key = (session_id, intent_name)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[1] is self._MISSING:
+                self._entries.pop(key, None)
+                return
+            context = item[1]
+            for path, value in updates:
+                context["data"] = _jsonb_set(context["data"], path, value)
+            if status is not None:
+                context["status"] = status
+
+    def invalidate(self, session_id: int, intent_name: str):
+        with self._lock:
+            self._entries.pop((session_id, intent_name), None)
+
+    def invalidate_session(self, session_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == session_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+task_context_cache = TaskContextCache(
+    max_entries=settings.TASK_CONTEXT_CACHE_MAX_ENTRIES,
+    ttl=settings.TASK_CONTEXT_CACHE_TTL_SECONDS
+)
+
+
+def _split_path(path) -> List[str]:
+    """'a.b.0' hoặc ('a', 'b', 0) -> ['a', 'b', '0'] (dạng text[] của jsonb_set)."""
+    parts = path.split(".") if isinstance(path, str) else path
+    return [str(part) for part in parts]
+
+
+def _jsonb_set(target: Any, path: List[str], value: Any) -> Any:
+    """
+    Bản Python của jsonb_set(target, path, value, create_missing => true):
+    chỉ tạo khóa cuối cùng nếu thiếu; nếu một khóa trung gian không tồn tại thì
+    giữ nguyên tài liệu.
+    """
+    if not path:
+        return target
+    node = target
+    for part in path[:-1]:
+        if isinstance(node, dict) and part in node:
+            node = node[part]
+        elif isinstance(node, list) and part.lstrip("-").isdigit() and -len(node) <= int(part) < len(node):
+            node = node[int(part)]
+        else:
+            return target
+    last = path[-1]
+    if isinstance(node, dict):
+        node[last] = copy.deepcopy(value)
+    elif isinstance(node, list) and last.lstrip("-").isdigit():
+        index = int(last)
+        if -len(node) <= index < len(node):
+            node[index] = copy.deepcopy(value)
+        elif index < 0:
+            node.insert(0, copy.deepcopy(value))
+        else:
+            node.append(copy.deepcopy(value))
+    return target
+
+
+def build_update_query(updates: Dict[Any, Any], status: Optional[str]) -> Tuple[str, list, List[Tuple[List[str], Any]]]:
+    """
+    Câu lệnh UPDATE lồng các lời gọi jsonb_set cho từng đường dẫn, thay vì ghi
+    lại toàn bộ context_data. Trả về (query, params không gồm khóa WHERE, danh
+    sách (path, value) đã chuẩn hóa).
+    """
+    expression = "COALESCE(context_data, '{}'::jsonb)"
+    params = []
+    normalized = []
+    for path, value in updates.items():
+        parts = _split_path(path)
+        expression = f"jsonb_set({expression}, %s::text[], %s::jsonb, true)"
+        params.extend([parts, json.dumps(value)])
+        normalized.append((parts, value))
+    query = f"""
+        UPDATE task_contexts
+        SET context_data = {expression},
+            status = COALESCE(%s, status),
+            updated_at = NOW()
+        WHERE session_id = %s AND intent_name = %s;
+    """
+    params.append(status)
+    return query, params, normalized
+
+
 def save_task_context(session_id: int, intent_name: str, status: str, context_data: Dict[str, Any]):
     """
     Lưu hoặc cập nhật trạng thái của một nhiệm vụ vào database.
@@ -27,22 +175,63 @@ def save_task_context(session_id: int, intent_name: str, status: str, context_da
                     """
             cur.execute(query, (session_id, intent_name, status, json.dumps(context_data)))
             conn.commit()
+            task_context_cache.put(session_id, intent_name, {"status": status, "data": context_data or {}})
             print(f"[Context Manager] Đã lưu context cho session {session_id}, intent {intent_name}")
     except Exception as e:
         print(f"[Lỗi] Không thể lưu task context: {e}")
+        task_context_cache.invalidate(session_id, intent_name)
+        conn.rollback()
+    finally:
+        if conn: conn.close()
+
+
+def update_task_context(
+        session_id: int,
+        intent_name: str,
+        updates: Dict[Any, Any],
+        status: Optional[str] = None
+) -> bool:
+    """
+    Cập nhật một phần context_data theo đường dẫn (vd: {"answers.3": "B", "step": 4})
+    bằng jsonb_set, không ghi lại toàn bộ tài liệu. Trả về False nếu chưa có
+    context cho (session_id, intent_name) hoặc có lỗi.
+    """
+    if not updates and status is None: return True
+    query, params, normalized = build_update_query(updates, status)
+    conn = get_db_connection()
+    if not conn: return False
+
+    updated = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query, params + [session_id, intent_name])
+            updated = cur.rowcount > 0
+            conn.commit()
+        if updated:
+            task_context_cache.apply_updates(session_id, intent_name, normalized, status)
+        else:
+            task_context_cache.put(session_id, intent_name, None)
+    except Exception as e:
+        print(f"[Lỗi] Không thể cập nhật task context: {e}")
+        task_context_cache.invalidate(session_id, intent_name)
         conn.rollback()
     finally:
         if conn: conn.close()
 
+    return updated
+
 
 def load_task_context(session_id: int, intent_name: str) -> Optional[Dict[str, Any]]:
     """
-    Tải trạng thái của một nhiệm vụ cụ thể từ database.
+    Tải trạng thái của một nhiệm vụ cụ thể (từ cache nếu có, ngược lại từ database).
     """
+    cached, context = task_context_cache.get(session_id, intent_name)
+    if cached:
+        return context
+
     conn = get_db_connection()
     if not conn: return None
 
-    context = None
     try:
         with conn.cursor() as cur:
             query = """
@@ -57,6 +246,7 @@ def load_task_context(session_id: int, intent_name: str) -> Optional[Dict[str, A
                 status, context_data = result
                 context = {"status": status, "data": context_data or {}}
                 print(f"[Context Manager] Đã tải context cho session {session_id}, intent {intent_name}")
+            task_context_cache.put(session_id, intent_name, context)
     except Exception as e:
         print(f"[Lỗi] Không thể tải task context: {e}")
     finally:
@@ -77,9 +267,36 @@ def clear_task_context(session_id: int, intent_name: str):
             query = "DELETE FROM task_contexts WHERE session_id = %s AND intent_name = %s;"
             cur.execute(query, (session_id, intent_name))
             conn.commit()
+            task_context_cache.put(session_id, intent_name, None)
             print(f"[Context Manager] Đã xóa context cho session {session_id}, intent {intent_name}")
     except Exception as e:
         print(f"[Lỗi] Không thể xóa task context: {e}")
+        task_context_cache.invalidate(session_id, intent_name)
+        conn.rollback()
+    finally:
+        if conn: conn.close()
+
+
+def clear_session_task_contexts(session_id: int) -> int:
+    """
+    Xóa toàn bộ context của một phiên đã kết thúc trong một câu lệnh.
+    Trả về số context đã xóa.
+    """
+    conn = get_db_connection()
+    if not conn: return 0
+
+    deleted = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM task_contexts WHERE session_id = %s;", (session_id,))
+            deleted = cur.rowcount
+            conn.commit()
+            print(f"[Context Manager] Đã xóa {deleted} context của session {session_id}")
+    except Exception as e:
+        print(f"[Lỗi] Không thể xóa các task context của phiên: {e}")
         conn.rollback()
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        task_context_cache.invalidate_session(session_id)
+        if conn: conn.close()
+
+    return deleted
@@ -1,24 +1,24 @@
 # src/core/vector_store_interface.py
+import uuid
+import numpy as np
 import psycopg2
-from psycopg2.sql import SQL, Identifier
+from contextlib import contextmanager
+from psycopg2.extras import NamedTupleCursor
+from psycopg2.sql import SQL, Composable
 from src.config import settings
-from src.core.embedding import encode_text
-from typing import List, Dict, Any
+from src.core.connection_pool import get_engine
+from src.core.embedding import encode_query, to_pgvector
+from src.core.lexical_index import reciprocal_rank_fusion
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
 
 def get_db_connection():
     """
-    Tạo và trả về một kết nối mới đến database PostgreSQL.
-    Đọc thông tin kết nối từ file settings.
+    Mượn một kết nối từ pool dùng chung của tiến trình (xem connection_pool.py).
+    Gọi conn.close() sẽ trả kết nối về pool để các lượt sau dùng lại.
+    Trả về None nếu không thể kết nối hoặc chờ pool quá lâu.
     """
     try:
-        conn = psycopg2.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            dbname=settings.DB_NAME,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD
-        )
-        return conn
+        return get_engine().connect()
     except psycopg2.OperationalError as e:
         print(f"Lỗi kết nối database (OperationalError): {e}")
         return None
@@ -27,6 +27,22 @@ def get_db_connection():
         return None
 
 
+@contextmanager
+def db_connection():
+    """
+    Context manager mượn kết nối trong phạm vi một khối lệnh và luôn trả về pool.
+
+        with db_connection() as conn:
+            if conn: ...
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        if conn:
+            conn.close()
+
+
 def execute_sql_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
     """
     Hàm trợ giúp chung để thực thi một câu lệnh SELECT và trả về kết quả
@@ -63,89 +79,312 @@ def execute_sql_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
         # Không cần rollback với lệnh SELECT, nhưng vẫn nên có
         conn.rollback()
     finally:
-        # Luôn đóng kết nối sau khi hoàn tất
+        # Luôn trả kết nối về pool sau khi hoàn tất
         if conn:
             conn.close()
 
     return results
 
 
-def retrieve_relevant_documents_from_db(
-    query_text: str,
-    top_k: int = 3,
-    table_name: str = "contentchunks", # Sử dụng tên bảng trực tiếp hoặc từ settings
-    filters: dict = None
-) -> list[dict]:
-    """
-    Truy xuất các tài liệu liên quan từ CSDL với logic xây dựng query đã được sửa lỗi.
+def stream_sql_query(query, params: tuple = None, itersize: int = None, named: bool = False) -> Iterator[tuple]:
     """
-    query_embedding = encode_text(query_text)
-    # Chuyển embedding thành chuỗi string theo định dạng của pgvector
-    embedding_str = str(list(query_embedding))
+    Bản streaming của execute_sql_query cho các lượt đọc lớn (xuất dữ liệu, quét
+    lại toàn bộ bảng...). Dùng server-side cursor nên mỗi lần chỉ tải về
+    `itersize` dòng (mặc định DB_STREAM_ITERSIZE); bộ nhớ không tăng theo kích
+    thước kết quả. Trả về từng dòng dạng tuple, hoặc namedtuple nếu `named=True`.
 
+        for row in stream_sql_query("SELECT id, chunk_text FROM contentchunks"):
+            ...
+
+    Kết nối chỉ được trả về pool khi duyệt hết hoặc generator bị đóng, nên hãy
+    duyệt hết hoặc dùng `contextlib.closing(...)` khi dừng giữa chừng.
+    """
     conn = get_db_connection()
     if not conn:
-        return []
-
-    retrieved_items = []
-
-    # --- SỬA LỖI LOGIC TẠI ĐÂY ---
-    # 1. Xây dựng mệnh đề WHERE và các tham số của nó một cách riêng biệt
-    where_clauses = []
-    where_params = []
-    if filters:
-        for key, value in filters.items():
-            # Thêm "Identifier(key)" để tránh SQL injection cho tên cột
-            where_clauses.append(SQL("{}=%s").format(Identifier(key)))
-            where_params.append(value)
-
-    where_sql = SQL(" WHERE {}").format(SQL(" AND ").join(where_clauses)) if where_clauses else SQL("")
-
-    # 2. Xây dựng câu truy vấn cuối cùng với các placeholder
-    # Lưu ý: Identifier(table_name) để bảo vệ tên bảng
-    sql_query = SQL("""
-        SELECT chunk_text, source_document_name, original_page_number, level, skill_type, metadata_json
-        FROM {table}
-        {where_clause}
-        ORDER BY embedding <=> %s
-        LIMIT %s;
-    """).format(
-        table=Identifier(table_name),
-        where_clause=where_sql
-    )
-
-    # 3. Kết hợp các tham số theo đúng thứ tự
-    # Thứ tự: [params_for_where, param_for_orderby, param_for_limit]
-    final_params = where_params + [embedding_str, top_k]
-    # --- KẾT THÚC SỬA LỖI ---
+        return
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(sql_query, final_params)
-            results = cur.fetchall()
-            for row in results:
-                 retrieved_items.append({
-                    "text": row[0],
-                    "metadata": {"document": row[1], "page": row[2], "level": row[3], "skill": row[4], "lesson": (row[5] or {}).get('lesson')}
-                })
-    except Exception as e:
-        # In ra câu lệnh và tham số để debug dễ hơn
-        # print("SQL Query Failed:", cur.mogrify(sql_query, final_params).decode())
-        print(f"Lỗi truy xuất chunk từ bảng {table_name}: {e}")
+        cursor_factory = NamedTupleCursor if named else None
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=cursor_factory) as cur:
+            cur.itersize = itersize or settings.DB_STREAM_ITERSIZE
+            cur.execute(query, params or ())
+            for row in cur:
+                yield row
+    except psycopg2.Error as e:
+        print(f"Lỗi khi đọc streaming câu lệnh SQL: {e}")
     finally:
         if conn:
+            conn.rollback()
             conn.close()
 
-    return retrieved_items
-
-def find_precise_definitional_source_from_db(
-    japanese_term: str,
-    # SỬA Ở ĐÂY: Dùng tên biến đã chuẩn hóa
-    table_name: str = settings.RAG_CONTENT_CHUNK_TABLE
-) -> dict | None:
-    if not japanese_term: return None
-    targeted_query = f"Định nghĩa và vị trí của từ tiếng Nhật: {japanese_term}"
-    definitional_chunks = retrieve_relevant_documents_from_db(targeted_query, top_k=1, table_name=table_name)
-    if definitional_chunks:
-        return definitional_chunks[0].get("metadata")
-    return None
\ No newline at end of file
+
+def vector_search_settings_sql() -> str:
+    """
+    Các lệnh SET LOCAL cho tham số tìm kiếm ANN của pgvector theo settings.
+    SET LOCAL chỉ có hiệu lực trong giao dịch hiện tại nên không ảnh hưởng tới
+    các lượt mượn kết nối sau.
+    """
+    parts = []
+    if settings.VECTOR_HNSW_EF_SEARCH > 0:
+        parts.append(f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_HNSW_EF_SEARCH)};")
+    if settings.VECTOR_IVFFLAT_PROBES > 0:
+        parts.append(f"SET LOCAL ivfflat.probes = {int(settings.VECTOR_IVFFLAT_PROBES)};")
+    # Câu lệnh đã prepare (psycopg 3) không được dùng generic plan: với `level = $1`
+    # generic plan không chọn được index partial theo level / skill_type.
+    parts.append("SET LOCAL plan_cache_mode = force_custom_plan;")
+    return " ".join(parts)
+
+
+def with_vector_search_settings(query):
+    """
+    Gắn các lệnh SET LOCAL vào trước một truy vấn `ORDER BY embedding <=> ...`
+    (chuỗi hoặc psycopg2.sql.Composable), gửi đi trong cùng một round trip.
+    """
+    prefix = vector_search_settings_sql()
+    if not prefix:
+        return query
+    if isinstance(query, Composable):
+        return SQL(prefix + " ") + query
+    return prefix + " " + query
+
+
+def execute_vector_query(query, params: tuple = None) -> List[Dict[str, Any]]:
+    """Giống execute_sql_query, nhưng áp dụng hnsw.ef_search / ivfflat.probes từ settings."""
+    return execute_sql_query(with_vector_search_settings(query), params)
+
+
+VECTOR_SEARCH_MODES = ("exact", "halfvec", "binary")
+
+
+def quote_identifier(name: str) -> str:
+    """Tên bảng / cột trong dấu nháy kép (như psycopg2.sql.Identifier), dùng được cho cả psycopg 3."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def select_column_sql(column: str, prefix: str = "") -> str:
+    """
+    Biểu thức SELECT của một cột kết quả. Cột "embedding" được đọc dưới dạng
+    real[] (list float) thay vì literal text của pgvector.
+    """
+    if column == "embedding":
+        return f"{prefix}embedding::real[] AS embedding"
+    return prefix + quote_identifier(column)
+
+
+def chunk_search_query(
+    table: str,
+    columns: Sequence[str],
+    query_vector: str,
+    top_k: int,
+    where_clauses: Sequence[str] = (),
+    where_params: Sequence[Any] = (),
+    mode: str = None,
+    vector_sql: str = None,
+    distance_alias: str = None
+) -> Tuple[str, tuple]:
+    """
+    Câu truy vấn top-k chunk gần nhất (cosine) và tham số của nó, theo
+    `mode` (mặc định VECTOR_SEARCH_MODE):
+    - "exact":   ORDER BY embedding <=> q trên vector đầy đủ.
+    - "halfvec": lấy VECTOR_RERANK_CANDIDATES ứng viên theo cosine trên
+                 embedding::halfvec (index của migration 0007), rồi xếp lại
+                 các ứng viên bằng cosine trên vector đầy đủ.
+    - "binary":  như "halfvec" nhưng ứng viên theo khoảng cách Hamming của
+                 binary_quantize(embedding).
+    `where_clauses` là các điều kiện SQL dùng placeholder %s, nối bằng AND.
+    `vector_sql` là biểu thức SQL (kiểu text) dùng làm vector truy vấn thay cho
+    tham số `query_vector`, vd. cột của truy vấn ngoài trong một LATERAL join.
+    `distance_alias`: thêm cột khoảng cách cosine (trên vector đầy đủ) với tên này.
+    """
+    mode = mode or settings.VECTOR_SEARCH_MODE
+    if mode not in VECTOR_SEARCH_MODES:
+        raise ValueError(f"VECTOR_SEARCH_MODE không hợp lệ: {mode} ({', '.join(VECTOR_SEARCH_MODES)})")
+    select_list = ", ".join(select_column_sql(column) for column in columns)
+    where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    source = f"{quote_identifier(table)}{where_sql}"
+    vector = vector_sql or "%s"
+    vector_params = () if vector_sql else (query_vector,)
+    distance_params = ()
+    if distance_alias:
+        select_list += f", embedding <=> {vector}::vector AS {quote_identifier(distance_alias)}"
+        distance_params = vector_params
+
+    if mode == "exact":
+        query = f"SELECT {select_list} FROM {source} ORDER BY embedding <=> {vector}::vector LIMIT %s;"
+        return query, (*distance_params, *where_params, *vector_params, top_k)
+
+    dim = int(settings.EMBEDDING_DIMENSION)
+    if mode == "halfvec":
+        candidate_order = f"embedding::halfvec({dim}) <=> {vector}::halfvec({dim})"
+    else:
+        candidate_order = f"binary_quantize(embedding)::bit({dim}) <~> binary_quantize({vector}::vector)"
+    candidate_list = "".join(f"{quote_identifier(column)}, " for column in columns if column != "embedding")
+    query = (
+        f"SELECT {select_list} FROM ("
+        f"SELECT {candidate_list}embedding FROM {source} ORDER BY {candidate_order} LIMIT %s"
+        f") AS candidates ORDER BY embedding <=> {vector}::vector LIMIT %s;"
+    )
+    candidates = max(settings.VECTOR_RERANK_CANDIDATES, top_k)
+    return query, (*distance_params, *where_params, *vector_params, candidates, *vector_params, top_k)
+
+
+def chunk_search_many_query(table: str, columns: Sequence[str], query_vectors: Sequence[str], top_k: int,
+                            where_clauses: Sequence[str] = (), where_params: Sequence[Any] = (),
+                            mode: str = None) -> Tuple[str, tuple]:
+    """
+    Top-k của nhiều vector truy vấn trong một câu lệnh: unnest mảng vector rồi
+    chạy truy vấn của chunk_search_query cho từng vector qua CROSS JOIN LATERAL.
+    Mỗi dòng kết quả có thêm query_index (bắt đầu từ 1) và rank trong danh sách
+    của câu truy vấn đó (theo khoảng cách cosine tăng dần).
+    """
+    inner, inner_params = chunk_search_query(table, columns, None, top_k, where_clauses, where_params, mode,
+                                             vector_sql="q.query_vector", distance_alias="distance")
+    select_list = ", ".join(f"r.{quote_identifier(column)}" for column in columns)
+    query = (
+        f"SELECT q.query_index, r.rank, {select_list} "
+        f"FROM unnest(%s::text[]) WITH ORDINALITY AS q(query_vector, query_index) "
+        f"CROSS JOIN LATERAL (SELECT c.*, row_number() OVER (ORDER BY c.distance) AS rank "
+        f"FROM ({inner.rstrip(';')}) AS c) AS r "
+        f"ORDER BY q.query_index, r.rank;"
+    )
+    return query, (list(query_vectors), *inner_params)
+
+
+# level / skill_type của bảng chunk được lưu ở dạng chuẩn ('N5', 'VOCABULARY'):
+# chuẩn hóa khi nạp tài liệu và bởi migration 0010, để bộ lọc là phép so sánh
+# bằng thuần túy, khớp với các index vector partial theo level / skill_type.
+CANONICAL_FILTER_COLUMNS = ("level", "skill_type")
+JLPT_LEVELS = ("N1", "N2", "N3", "N4", "N5")
+
+
+def canonical_filter_value(value: Optional[str]) -> Optional[str]:
+    """Dạng chuẩn của level / skill_type: bỏ khoảng trắng đầu cuối, chữ hoa; chuỗi rỗng thành None."""
+    if value is None:
+        return None
+    return str(value).strip().upper() or None
+
+
+def chunk_filter_sql(filters: Dict[str, Any] = None, ignore_case: Sequence[str] = ()) -> Tuple[List[str], List[Any]]:
+    """
+    Điều kiện WHERE và tham số cho các bộ lọc so sánh bằng theo cột. Các cột
+    trong `ignore_case` (level, skill_type) đã được lưu ở dạng chuẩn nên chỉ
+    cần chuẩn hóa giá trị lọc (canonical_filter_value) thay vì LOWER() hai vế,
+    nhờ đó planner dùng được index partial.
+    """
+    where_clauses, where_params = [], []
+    for column, value in (filters or {}).items():
+        where_clauses.append(f"{quote_identifier(column)} = %s")
+        where_params.append(canonical_filter_value(value) if column in ignore_case else value)
+    return where_clauses, where_params
+
+
+def search_chunk_rows(table: str, columns: Sequence[str], query_vector: np.ndarray, top_k: int,
+                      filters: Dict[str, Any] = None, ignore_case: Sequence[str] = (),
+                      mode: str = None) -> List[Dict[str, Any]]:
+    """
+    Các chunk gần `query_vector` nhất (dạng dictionary). Trả lời từ index trong
+    bộ nhớ nếu bảng có index và index đang sẵn sàng (memory_index.py), ngược lại
+    bằng truy vấn SQL (chunk_search_query).
+    """
+    from src.core.memory_index import get_memory_index
+
+    index = get_memory_index(table)
+    rows = index.search(query_vector, top_k, columns, filters, ignore_case) if index else None
+    if rows is not None:
+        return rows
+    where_clauses, where_params = chunk_filter_sql(filters, ignore_case)
+    query, params = chunk_search_query(table, columns, to_pgvector(query_vector), top_k,
+                                       where_clauses, where_params, mode)
+    return execute_vector_query(query, params)
+
+
+def group_ranked_rows(rows: List[Dict[str, Any]], count: int, columns: Sequence[str]) -> List[List[Dict[str, Any]]]:
+    """Tách kết quả của chunk_search_many_query thành `count` danh sách theo query_index."""
+    groups: List[List[Dict[str, Any]]] = [[] for _ in range(count)]
+    for row in rows:
+        groups[row["query_index"] - 1].append({column: row[column] for column in columns})
+    return groups
+
+
+def search_chunk_rows_many(table: str, columns: Sequence[str], query_vectors: np.ndarray, top_k: int,
+                           filters: Dict[str, Any] = None, ignore_case: Sequence[str] = (),
+                           mode: str = None) -> List[List[Dict[str, Any]]]:
+    """
+    Như search_chunk_rows cho nhiều vector truy vấn: một danh sách kết quả cho
+    mỗi vector, lấy từ index trong bộ nhớ hoặc bằng một truy vấn SQL duy nhất.
+    """
+    from src.core.memory_index import get_memory_index
+
+    if not len(query_vectors):
+        return []
+    index = get_memory_index(table)
+    results = index.search_many(query_vectors, top_k, columns, filters, ignore_case) if index else None
+    if results is not None:
+        return results
+    where_clauses, where_params = chunk_filter_sql(filters, ignore_case)
+    query, params = chunk_search_many_query(table, columns, [to_pgvector(v) for v in query_vectors], top_k,
+                                            where_clauses, where_params, mode)
+    return group_ranked_rows(execute_vector_query(query, params), len(query_vectors), columns)
+
+
+def lexical_chunk_rows(table: str, columns: Sequence[str], text: str, top_k: int,
+                       filters: Dict[str, Any] = None, ignore_case: Sequence[str] = (),
+                       exact: bool = False) -> List[Dict[str, Any]]:
+    """
+    Các chunk theo từ vựng: chứa nguyên văn `text` (exact=True), hoặc có nhiều
+    n-gram ký tự chung với `text`. Dùng index n-gram của index trong bộ nhớ nếu
+    có; truy vấn SQL dự phòng chỉ so khớp nguyên văn (strpos), xếp theo số lần
+    xuất hiện.
+    """
+    from src.core.memory_index import get_memory_index
+
+    index = get_memory_index(table)
+    rows = index.lexical_search(text, top_k, columns, filters, ignore_case, exact) if index else None
+    if rows is not None:
+        return rows
+    where_clauses, where_params = chunk_filter_sql(filters, ignore_case)
+    where_sql = " AND ".join(["strpos(lower(chunk_text), lower(%s)) > 0"] + where_clauses)
+    query = (
+        f"SELECT {', '.join(select_column_sql(column) for column in columns)} FROM {quote_identifier(table)} "
+        f"WHERE {where_sql} "
+        f"ORDER BY length(chunk_text) - length(replace(lower(chunk_text), lower(%s), '')) DESC, id LIMIT %s;"
+    )
+    return execute_sql_query(query, (text, *where_params, text, top_k))
+
+
+def hybrid_search_chunk_rows(table: str, columns: Sequence[str], query_text: str, top_k: int,
+                             filters: Dict[str, Any] = None, ignore_case: Sequence[str] = (),
+                             lexical_text: str = None) -> List[Dict[str, Any]]:
+    """
+    Kết hợp xếp hạng từ vựng (theo `lexical_text`, mặc định là chính câu truy
+    vấn) và xếp hạng vector của RAG_HYBRID_CANDIDATES ứng viên mỗi loại, gộp
+    bằng reciprocal rank fusion. Xếp hạng từ vựng chỉ dùng index n-gram của
+    index trong bộ nhớ; khi index chưa sẵn sàng thì chỉ dùng vector (truy vấn
+    SQL dự phòng của lexical_chunk_rows quét cả bảng, không hợp với câu truy vấn dài).
+    """
+    from src.core.memory_index import get_memory_index
+
+    key_columns = tuple(columns) if "id" in columns else tuple(columns) + ("id",)
+    candidates = max(settings.RAG_HYBRID_CANDIDATES, top_k)
+    index = get_memory_index(table)
+    lexical = index.lexical_search(lexical_text or query_text, candidates, key_columns, filters,
+                                   ignore_case) if index else None
+    vector = search_chunk_rows(table, key_columns, encode_query(query_text), candidates, filters, ignore_case)
+    if lexical is None:
+        return [{column: row[column] for column in columns} for row in vector[:top_k]]
+    by_id = {row["id"]: row for row in lexical + vector}
+    fused = reciprocal_rank_fusion([[row["id"] for row in lexical], [row["id"] for row in vector]],
+                                   k=settings.RAG_RRF_K)
+    return [{column: by_id[chunk_id][column] for column in columns} for chunk_id, _ in fused[:top_k]]
+
+
+CHUNK_RESULT_COLUMNS = ("chunk_text", "source_document_name", "original_page_number", "level", "skill_type", "metadata_json")
+
+
+def chunk_row_to_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "text": row["chunk_text"],
+        "metadata": {"document": row["source_document_name"], "page": row["original_page_number"],
+                     "level": row["level"], "skill": row["skill_type"],
+                     "lesson": (row["metadata_json"] or {}).get('lesson')}
+    }
@@ -0,0 +1,139 @@
+# src/core/diversity.py
+import re
+import unicodedata
+from typing import List, Dict, Any, Sequence
+
+import numpy as np
+
+from src.config import settings
+from src.core.embedding import encode_query, aencode_query
+from src.core.reranker import rerank_candidates, rerank_rows, arerank_rows
+
+# Bước sau truy xuất: chunk được cắt với chunk_overlap nên top-k theo vector hay
+# gồm nhiều đoạn chồng lấn của cùng một trang. Với RAG_DIVERSIFY, nơi gọi lấy
+# nhiều ứng viên hơn (retrieval_candidates) kèm embedding (retrieval_columns),
+# rồi select_rows:
+# 1. xếp hạng lại bằng cross-encoder nếu bật (reranker.py),
+# 2. bỏ các chunk gần trùng với một chunk xếp trên nó: tỉ lệ shingle ký tự chung
+#    (so với chunk ngắn hơn) >= RAG_DEDUP_THRESHOLD,
+# 3. chọn top-k bằng maximal marginal relevance: độ liên quan là cosine giữa
+#    embedding của câu truy vấn (encode_query, đã có trong cache từ bước tìm
+#    kiếm) và của chunk, phạt theo cosine lớn nhất với các chunk đã chọn - hai
+#    vế cùng thang đo. Thứ hạng của bước trước (vector, hybrid hay cross-encoder)
+#    quyết định chunk nào được giữ trong một nhóm gần trùng và phân định khi bằng điểm.
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def retrieval_candidates(top_k: int) -> int:
+    """Số ứng viên cần lấy từ bước tìm kiếm để chọn ra `top_k` dòng."""
+    count = rerank_candidates(top_k)
+    return max(count, settings.RAG_MMR_CANDIDATES) if settings.RAG_DIVERSIFY else count
+
+
+def retrieval_columns(columns: Sequence[str]) -> tuple:
+    """Các cột cần lấy: thêm "embedding" khi bật đa dạng hóa."""
+    columns = tuple(columns)
+    if settings.RAG_DIVERSIFY and "embedding" not in columns:
+        return columns + ("embedding",)
+    return columns
+
+
+def shingle_matrix(texts: Sequence[str], size: int) -> np.ndarray:
+    """Ma trận 0/1 (văn bản x shingle): các đoạn `size` ký tự liên tiếp của văn bản đã chuẩn hóa."""
+    vocabulary: Dict[str, int] = {}
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        text = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip().lower()
+        shingles = {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+        for shingle in shingles:
+            rows.append(row)
+            cols.append(vocabulary.setdefault(shingle, len(vocabulary)))
+    matrix = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+    matrix[rows, cols] = 1.0
+    return matrix
+
+
+def near_duplicate_mask(texts: Sequence[str], size: int, threshold: float) -> np.ndarray:
+    """
+    True cho các văn bản gần trùng với một văn bản đứng trước nó (và được giữ):
+    số shingle chung / số shingle của văn bản ngắn hơn >= `threshold`.
+    """
+    matrix = shingle_matrix(texts, size)
+    counts = matrix.sum(axis=1)
+    shared = matrix @ matrix.T
+    containment = shared / np.maximum(np.minimum.outer(counts, counts), 1.0)
+    duplicate = np.zeros(len(texts), dtype=bool)
+    for row in range(1, len(texts)):
+        kept = np.flatnonzero(~duplicate[:row])
+        duplicate[row] = bool((containment[row, kept] >= threshold).any())
+    return duplicate
+
+
+def mmr(embeddings: np.ndarray, relevance: np.ndarray, count: int, lambda_mult: float) -> List[int]:
+    """
+    Chỉ số của `count` dòng chọn bằng maximal marginal relevance, theo thứ tự
+    chọn: mỗi bước lấy dòng có lambda * relevance - (1 - lambda) * (cosine lớn
+    nhất với các dòng đã chọn) cao nhất. `embeddings` không cần chuẩn hóa trước.
+    """
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.where(norms == 0, 1.0, norms)
+    similarity = normalized @ normalized.T
+    redundancy = np.zeros(len(embeddings), dtype=np.float32)
+    available = np.ones(len(embeddings), dtype=bool)
+    selected = []
+    for _ in range(min(count, len(embeddings))):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def cosine_to(embeddings: np.ndarray, query_vector) -> np.ndarray:
+    """Cosine giữa từng dòng của `embeddings` và `query_vector`."""
+    query = np.asarray(query_vector, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+    return (embeddings @ query) / np.where(norms == 0, 1.0, norms)
+
+
+def diversify_rows(rows: List[Dict[str, Any]], top_k: int, query_vector,
+                   text_key: str = "chunk_text") -> List[Dict[str, Any]]:
+    """`top_k` dòng đa dạng từ `rows` (đã xếp theo độ liên quan giảm dần) cho câu truy vấn có embedding `query_vector`."""
+    if len(rows) <= 1:
+        return rows[:top_k]
+    duplicate = near_duplicate_mask([str(row.get(text_key) or "") for row in rows],
+                                    settings.RAG_DEDUP_SHINGLE_SIZE, settings.RAG_DEDUP_THRESHOLD)
+    rows = [row for row, is_duplicate in zip(rows, duplicate) if not is_duplicate]
+    if len(rows) <= top_k or any(row.get("embedding") is None for row in rows):
+        return rows[:top_k]
+    embeddings = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+    relevance = cosine_to(embeddings, query_vector)
+    return [rows[i] for i in mmr(embeddings, relevance, top_k, settings.RAG_MMR_LAMBDA)]
+
+
+def _without_embedding(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{column: value for column, value in row.items() if column != "embedding"} for row in rows]
+
+
+def select_rows(query: str, rows: List[Dict[str, Any]], top_k: int,
+                text_key: str = "chunk_text") -> List[Dict[str, Any]]:
+    """
+    `top_k` dòng cuối cùng từ các ứng viên (lấy theo retrieval_candidates /
+    retrieval_columns): xếp hạng lại, bỏ gần trùng và MMR; bỏ cột embedding.
+    """
+    if not settings.RAG_DIVERSIFY:
+        return _without_embedding(rerank_rows(query, rows, top_k, text_key))
+    # Ngân sách rerank tính theo top_k; giữ cả RAG_MMR_CANDIDATES dòng cho bước MMR
+    rows = rerank_rows(query, rows, top_k, text_key, keep=settings.RAG_MMR_CANDIDATES)
+    return _without_embedding(diversify_rows(rows, top_k, encode_query(query), text_key))
+
+
+async def aselect_rows(query: str, rows: List[Dict[str, Any]], top_k: int,
+                       text_key: str = "chunk_text") -> List[Dict[str, Any]]:
+    """Bản bất đồng bộ của select_rows()."""
+    if not settings.RAG_DIVERSIFY:
+        return _without_embedding(await arerank_rows(query, rows, top_k, text_key))
+    rows = await arerank_rows(query, rows, top_k, text_key, keep=settings.RAG_MMR_CANDIDATES)
+    return _without_embedding(diversify_rows(rows, top_k, await aencode_query(query), text_key))
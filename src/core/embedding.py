@@ -1,13 +1,673 @@
 # src/core/embedding.py
-from sentence_transformers import SentenceTransformer
+import asyncio
+import glob
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Tuple, Dict, Any, List, Callable
+
+import numpy as np
+
 from src.config import settings
 
-print(f"Loading embedding model for RAG core: {settings.EMBEDDING_MODEL_NAME}")
-_embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
-print("Embedding model for RAG core loaded.")
+# Model embedding được nạp lười ở lần dùng đầu tiên (import sentence_transformers
+# kéo theo torch, mất vài giây), nên các tiến trình không cần embedding như CLI
+# quản lý phiên hay unit test khởi động nhanh. Tiến trình phục vụ truy vấn nên
+# gọi warm_up_embedding_model() lúc khởi động để lượt hỏi đầu tiên không phải chờ.
+#
+# Backend chọn bằng EMBEDDING_BACKEND:
+# - "torch": sentence-transformers chạy PyTorch (mặc định).
+# - "onnx":  cùng model được export sang ONNX Runtime, lượng tử hóa int8 động
+#            theo EMBEDDING_ONNX_QUANTIZATION (rỗng = giữ float32). Nhanh hơn
+#            và tốn ít RAM hơn trên máy chỉ có CPU (không import torch). Lần
+#            export đầu tiên cần `optimum-onnx[onnxruntime]`; model export được lưu
+#            ở EMBEDDING_ONNX_DIR để các lần sau nạp thẳng.
+_embedding_model = None
+_model_lock = threading.Lock()
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _onnx_export_dir(model_name: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name).strip("_")
+    return os.path.join(PROJECT_ROOT, settings.EMBEDDING_ONNX_DIR, slug)
+
+
+class OnnxEmbeddingModel:
+    """
+    Chạy model sentence-transformers đã export sang ONNX chỉ bằng onnxruntime và
+    tokenizers (không import torch), có cùng giao diện encode() với
+    SentenceTransformer cho các chỗ đang dùng trong dự án.
+    """
+
+    def __init__(self, model_dir: str, file_name: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        def read_json(*parts, default=None):
+            path = os.path.join(model_dir, *parts)
+            if not os.path.exists(path):
+                return default
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        max_length = read_json("sentence_bert_config.json", default={}).get("max_seq_length", 512)
+        pad_token = read_json("tokenizer_config.json", default={}).get("pad_token") or "[PAD]"
+        if isinstance(pad_token, dict):
+            pad_token = pad_token["content"]
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length)
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        modules = read_json("modules.json", default=[])
+        pooling_dir = next((m["path"] for m in modules if m["type"].endswith("Pooling")), "1_Pooling")
+        pooling = read_json(pooling_dir, "config.json", default={"pooling_mode_mean_tokens": True})
+        self._cls_pooling = bool(pooling.get("pooling_mode_cls_token"))
+        self._normalize = any(m["type"].endswith("Normalize") for m in modules)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.EMBEDDING_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = settings.EMBEDDING_INTRA_OP_THREADS
+        self._session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, file_name), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+    def _encode_batch(self, texts: List[str], normalize: bool) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self._session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})[0]
+        if self._cls_pooling:
+            pooled = hidden[:, 0]
+        else:
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               show_progress_bar: bool = None, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """
+        Như SentenceTransformer.encode: luôn trả về numpy; chuẩn hóa nếu model có
+        module Normalize hoặc `normalize_embeddings`. Tham số khác không hỗ trợ thì báo lỗi.
+        """
+        if kwargs or not convert_to_numpy:
+            unsupported = sorted(kwargs) + ([] if convert_to_numpy else ["convert_to_numpy=False"])
+            raise TypeError(f"OnnxEmbeddingModel.encode() không hỗ trợ: {', '.join(unsupported)}")
+        normalize = self._normalize or normalize_embeddings
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # Gom các câu có độ dài gần nhau vào cùng lô để giảm padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [self._encode_batch([texts[i] for i in order[start:start + batch_size]], normalize)
+                   for start in range(0, len(order), batch_size)]
+        stacked = np.concatenate(batches)
+        vectors = np.empty_like(stacked)
+        vectors[order] = stacked
+        return vectors[0] if single else vectors
+
+
+def export_onnx_model(model_name: str, quantization: str) -> Tuple[str, str]:
+    """
+    Export model sang ONNX (và bản int8 nếu có `quantization`) vào EMBEDDING_ONNX_DIR
+    nếu chưa có. Bước này cần sentence-transformers / torch, chỉ chạy một lần.
+    Trả về (thư mục model, tên file .onnx cần nạp).
+    """
+    export_dir = _onnx_export_dir(model_name)
+    pattern = os.path.join(export_dir, "onnx", f"model_q*int8_{quantization}.onnx")
+    has_base = os.path.exists(os.path.join(export_dir, "onnx", "model.onnx"))
+    if not has_base or (quantization and not glob.glob(pattern)):
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        if has_base:
+            base = SentenceTransformer(export_dir, backend="onnx")
+        else:
+            print(f"Exporting {model_name} to ONNX: {export_dir}")
+            base = SentenceTransformer(model_name, backend="onnx")
+            base.save_pretrained(export_dir)
+        if quantization:
+            # Tên file do sentence-transformers đặt, vd: model_quint8_avx2.onnx, model_qint8_avx512_vnni.onnx
+            print(f"Quantizing ONNX model (int8, {quantization})")
+            export_dynamic_quantized_onnx_model(base, quantization, export_dir)
+    if not quantization:
+        return export_dir, os.path.join("onnx", "model.onnx")
+    return export_dir, os.path.relpath(sorted(glob.glob(pattern))[0], export_dir)
+
+
+def load_embedding_model(backend: str = None, quantization: str = None):
+    """
+    Nạp một model embedding mới theo backend ("torch" hoặc "onnx"); mặc định
+    theo settings. Dùng get_embedding_model() cho model dùng chung của tiến trình.
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND không hợp lệ: {backend} (chọn một trong {EMBEDDING_BACKENDS})")
+    if backend == "onnx":
+        quantization = settings.EMBEDDING_ONNX_QUANTIZATION if quantization is None else quantization
+        return OnnxEmbeddingModel(*export_onnx_model(settings.EMBEDDING_MODEL_NAME, quantization))
+
+    from sentence_transformers import SentenceTransformer
+    if settings.EMBEDDING_INTRA_OP_THREADS > 0:
+        import torch
+        torch.set_num_threads(settings.EMBEDDING_INTRA_OP_THREADS)
+    return SentenceTransformer(settings.EMBEDDING_MODEL_NAME)
+
+
+def embedding_model_id() -> str:
+    """
+    Định danh của model đang dùng (tên model + backend), dùng làm khóa cache:
+    vector của các backend lệch nhau chút ít nên không dùng lẫn cho nhau.
+    """
+    if settings.EMBEDDING_BACKEND == "onnx":
+        return f"{settings.EMBEDDING_MODEL_NAME}@onnx-{settings.EMBEDDING_ONNX_QUANTIZATION or 'fp32'}"
+    return settings.EMBEDDING_MODEL_NAME
+
 
 def get_embedding_model():
+    """Trả về model embedding dùng chung, nạp ở lần gọi đầu tiên (an toàn khi gọi từ nhiều luồng)."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _model_lock:
+            if _embedding_model is None:
+                print(f"Loading embedding model for RAG core: {embedding_model_id()}")
+                start = time.perf_counter()
+                model = load_embedding_model()
+                _embedding_model = model
+                print(f"Embedding model for RAG core loaded ({time.perf_counter() - start:.2f}s).")
     return _embedding_model
 
+
+def is_embedding_model_loaded() -> bool:
+    return _embedding_model is not None
+
+
+def warm_up_embedding_model() -> float:
+    """
+    Nạp model và chạy thử một lượt encode (khởi tạo kernel / bộ nhớ đệm của torch).
+    Trả về thời gian đã dùng (giây).
+    """
+    start = time.perf_counter()
+    if embedding_executor is not None:
+        embedding_executor.warm_up()
+    else:
+        get_embedding_model().encode("warm-up")
+    return time.perf_counter() - start
+
+
+class EmbeddingBatcher:
+    """
+    Gom các yêu cầu encode đồng thời (từ nhiều luồng xử lý request) thành một
+    lời gọi encode theo lô. Luồng nền lấy yêu cầu đầu tiên, chờ thêm tối đa
+    `max_wait` giây hoặc tới khi đủ `max_batch` yêu cầu rồi encode cả lô; mỗi
+    người gọi nhận vector của mình qua một Future. Văn bản trùng nhau trong
+    cùng lô chỉ được encode một lần. `encode_batch` có thể trả về Future (vd:
+    khi gửi sang EmbeddingExecutor), khi đó luồng nền không chờ mà gom tiếp lô sau.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], Any], max_batch: int, max_wait: float):
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: List[Tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("EmbeddingBatcher đã dừng.")
+            self._queue.append((text, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                result = self.encode_batch(texts)
+            except Exception as e:
+                self._resolve(batch, texts, None, e)
+                continue
+            if isinstance(result, Future):
+                result.add_done_callback(
+                    lambda f, batch=batch, texts=texts: self._resolve(
+                        batch, texts, None if f.exception() else f.result(), f.exception()))
+            else:
+                self._resolve(batch, texts, result, None)
+
+    def _resolve(self, batch: List[Tuple[str, Future]], texts: List[str], vectors, error: Optional[BaseException]):
+        if error is not None:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        # Tách từng dòng ra mảng riêng để cache không giữ cả lô trong bộ nhớ
+        rows = {text: vector.copy() for text, vector in zip(texts, np.asarray(vectors, dtype=np.float32))}
+        for text, future in batch:
+            future.set_result(rows[text])
+        with self._cond:
+            self.batches += 1
+            self.requests += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "queued": len(self._queue),
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def close(self):
+        """Dừng luồng nền sau khi xử lý hết các yêu cầu còn trong hàng đợi."""
+        with self._cond:
+            self._stopped = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+
+def _encode_local(texts: List[str]) -> np.ndarray:
+    return np.asarray(get_embedding_model().encode(texts, batch_size=len(texts)), dtype=np.float32)
+
+
+def _process_worker_init():
+    # Chạy trong tiến trình con: nạp model một lần cho mỗi worker
+    get_embedding_model()
+
+
+def _process_encode(texts: List[str], shm_name: str) -> Tuple[int, int]:
+    """Encode trong tiến trình con và ghi kết quả vào shared memory do tiến trình cha cấp."""
+    vectors = _encode_local(texts)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        if vectors.nbytes > shm.size:
+            raise ValueError(f"Vector {vectors.shape} không vừa shared memory ({shm.size} bytes); "
+                             f"kiểm tra EMBEDDING_DIMENSION.")
+        np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)[:] = vectors
+    finally:
+        shm.close()
+    return vectors.shape
+
+
+class EmbeddingExecutor:
+    """
+    Chạy encode ngoài luồng gọi (và ngoài event loop của API):
+    - "thread":  thread pool `workers` luồng trong tiến trình hiện tại. Nên giới
+                 hạn EMBEDDING_INTRA_OP_THREADS để các luồng không tranh CPU.
+    - "process": process pool `workers` tiến trình, mỗi tiến trình nạp model
+                 riêng; văn bản gửi qua pipe, vector trả về qua shared memory.
+                 Tiến trình API không nạp model và không giữ GIL khi encode.
+    """
+
+    def __init__(self, mode: str, workers: int):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"EMBEDDING_EXECUTOR không hợp lệ: {mode} (thread hoặc process)")
+        self.mode = mode
+        self.workers = workers
+        self._pool = None
+        self._waiter_pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.mode == "process":
+                        # spawn: tiến trình con không kế thừa trạng thái torch / luồng của tiến trình cha
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                            initializer=_process_worker_init)
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding")
+        return self._pool
+
+    def _reset_pool(self, broken):
+        """Bỏ process pool đã hỏng (một tiến trình con chết) để lần gọi sau tạo pool mới."""
+        with self._lock:
+            if self._pool is not broken:
+                # Luồng khác đã tạo lại pool
+                return
+            self._pool = None
+            self.restarts += 1
+        print("[Embedding] Process pool bị hỏng (tiến trình con đã dừng), tạo lại pool.")
+        broken.shutdown(wait=False)
+
+    def _run_in_process(self, texts: List[str]) -> np.ndarray:
+        shm = shared_memory.SharedMemory(create=True, size=max(len(texts) * settings.EMBEDDING_DIMENSION * 4, 1))
+        try:
+            # Thử lại một lần với pool mới nếu pool hỏng (vd: tiến trình con bị OOM killer dừng)
+            for attempt in range(2):
+                pool = self._get_pool()
+                try:
+                    shape = pool.submit(_process_encode, texts, shm.name).result()
+                    return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+                except BrokenProcessPool:
+                    self._reset_pool(pool)
+                    if attempt:
+                        raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Encode một lô văn bản; Future trả về ma trận float32 (len(texts), số chiều)."""
+        with self._lock:
+            self._in_flight += 1
+            self.submitted += 1
+        if self.mode == "process":
+            # Luồng của thread pool phụ chỉ chờ tiến trình con (không giữ GIL)
+            future = self._waiters().submit(self._run_in_process, texts)
+        else:
+            future = self._get_pool().submit(_encode_local, texts)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _waiters(self) -> ThreadPoolExecutor:
+        if self._waiter_pool is None:
+            with self._lock:
+                if self._waiter_pool is None:
+                    self._waiter_pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                           thread_name_prefix="embedding-wait")
+        return self._waiter_pool
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+            self.failed += int(future.exception() is not None)
+
+    def warm_up(self):
+        """Khởi động đủ `workers` worker (mỗi worker nạp model) trước khi nhận truy vấn."""
+        futures = [self.submit(["warm-up"]) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(self._in_flight - self.workers, 0),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pools = [self._pool, self._waiter_pool]
+            self._pool = self._waiter_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+
+embedding_executor = EmbeddingExecutor(
+    settings.EMBEDDING_EXECUTOR,
+    workers=settings.EMBEDDING_EXECUTOR_WORKERS
+) if settings.EMBEDDING_EXECUTOR else None
+
+
+def _encode_batch(texts: List[str]):
+    """Encode một lô: qua executor (trả về Future) nếu có, ngược lại ngay trong luồng hiện tại."""
+    if embedding_executor is not None:
+        return embedding_executor.submit(texts)
+    return _encode_local(texts)
+
+
+embedding_batcher = EmbeddingBatcher(
+    _encode_batch,
+    max_batch=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000
+) if settings.EMBEDDING_BATCH_ENABLED else None
+
+
+class EmbeddingCache:
+    """
+    Cache LRU cho embedding của câu truy vấn, khóa theo (tên model, văn bản đã
+    chuẩn hóa). Vector được lưu dạng mảng float32 chỉ đọc; giới hạn theo tổng
+    số byte và (tùy chọn) thời gian sống `ttl` giây (0 = không hết hạn).
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _size(key: Tuple[str, str], vector: np.ndarray) -> int:
+        return vector.nbytes + len(key[1].encode("utf-8"))
+
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self.ttl > 0 and time.monotonic() - item[0] > self.ttl:
+                self._bytes -= self._size(key, item[1])
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Tuple[str, str], vector: np.ndarray):
+        size = self._size(key, vector)
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(key, old[1])
+            self._entries[key] = (time.monotonic(), vector)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, (_, old_vector) = self._entries.popitem(last=False)
+                self._bytes -= self._size(old_key, old_vector)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+embedding_cache = EmbeddingCache(
+    max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+    ttl=settings.EMBEDDING_CACHE_TTL_SECONDS
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Khóa cache của câu truy vấn: chuẩn hóa NFKC (full-width -> half-width...) và
+    gộp khoảng trắng; giữ nguyên chữ hoa/thường. Chỉ dùng làm khóa: model vẫn
+    encode câu gốc như embedding của các chunk đã lưu.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def _submit_uncached(text: str) -> Optional[Future]:
+    """Future của vector cho một câu chưa có trong cache; None nếu không có batcher / executor."""
+    if embedding_batcher is not None:
+        return embedding_batcher.submit(text)
+    if embedding_executor is not None:
+        row = Future()
+        batch = embedding_executor.submit([text])
+        batch.add_done_callback(
+            lambda f: row.set_exception(f.exception()) if f.exception() else row.set_result(f.result()[0]))
+        return row
+    return None
+
+
+def _cache_vector(key: Tuple[str, str], vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    vector.flags.writeable = False
+    embedding_cache.put(key, vector)
+    return vector
+
+
+def encode_query(text: str) -> np.ndarray:
+    """Embedding float32 (chỉ đọc) của một câu truy vấn, dùng cache nếu đã encode trước đó."""
+    key = (embedding_model_id(), normalize_query_text(text))
+    vector = embedding_cache.get(key)
+    if vector is None:
+        future = _submit_uncached(text)
+        vector = future.result() if future is not None else _encode_local([text])[0]
+        vector = _cache_vector(key, vector)
+    return vector
+
+
+async def aencode_query(text: str) -> np.ndarray:
+    """Bản bất đồng bộ của encode_query: chờ kết quả mà không chặn event loop."""
+    key = (embedding_model_id(), normalize_query_text(text))
+    vector = embedding_cache.get(key)
+    if vector is None:
+        future = _submit_uncached(text)
+        if future is not None:
+            vector = await asyncio.wrap_future(future)
+        else:
+            vector = (await asyncio.to_thread(_encode_local, [text]))[0]
+        vector = _cache_vector(key, vector)
+    return vector
+
+
+def _cached_and_missing(texts: List[str]) -> Tuple[List[Tuple[str, str]], Dict[Tuple[str, str], np.ndarray],
+                                                   Dict[Tuple[str, str], str]]:
+    """Khóa cache của từng câu, các vector đã có và câu gốc (lần xuất hiện đầu) của các khóa còn thiếu."""
+    model_id = embedding_model_id()
+    keys = [(model_id, normalize_query_text(text)) for text in texts]
+    vectors: Dict[Tuple[str, str], np.ndarray] = {}
+    missing: Dict[Tuple[str, str], str] = {}
+    for key, text in zip(keys, texts):
+        if key in vectors or key in missing:
+            continue
+        vector = embedding_cache.get(key)
+        if vector is None:
+            missing[key] = text
+        else:
+            vectors[key] = vector
+    return keys, vectors, missing
+
+
+def _stack(keys: List[Tuple[str, str]], vectors: Dict[Tuple[str, str], np.ndarray]) -> np.ndarray:
+    if not keys:
+        return np.empty((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+    return np.stack([vectors[key] for key in keys])
+
+
+def encode_queries(texts: List[str]) -> np.ndarray:
+    """
+    Embedding (ma trận float32, theo đúng thứ tự) của nhiều câu truy vấn: câu đã
+    có trong cache lấy từ cache, các câu còn lại (bỏ trùng) được encode chung một lô.
+    """
+    keys, vectors, missing = _cached_and_missing(texts)
+    if missing:
+        batch = _encode_batch(list(missing.values()))
+        batch = batch.result() if isinstance(batch, Future) else batch
+        for key, vector in zip(missing, batch):
+            vectors[key] = _cache_vector(key, vector)
+    return _stack(keys, vectors)
+
+
+async def aencode_queries(texts: List[str]) -> np.ndarray:
+    """Bản bất đồng bộ của encode_queries."""
+    keys, vectors, missing = _cached_and_missing(texts)
+    if missing:
+        if embedding_executor is not None:
+            batch = await asyncio.wrap_future(embedding_executor.submit(list(missing.values())))
+        else:
+            batch = await asyncio.to_thread(_encode_local, list(missing.values()))
+        for key, vector in zip(missing, batch):
+            vectors[key] = _cache_vector(key, vector)
+    return _stack(keys, vectors)
+
+
+def to_pgvector(vector) -> str:
+    """Chuỗi literal của pgvector ('[0.1,0.2,...]') cho một vector."""
+    return "[" + ",".join(f"{float(x):.7g}" for x in vector) + "]"
+
+
+def encode_query_vector(text: str) -> str:
+    """Embedding của câu truy vấn dưới dạng literal pgvector, dùng làm tham số `embedding <=> %s`."""
+    return to_pgvector(encode_query(text))
+
+
+async def aencode_query_vector(text: str) -> str:
+    """Bản bất đồng bộ của encode_query_vector."""
+    return to_pgvector(await aencode_query(text))
+
+
 def encode_text(text: str) -> list[float]:
-    return _embedding_model.encode(text).tolist()
\ No newline at end of file
+    return encode_query(text).tolist()
@@ -0,0 +1,206 @@
+# src/core/history_cache.py
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from src.config import settings
+
+# Cache trong tiến trình cho phần đuôi lịch sử chat của từng phiên.
+# Mỗi phiên giữ thông tin phiên (user_id, loại, context), tối đa
+# CHAT_HISTORY_CACHE_MAX_MESSAGES tin nhắn gần nhất, con trỏ `last_order`
+# (messenger_order lớn nhất đã thấy) và `message_count` (số dòng của phiên có
+# messenger_order <= last_order). Lượt sau chỉ cần đọc các dòng có
+# messenger_order > last_order thay vì tải lại toàn bộ lịch sử; nếu database
+# còn ít dòng <= last_order hơn message_count (tiến trình khác đã chạy
+# rewind_last_turn / xóa tin nhắn) thì bỏ cache của phiên và tải lại.
+# Dùng chung cho session_manager (đồng bộ) và async_session_manager.
+
+MessageRow = Tuple[int, str, str]  # (messenger_order, messenger_type, content)
+
+
+class CachedSession:
+    __slots__ = ("user_id", "session_type", "context", "messages", "last_order", "message_count")
+
+    def __init__(self, user_id: str, session_type: str, context: Dict[str, Any]):
+        self.user_id = user_id
+        self.session_type = session_type
+        self.context = context
+        self.messages: List[BaseMessage] = []
+        self.last_order = 0
+        self.message_count = 0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Ước lượng số token của một đoạn văn bản mà không cần tokenizer:
+    mỗi ký tự CJK (Kanji/Kana) ~ 1 token, các ký tự khác ~ 4 ký tự / token.
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '\u3040' <= ch <= '\u30FF' or '\u3400' <= ch <= '\u9FFF')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Phần đầu dài nhất của `text` có số token ước lượng (estimate_tokens) không vượt quá `max_tokens`."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def select_window(messages: List[BaseMessage], max_turns: int = 0, max_tokens: int = 0) -> List[BaseMessage]:
+    """
+    Cắt phần đuôi của lịch sử: tối đa `max_turns` lượt (mỗi lượt = 1 cặp Human-AI)
+    và tổng số token ước lượng không vượt quá `max_tokens`. Giá trị 0 = không giới hạn.
+    Tin nhắn cuối cùng luôn được giữ; nếu riêng nó đã vượt `max_tokens` thì bị cắt bớt.
+    """
+    window = messages[-max_turns * 2:] if max_turns else list(messages)
+    if max_tokens and window:
+        budget = max_tokens
+        start = len(window)
+        while start > 0:
+            cost = estimate_tokens(str(window[start - 1].content))
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 1
+        if start == len(window):
+            latest = window[-1]
+            return [latest.model_copy(update={"content": truncate_to_tokens(str(latest.content), max_tokens)})]
+        window = window[start:]
+    return window
+
+
+def history_window(messages: List[BaseMessage], max_turns: Optional[int] = None,
+                   max_tokens: Optional[int] = None) -> List[BaseMessage]:
+    """Cửa sổ lịch sử của một phiên; tham số None lấy giá trị mặc định từ settings."""
+    return select_window(
+        messages,
+        settings.CHAT_HISTORY_MAX_TURNS if max_turns is None else max_turns,
+        settings.CHAT_HISTORY_MAX_TOKENS if max_tokens is None else max_tokens
+    )
+
+
+class SessionHistoryCache:
+    def __init__(self, max_sessions: int, max_messages: int):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[int, CachedSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0
+
+    def get(self, session_id: int) -> Optional[CachedSession]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return entry
+
+    def store(self, session_id: int, user_id: str, session_type: str, context: Dict[str, Any],
+              rows: Iterable[MessageRow], row_to_message, message_count: int = 0) -> CachedSession:
+        """
+        Tạo (hoặc thay thế) mục cache của một phiên từ các dòng đuôi lịch sử theo
+        thứ tự tăng dần; `message_count` là tổng số dòng của phiên trong cùng lượt đọc.
+        """
+        entry = CachedSession(user_id, session_type, context or {})
+        self._append_rows(entry, rows, row_to_message)
+        entry.message_count = message_count
+        if self.enabled:
+            with self._lock:
+                self._sessions[session_id] = entry
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+        return entry
+
+    def extend(self, session_id: int, rows: Iterable[MessageRow], row_to_message):
+        """Nối các dòng mới đọc được (messenger_order > last_order) vào cache của phiên."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._append_rows(entry, rows, row_to_message)
+
+    def append_messages(self, session_id: int, first_order: int, messages: List[BaseMessage]):
+        """
+        Ghi nhận các tin nhắn vừa được thêm trong tiến trình này. Nếu giữa cache và
+        các tin nhắn mới có khoảng trống (tiến trình khác đã ghi xen vào), bỏ cache
+        của phiên để lượt đọc sau tải lại từ database.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            if first_order + len(messages) - 1 <= entry.last_order:
+                return  # đã được nạp từ database trước đó
+            if first_order != entry.last_order + 1:
+                del self._sessions[session_id]
+                return
+            entry.messages.extend(messages)
+            entry.last_order += len(messages)
+            entry.message_count += len(messages)
+            self._trim(entry)
+
+    def position(self, entry: CachedSession) -> Tuple[int, int]:
+        """(last_order, message_count) nhất quán của một mục cache, dùng cho lượt đọc tiếp."""
+        with self._lock:
+            return entry.last_order, entry.message_count
+
+    def snapshot(self, entry: CachedSession) -> Tuple[List[BaseMessage], int]:
+        """Bản sao nhất quán (danh sách tin nhắn, last_order) của một mục cache."""
+        with self._lock:
+            return list(entry.messages), entry.last_order
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_messages": self.max_messages,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _append_rows(self, entry: CachedSession, rows: Iterable[MessageRow], row_to_message):
+        for order, msg_type, content in rows:
+            if order <= entry.last_order:
+                continue
+            entry.messages.append(row_to_message(msg_type, content))
+            entry.last_order = order
+            entry.message_count += 1
+        self._trim(entry)
+
+    def _trim(self, entry: CachedSession):
+        overflow = len(entry.messages) - self.max_messages
+        if overflow > 0:
+            del entry.messages[:overflow]
+
+
+history_cache = SessionHistoryCache(
+    max_sessions=settings.CHAT_HISTORY_CACHE_MAX_SESSIONS,
+    max_messages=settings.CHAT_HISTORY_CACHE_MAX_MESSAGES
+)
@@ -0,0 +1,92 @@
+# src/core/lexical_index.py
+import math
+import unicodedata
+from collections import defaultdict
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Index đảo theo n-gram ký tự (unigram + bigram) cho chunk_text. Tiếng Nhật
+# không có khoảng trắng giữa các từ nên tách từ theo ký tự là cách đơn giản
+# nhất để tra nguyên văn một từ (家族, 〜たことがある...): lấy giao các posting
+# list của các n-gram trong từ rồi kiểm tra lại bằng phép so khớp chuỗi.
+# Với câu hỏi tự do, các chunk được xếp hạng theo tổng IDF của các bigram
+# chung với câu hỏi.
+
+
+def normalize_lexical(text: str) -> str:
+    """NFKC (thống nhất ký tự toàn / nửa độ rộng) và chữ thường."""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def char_ngrams(text: str, n: int) -> set:
+    """Các n-gram ký tự không chứa khoảng trắng của một chuỗi đã chuẩn hóa."""
+    return {text[i:i + n] for i in range(len(text) - n + 1) if not any(ch.isspace() for ch in text[i:i + n])}
+
+
+class BigramIndex:
+    def __init__(self, texts: Sequence[str]):
+        self.texts = [normalize_lexical(text) for text in texts]
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for row, text in enumerate(self.texts):
+            for gram in char_ngrams(text, 1) | char_ngrams(text, 2):
+                postings[gram].append(row)
+        self.postings = {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.size = len(self.texts)
+
+    def _query_grams(self, text: str) -> set:
+        return char_ngrams(text, 2) if len(text) > 1 else char_ngrams(text, 1)
+
+    def exact(self, term: str, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        (dòng, số lần xuất hiện) của các chunk chứa nguyên văn `term`, nhiều
+        lần xuất hiện nhất trước. `rows` giới hạn trong các dòng đã qua bộ lọc.
+        """
+        term = normalize_lexical(term).strip()
+        grams = self._query_grams(term)
+        if not grams:
+            return []
+        lists = sorted((self.postings.get(gram) for gram in grams), key=lambda p: 0 if p is None else len(p))
+        if lists[0] is None:
+            return []
+        candidates = lists[0]
+        for postings in lists[1:]:
+            candidates = np.intersect1d(candidates, postings, assume_unique=True)
+            if not len(candidates):
+                return []
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        hits = [(int(row), float(self.texts[row].count(term))) for row in candidates if term in self.texts[row]]
+        return sorted(hits, key=lambda hit: (-hit[1], hit[0]))
+
+    def rank(self, query: str, limit: int, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(dòng, điểm) của tối đa `limit` chunk có tổng IDF của các bigram chung với `query` cao nhất."""
+        grams = self._query_grams(normalize_lexical(query))
+        scores = np.zeros(self.size, dtype=np.float32)
+        for gram in grams:
+            postings = self.postings.get(gram)
+            if postings is not None:
+                scores[postings] += math.log(1 + self.size / len(postings))
+        if rows is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[rows] = True
+            scores[~allowed] = 0
+        matched = np.flatnonzero(scores)
+        if not len(matched) or limit <= 0:
+            return []
+        k = min(limit, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence], k: int = 60) -> List[Tuple[object, float]]:
+    """
+    Gộp nhiều danh sách xếp hạng (mỗi danh sách là các khóa theo thứ tự tốt
+    nhất trước) bằng RRF: điểm = tổng 1 / (k + hạng). Trả về (khóa, điểm) giảm dần.
+    """
+    scores: Dict[object, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
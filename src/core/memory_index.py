@@ -0,0 +1,363 @@
+# src/core/memory_index.py
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Iterable
+
+import numpy as np
+import psycopg2
+from psycopg2.sql import SQL, Identifier
+
+from src.config import settings
+from src.core.database import get_db_connection, canonical_filter_value
+from src.core.lexical_index import BigramIndex
+from src.core.retrieval_cache import retrieval_cache
+
+# Bản sao trong bộ nhớ của một bảng chunk (content_chunks / contentchunks) để
+# trả lời top-k theo cosine mà không cần round trip tới pgvector. Bộ tài liệu
+# nhỏ và hầu như chỉ đọc, nên toàn bộ vector nằm trong một ma trận float32 liền
+# khối (hàng đã chuẩn hóa L2) cùng các mảng metadata theo cột; các cột dùng để
+# lọc được mã hóa thành mã số nguyên để lọc bằng phép so sánh vector hóa.
+#
+# Index được làm mới trong luồng nền theo cột change_version (migration 0008):
+# chỉ các dòng có change_version lớn hơn phiên bản đã nạp được đọc lại. Sau mỗi
+# lần làm mới, số dòng và tổng change_version của bảng được so với snapshot;
+# nếu lệch (có dòng bị xóa, hoặc một giao dịch commit muộn với change_version
+# nhỏ hơn phiên bản đã nạp - mỗi INSERT / UPDATE đổi tổng) thì nạp lại toàn bộ.
+# Ngoài ra index được nạp lại toàn bộ mỗi VECTOR_MEMORY_INDEX_FULL_RELOAD_SECONDS giây.
+# Khi index chưa nạp xong hoặc quá VECTOR_MEMORY_INDEX_MAX_STALENESS_SECONDS
+# kể từ lần làm mới thành công cuối cùng, search() trả về None để nơi gọi
+# quay về truy vấn SQL.
+
+INDEX_COLUMNS = ("chunk_text", "course_id", "material_id", "level", "skill_type",
+                 "source_document_name", "original_page_number", "metadata_json")
+FILTER_COLUMNS = ("course_id", "material_id", "level", "skill_type")
+
+# (id, change_version, embedding (list float), *INDEX_COLUMNS)
+ChunkRow = Tuple[Any, ...]
+
+
+def _filter_key(value, ignore_case: bool):
+    # Cùng chuẩn hóa với bộ lọc SQL (chunk_filter_sql)
+    return canonical_filter_value(value) if ignore_case and isinstance(value, str) else value
+
+
+def _encode_column(values: np.ndarray, ignore_case: bool) -> Tuple[Dict[Any, int], np.ndarray]:
+    """Mã hóa một cột metadata: (giá trị -> mã, mảng mã int32 theo từng dòng)."""
+    lookup: Dict[Any, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for row, value in enumerate(values):
+        codes[row] = lookup.setdefault(_filter_key(value, ignore_case), len(lookup))
+    return lookup, codes
+
+
+class IndexSnapshot:
+    """Dữ liệu của index tại một phiên bản. Không bị sửa sau khi tạo nên tìm kiếm không cần khóa."""
+
+    def __init__(self, ids: np.ndarray, versions: np.ndarray, matrix: np.ndarray,
+                 columns: Dict[str, np.ndarray], version: int):
+        self.ids = ids
+        # change_version của từng dòng (để so tổng với bảng)
+        self.versions = versions
+        self.positions = {int(chunk_id): row for row, chunk_id in enumerate(ids)}
+        self.matrix = matrix
+        self.columns = columns
+        self.version = version
+        self._lexical: Optional[BigramIndex] = None
+        self.codes = {
+            (column, ignore_case): _encode_column(columns[column], ignore_case)
+            for column in FILTER_COLUMNS for ignore_case in (False, True)
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def version_sum(self) -> int:
+        return int(self.versions.sum())
+
+    @staticmethod
+    def _normalized(vectors: Iterable) -> np.ndarray:
+        matrix = np.asarray(list(vectors), dtype=np.float32)
+        if matrix.ndim != 2:
+            return np.empty((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @classmethod
+    def build(cls, rows: List[ChunkRow], version: int = 0) -> "IndexSnapshot":
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        versions = np.array([row[1] for row in rows], dtype=np.int64)
+        matrix = cls._normalized(row[2] for row in rows)
+        columns = {}
+        for offset, column in enumerate(INDEX_COLUMNS, start=3):
+            values = np.empty(len(rows), dtype=object)
+            values[:] = [row[offset] for row in rows]
+            columns[column] = values
+        version = max([version] + [row[1] for row in rows])
+        return cls(ids, versions, matrix, columns, version)
+
+    def apply(self, rows: List[ChunkRow]) -> "IndexSnapshot":
+        """Snapshot mới sau khi cập nhật (theo id) hoặc thêm các dòng đã thay đổi."""
+        if not rows:
+            return self
+        updated = [(self.positions[row[0]], row) for row in rows if row[0] in self.positions]
+        added = [row for row in rows if row[0] not in self.positions]
+        matrix = self.matrix.copy()
+        versions = self.versions.copy()
+        columns = {column: values.copy() for column, values in self.columns.items()}
+        if updated:
+            positions = [position for position, _ in updated]
+            matrix[positions] = self._normalized(row[2] for _, row in updated)
+            versions[positions] = [row[1] for _, row in updated]
+            for offset, column in enumerate(INDEX_COLUMNS, start=3):
+                for position, row in updated:
+                    columns[column][position] = row[offset]
+        ids = self.ids
+        if added:
+            extra = IndexSnapshot.build(added)
+            ids = np.concatenate([ids, extra.ids])
+            versions = np.concatenate([versions, extra.versions])
+            matrix = np.vstack([matrix, extra.matrix])
+            columns = {column: np.concatenate([values, extra.columns[column]])
+                       for column, values in columns.items()}
+        return IndexSnapshot(ids, versions, matrix, columns, max([self.version] + [row[1] for row in rows]))
+
+    def filter_rows(self, filters: Dict[str, Any] = None, ignore_case: Sequence[str] = ()) -> Optional[np.ndarray]:
+        """Các dòng khớp mọi bộ lọc (so sánh bằng); None nếu không có bộ lọc nào."""
+        mask = None
+        for column, value in (filters or {}).items():
+            lookup, codes = self.codes[(column, column in ignore_case)]
+            code = lookup.get(_filter_key(value, column in ignore_case))
+            if value is None or code is None:
+                # Giống SQL: `cột = NULL` không khớp dòng nào
+                return np.empty(0, dtype=np.int64)
+            mask = codes == code if mask is None else mask & (codes == code)
+        return np.flatnonzero(mask) if mask is not None else None
+
+    def search(self, query: np.ndarray, top_k: int, filters: Dict[str, Any] = None,
+               ignore_case: Sequence[str] = ()) -> List[Tuple[int, float]]:
+        """(dòng, cosine) của top-k dòng khớp mọi bộ lọc, theo cosine giảm dần."""
+        return self.search_many(np.atleast_2d(query), top_k, filters, ignore_case)[0]
+
+    def search_many(self, queries: np.ndarray, top_k: int, filters: Dict[str, Any] = None,
+                    ignore_case: Sequence[str] = ()) -> List[List[Tuple[int, float]]]:
+        """
+        Như search() cho nhiều vector truy vấn (mỗi hàng một vector). Điểm của
+        mọi truy vấn được tính bằng một phép nhân ma trận, chỉ quét ma trận vector một lần.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rows = self.filter_rows(filters, ignore_case)
+        if (rows is not None and not len(rows)) or not len(self) or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = (self.matrix if rows is None else self.matrix[rows]) @ (queries / norms).T
+        k = min(top_k, scores.shape[0])
+        results = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top], kind="stable")]
+            positions = top if rows is None else rows[top]
+            results.append([(int(position), float(column[i])) for position, i in zip(positions, top)])
+        return results
+
+    @property
+    def lexical(self) -> BigramIndex:
+        """Index n-gram của chunk_text, tạo ở lần dùng đầu tiên (hoặc ngay khi làm mới, xem MemoryVectorIndex)."""
+        if self._lexical is None:
+            self._lexical = BigramIndex(self.columns["chunk_text"])
+        return self._lexical
+
+    def lexical_search(self, text: str, top_k: int, filters: Dict[str, Any] = None,
+                       ignore_case: Sequence[str] = (), exact: bool = False) -> List[Tuple[int, float]]:
+        """Chunk chứa nguyên văn `text` (exact=True) hoặc xếp hạng theo bigram chung với `text`."""
+        rows = self.filter_rows(filters, ignore_case)
+        if rows is not None and not len(rows):
+            return []
+        if exact:
+            return self.lexical.exact(text, rows)[:top_k]
+        return self.lexical.rank(text, top_k, rows)
+
+    def _value(self, column: str, position: int) -> Any:
+        if column == "id":
+            return int(self.ids[position])
+        if column == "embedding":
+            # Hàng của ma trận (đã chuẩn hóa L2, dùng chung với index): nơi gọi không được sửa
+            return self.matrix[position]
+        return self.columns[column][position]
+
+    def rows(self, hits: List[Tuple[int, float]], columns: Sequence[str]) -> List[Dict[str, Any]]:
+        return [{column: self._value(column, position) for column in columns} for position, _ in hits]
+
+
+class MemoryVectorIndex:
+    def __init__(self, table: str, refresh_interval: float, max_staleness: float, full_reload_interval: float = 0):
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.full_reload_interval = full_reload_interval
+        self._last_full_load = 0.0
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._last_attempt = 0.0
+        self._last_success = 0.0
+        self.searches = 0
+        self.fallbacks = 0
+        self.full_loads = 0
+        self.incremental_refreshes = 0
+        self.refresh_errors = 0
+        self.last_refresh_ms = 0.0
+
+    def _select(self) -> SQL:
+        return SQL("SELECT id, change_version, embedding::real[], {} FROM {} WHERE change_version > %s").format(
+            SQL(", ").join(Identifier(column) for column in INDEX_COLUMNS), Identifier(self.table))
+
+    def _fetch(self, conn, since: int) -> List[ChunkRow]:
+        # Server-side cursor để lần nạp đầu không phải giữ hai bản kết quả trong bộ nhớ
+        with conn.cursor(name=f"memory_index_{uuid.uuid4().hex}") as cur:
+            cur.itersize = settings.DB_STREAM_ITERSIZE
+            cur.execute(self._select(), (since,))
+            return [tuple(row) for row in cur]
+
+    def _checksum(self, conn) -> Tuple[int, int]:
+        """(số dòng, tổng change_version) của bảng."""
+        with conn.cursor() as cur:
+            cur.execute(SQL("SELECT count(*), coalesce(sum(change_version), 0) FROM {};").format(
+                Identifier(self.table)))
+            count, total = cur.fetchone()
+            return int(count), int(total)
+
+    def refresh(self) -> bool:
+        """Đọc các dòng đã thay đổi (hoặc cả bảng ở lần đầu). Trả về False nếu lỗi."""
+        self._last_attempt = time.monotonic()
+        conn = get_db_connection()
+        if not conn:
+            self.refresh_errors += 1
+            return False
+        start = time.perf_counter()
+        try:
+            with conn.cursor() as cur:
+                # Số dòng và các dòng thay đổi được đọc trong cùng một snapshot của database
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+            current = self._snapshot
+            full_reload = current is None or (
+                self.full_reload_interval > 0 and time.monotonic() - self._last_full_load >= self.full_reload_interval)
+            if not full_reload:
+                snapshot = current.apply(self._fetch(conn, current.version))
+                self.incremental_refreshes += 1
+                full_reload = self._checksum(conn) != (len(snapshot), snapshot.version_sum)
+            if full_reload:
+                snapshot = IndexSnapshot.build(self._fetch(conn, 0))
+                self.full_loads += 1
+                self._last_full_load = time.monotonic()
+            conn.rollback()
+        except psycopg2.Error as e:
+            print(f"[Memory index] Không thể làm mới index của bảng {self.table}: {e}")
+            conn.rollback()
+            self.refresh_errors += 1
+            return False
+        finally:
+            conn.close()
+        if settings.RAG_HYBRID_SEARCH:
+            # Dựng index n-gram ngay trong luồng làm mới để lượt tìm đầu tiên không phải chờ
+            snapshot.lexical
+        if snapshot is not current:
+            # Kết quả đã cache có thể được tính từ snapshot cũ
+            retrieval_cache.invalidate(self.table)
+        self._snapshot = snapshot
+        self._last_success = time.monotonic()
+        self.last_refresh_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._last_attempt = time.monotonic()
+            self._refresh_thread = threading.Thread(
+                target=self.refresh, name=f"memory-index-{self.table}", daemon=True)
+            self._refresh_thread.start()
+
+    def _ready_snapshot(self, columns: Sequence[str], filters: Dict[str, Any] = None) -> Optional[IndexSnapshot]:
+        """Snapshot hiện tại nếu dùng được cho truy vấn này; đồng thời lên lịch làm mới khi tới hạn."""
+        now = time.monotonic()
+        if now - self._last_attempt >= self.refresh_interval:
+            self._refresh_in_background()
+        snapshot = self._snapshot
+        if (snapshot is None or now - self._last_success > self.max_staleness
+                or not set(columns) <= set(INDEX_COLUMNS + ("id", "embedding"))
+                or not set(filters or {}) <= set(FILTER_COLUMNS)):
+            self.fallbacks += 1
+            return None
+        self.searches += 1
+        return snapshot
+
+    def search(self, query: np.ndarray, top_k: int, columns: Sequence[str], filters: Dict[str, Any] = None,
+               ignore_case: Sequence[str] = ()) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top-k dòng (dictionary theo `columns`) gần `query` nhất, hoặc None nếu
+        index chưa sẵn sàng / quá cũ / không trả lời được truy vấn này (cột hoặc
+        bộ lọc không có trong index) - khi đó nơi gọi dùng truy vấn SQL.
+        """
+        snapshot = self._ready_snapshot(columns, filters)
+        if snapshot is None or len(query) != snapshot.matrix.shape[1]:
+            return None
+        return snapshot.rows(snapshot.search(query, top_k, filters, ignore_case), columns)
+
+    def search_many(self, queries: np.ndarray, top_k: int, columns: Sequence[str], filters: Dict[str, Any] = None,
+                    ignore_case: Sequence[str] = ()) -> Optional[List[List[Dict[str, Any]]]]:
+        """Như search() cho nhiều vector truy vấn; None nếu phải dùng truy vấn SQL."""
+        snapshot = self._ready_snapshot(columns, filters)
+        if snapshot is None or np.shape(queries)[-1] != snapshot.matrix.shape[1]:
+            return None
+        return [snapshot.rows(hits, columns)
+                for hits in snapshot.search_many(queries, top_k, filters, ignore_case)]
+
+    def lexical_search(self, text: str, top_k: int, columns: Sequence[str], filters: Dict[str, Any] = None,
+                       ignore_case: Sequence[str] = (), exact: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Như search() nhưng theo từ vựng, xem IndexSnapshot.lexical_search."""
+        snapshot = self._ready_snapshot(columns, filters)
+        if snapshot is None:
+            return None
+        return snapshot.rows(snapshot.lexical_search(text, top_k, filters, ignore_case, exact), columns)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "table": self.table,
+            "rows": len(snapshot) if snapshot else 0,
+            "version": snapshot.version if snapshot else None,
+            "matrix_bytes": int(snapshot.matrix.nbytes) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - self._last_success, 1) if self._last_success else None,
+            "searches": self.searches,
+            "fallbacks": self.fallbacks,
+            "full_loads": self.full_loads,
+            "incremental_refreshes": self.incremental_refreshes,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh_ms": round(self.last_refresh_ms, 2),
+        }
+
+
+memory_indexes: Dict[str, MemoryVectorIndex] = {
+    table: MemoryVectorIndex(
+        table,
+        refresh_interval=settings.VECTOR_MEMORY_INDEX_REFRESH_SECONDS,
+        max_staleness=settings.VECTOR_MEMORY_INDEX_MAX_STALENESS_SECONDS,
+        full_reload_interval=settings.VECTOR_MEMORY_INDEX_FULL_RELOAD_SECONDS
+    )
+    for table in settings.VECTOR_MEMORY_INDEX_TABLES
+}
+
+
+def get_memory_index(table: str) -> Optional[MemoryVectorIndex]:
+    return memory_indexes.get(table)
+
+
+def warm_up_memory_indexes():
+    """Nạp sẵn các index trong bộ nhớ (gọi khi API khởi động)."""
+    for index in memory_indexes.values():
+        index.refresh()
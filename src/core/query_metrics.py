@@ -0,0 +1,285 @@
+# src/core/query_metrics.py
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from psycopg2 import extensions
+
+from src.config import settings
+
+# Đo thời gian của từng câu lệnh SQL (đồng bộ lẫn bất đồng bộ) để biết truy vấn
+# nào chiếm phần lớn độ trễ mỗi lượt chat:
+# - Gom theo "fingerprint" (câu lệnh đã bỏ literal / placeholder, gộp khoảng trắng).
+# - Mỗi fingerprint có số lần chạy, số lỗi, tổng / max thời gian, số dòng và
+#   histogram độ trễ theo các mốc cố định (ms).
+# - Thời gian chờ mượn kết nối từ pool được ghi vào một histogram riêng.
+# - Câu lệnh chậm hơn DB_SLOW_QUERY_MS được đưa vào slow-query log (vòng đệm),
+#   kèm câu lệnh mẫu để chạy EXPLAIN khi cần (explain_slow_query).
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+# Các lệnh SET LOCAL do with_vector_search_settings gắn vào trước truy vấn
+_SET_LOCAL_PREFIX = re.compile(r"^((?:\s*SET\s+LOCAL\s+[^;]*;)*)\s*(.*)$", re.IGNORECASE | re.DOTALL)
+
+
+def fingerprint(query: str) -> str:
+    """Chuẩn hóa câu lệnh SQL thành fingerprint: literal và tham số thay bằng '?'."""
+    text = _STRING_LITERAL.sub("?", query)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _LIST.sub("(?...)", text)
+    text = _WHITESPACE.sub(" ", text).strip().rstrip(";").strip()
+    return text[:500]
+
+
+class _Histogram:
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, value_ms: float):
+        index = len(BUCKETS_MS)
+        for i, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, p: float) -> float:
+        """Cận trên của bucket chứa phân vị p (ước lượng)."""
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{b}ms" for b in BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _QueryStats:
+    __slots__ = ("histogram", "rows", "errors", "sources")
+
+    def __init__(self):
+        self.histogram = _Histogram()
+        self.rows = 0
+        self.errors = 0
+        self.sources = set()
+
+
+class QueryMetrics:
+    def __init__(self, slow_query_ms: float, slow_log_size: int, max_fingerprints: int = 500):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._queries: Dict[str, _QueryStats] = {}
+        self._pool_wait = _Histogram()
+        self._slow = deque(maxlen=slow_log_size)
+        self._slow_seq = 0
+        self._fingerprints: Dict[str, str] = {}
+
+    def fingerprint_of(self, query: str) -> str:
+        """fingerprint() có cache theo chuỗi câu lệnh gốc (các câu lệnh viết tay lặp lại rất nhiều)."""
+        with self._lock:
+            fp = self._fingerprints.get(query)
+        if fp is None:
+            # Tính ngoài lock (regex), chỉ ghi vào cache khi đang giữ lock
+            fp = fingerprint(query)
+            with self._lock:
+                if len(self._fingerprints) < 4 * self.max_fingerprints:
+                    self._fingerprints[query] = fp
+        return fp
+
+    def record(self, query: str, duration_ms: float, rows: int = 0, error: bool = False,
+               source: str = "sync", sample: Optional[str] = None):
+        fp = self.fingerprint_of(query)
+        if not fp:
+            # vd: lệnh rỗng của psycopg_pool khi kiểm tra kết nối
+            return
+        with self._lock:
+            stats = self._queries.get(fp)
+            if stats is None:
+                if len(self._queries) >= self.max_fingerprints:
+                    fp = "<other>"
+                    stats = self._queries.setdefault(fp, _QueryStats())
+                else:
+                    stats = self._queries[fp] = _QueryStats()
+            stats.histogram.add(duration_ms)
+            stats.rows += max(rows, 0)
+            stats.errors += int(error)
+            stats.sources.add(source)
+        if self.slow_query_ms > 0 and duration_ms >= self.slow_query_ms:
+            self._record_slow(fp, duration_ms, rows, source, sample)
+
+    def record_pool_wait(self, wait_ms: float):
+        with self._lock:
+            self._pool_wait.add(wait_ms)
+
+    def _record_slow(self, fp: str, duration_ms: float, rows: int, source: str, sample: Optional[str]):
+        with self._lock:
+            self._slow_seq += 1
+            entry = {
+                "id": self._slow_seq,
+                "at": time.time(),
+                "fingerprint": fp,
+                "duration_ms": round(duration_ms, 3),
+                "rows": rows,
+                "source": source,
+                "sample": sample,
+                "plan": None,
+            }
+            self._slow.append(entry)
+        print(f"[Slow query] {duration_ms:.1f}ms rows={rows} ({source}) {fp[:200]}")
+
+    def snapshot(self, top: int = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+        with self._lock:
+            queries = [
+                {"fingerprint": fp, "rows": s.rows, "errors": s.errors, "sources": sorted(s.sources),
+                 **s.histogram.as_dict()}
+                for fp, s in self._queries.items()
+            ]
+            pool_wait = self._pool_wait.as_dict()
+        queries.sort(key=lambda q: q.get(order_by, 0), reverse=True)
+        return {
+            "slow_query_ms": self.slow_query_ms,
+            "pool_wait": pool_wait,
+            "queries": queries[:top],
+        }
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{k: v for k, v in entry.items() if k != "sample"} for entry in reversed(self._slow)]
+
+    def slow_query(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for entry in self._slow:
+                if entry["id"] == entry_id:
+                    return entry
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._pool_wait = _Histogram()
+            self._slow.clear()
+
+
+query_metrics = QueryMetrics(
+    slow_query_ms=settings.DB_SLOW_QUERY_MS,
+    slow_log_size=settings.DB_SLOW_QUERY_LOG_SIZE
+)
+
+
+def query_text(query, context) -> str:
+    """Chuỗi SQL gốc (chưa gắn tham số) của một câu lệnh psycopg2 / psycopg 3."""
+    if hasattr(query, "as_string"):
+        # psycopg2.sql.Composable hoặc psycopg.sql.Composable
+        return query.as_string(context)
+    if isinstance(query, bytes):
+        return query.decode("utf-8", "replace")
+    return str(query)
+
+
+class InstrumentedCursor(extensions.cursor):
+    """
+    Cursor psycopg2 ghi thời gian / số dòng của mỗi lệnh execute vào query_metrics.
+    Được gắn làm cursor_factory mặc định cho các kết nối của pool đồng bộ.
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = super().execute(query, vars)
+            error = False
+            return result
+        finally:
+            self._record(query, start, error)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        error = True
+        try:
+            result = super().executemany(query, vars_list)
+            error = False
+            return result
+        finally:
+            self._record(query, start, error)
+
+    def _record(self, query, start: float, error: bool):
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            text = query_text(query, self)
+        except Exception:
+            return
+        sample = None
+        if query_metrics.slow_query_ms > 0 and duration_ms >= query_metrics.slow_query_ms and self.query:
+            sample = self.query.decode("utf-8", "replace")
+        query_metrics.record(text, duration_ms, rows=self.rowcount, error=error, source="sync", sample=sample)
+
+
+def explain_statement(sample: str) -> str:
+    """
+    Câu lệnh EXPLAIN cho một câu lệnh mẫu; giữ lại các lệnh SET LOCAL đứng trước
+    (tham số ANN) để kế hoạch khớp với lúc chạy thật.
+    """
+    prefix, statement = _SET_LOCAL_PREFIX.match(sample).groups()
+    return f"{prefix} EXPLAIN {statement}".strip()
+
+
+def explain_slow_query(entry_id: int) -> Optional[str]:
+    """
+    Chạy EXPLAIN (không ANALYZE, nên không thực thi câu lệnh) cho một mục trong
+    slow-query log và lưu kế hoạch vào mục đó. Trả về None nếu không tìm thấy
+    mục hoặc không chạy được EXPLAIN.
+    """
+    entry = query_metrics.slow_query(entry_id)
+    if not entry or not entry.get("sample"):
+        return None
+    if entry["plan"] is not None:
+        return entry["plan"]
+
+    # Tránh vòng import: database.py dùng InstrumentedCursor của module này
+    from .database import get_db_connection
+    conn = get_db_connection()
+    if not conn: return None
+    plan = None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(explain_statement(entry["sample"]))
+            plan = "\n".join(row[0] for row in cur.fetchall())
+        entry["plan"] = plan
+    except Exception as e:
+        print(f"[Lỗi] Không thể EXPLAIN câu lệnh chậm #{entry_id}: {e}")
+    finally:
+        conn.rollback()
+        conn.close()
+    return plan
@@ -0,0 +1,233 @@
+# src/core/reranker.py
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.config import settings
+
+# Xếp hạng lại các chunk ứng viên (top RERANK_CANDIDATES theo vector / hybrid)
+# bằng một cross-encoder nhỏ chạy trên CPU, trong một ngân sách thời gian cứng
+# RERANK_BUDGET_MS cho mỗi lượt gọi. Lượt gọi giữ nguyên thứ tự ANN khi:
+# - model chưa nạp xong (lượt đầu kích hoạt nạp model trong nền),
+# - lượt chấm điểm trước vẫn đang chạy (chỉ một lượt chấm điểm tại một thời điểm
+#   để không tranh CPU với encode / agent),
+# - ước lượng thời gian theo ms / cặp của các lượt trước vượt ngân sách ngay cả
+#   với top_k ứng viên (nhưng mỗi RERANK_PROBE_SECONDS giây vẫn cho một lượt chấm
+#   top_k ứng viên để đo lại, nên một ước lượng quá cao không tắt rerank mãi),
+# - chấm điểm không xong trong ngân sách (kết quả muộn bị bỏ).
+# Nếu ngân sách chỉ đủ cho một phần ứng viên thì chỉ chấm các ứng viên đầu, phần
+# còn lại giữ thứ tự ANN phía sau.
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str, budget_ms: float, max_length: int, probe_interval: float = 30.0):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.max_length = max_length
+        self.probe_interval = probe_interval
+        self._last_probe = 0.0
+        self._model = None
+        self._load_future: Optional[Future] = None
+        self._load_lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        # Thời gian chấm điểm trung bình (trượt) của một cặp (câu hỏi, chunk)
+        self.ms_per_pair: Optional[float] = None
+        self._latencies = deque(maxlen=1000)
+        # Các bộ đếm được tăng từ nhiều luồng (luồng gọi và worker)
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.reranked = 0
+        self.trimmed = 0
+        self.timeouts = 0
+        self.skipped_cold = 0
+        self.skipped_busy = 0
+        self.skipped_budget = 0
+        self.probes = 0
+        self.errors = 0
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _probe_due(self) -> bool:
+        """True (và đánh dấu đã dùng) nếu đã tới lượt đo lại ms / cặp dù ước lượng vượt ngân sách."""
+        with self._stats_lock:
+            now = time.monotonic()
+            if now - self._last_probe < self.probe_interval:
+                return False
+            self._last_probe = now
+            self.probes += 1
+            return True
+
+    def _load(self):
+        from sentence_transformers import CrossEncoder
+
+        start = time.perf_counter()
+        model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        # Lượt predict đầu tiên chậm hơn hẳn (khởi tạo của torch); trả trước khi nhận lượt thật,
+        # rồi đo một lượt cặp ngắn để có ms / cặp ban đầu. Ước lượng thấp thì tự sửa (lượt quá
+        # ngân sách vẫn chạy xong và cập nhật ms_per_pair); ước lượng cao thì mọi lượt bị bỏ qua
+        # theo ngân sách và không bao giờ được đo lại, nên chọn cặp ngắn.
+        model.predict([("warm up", "warm up")], show_progress_bar=False)
+        pairs = [("warm up", "warm up " * 16)] * 4
+        calibrate_start = time.perf_counter()
+        model.predict(pairs, show_progress_bar=False)
+        self.ms_per_pair = (time.perf_counter() - calibrate_start) * 1000 / len(pairs)
+        self._model = model
+        print(f"[Rerank] Nạp cross-encoder {self.model_name} ({time.perf_counter() - start:.2f}s).")
+
+    def warm_up(self):
+        """Nạp model (chặn cho tới khi xong); dùng khi khởi động API."""
+        self._start_loading().result()
+
+    def _start_loading(self) -> Future:
+        with self._load_lock:
+            if self._load_future is None or (self._load_future.done() and self._load_future.exception()):
+                self._load_future = self._executor.submit(self._load)
+            return self._load_future
+
+    def _score(self, query: str, texts: List[str]) -> np.ndarray:
+        try:
+            start = time.perf_counter()
+            scores = np.asarray(self._model.predict([(query, text) for text in texts], show_progress_bar=False))
+            per_pair = (time.perf_counter() - start) * 1000 / len(texts)
+            self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+            return scores
+        finally:
+            self._busy.release()
+
+    def _submit(self, query: str, rows: List[Dict[str, Any]], top_k: int, text_key: str) -> Optional[tuple]:
+        """Gửi lượt chấm điểm cho worker; None nếu phải giữ thứ tự ANN."""
+        self._count("calls")
+        if self._model is None:
+            self._count("skipped_cold")
+            self._start_loading()
+            return None
+        count = len(rows)
+        if self.ms_per_pair:
+            # Chừa 20% ngân sách cho phần chờ / tokenize
+            count = min(count, int(0.8 * self.budget_ms / self.ms_per_pair))
+            if count < min(top_k, len(rows)):
+                if not self._probe_due():
+                    self._count("skipped_budget")
+                    return None
+                # Lượt đo lại: kết quả có thể quá giờ (giữ thứ tự ANN) nhưng _score vẫn cập nhật ms_per_pair
+                count = min(top_k, len(rows))
+        if not self._busy.acquire(blocking=False):
+            self._count("skipped_busy")
+            return None
+        if count < len(rows):
+            self._count("trimmed")
+        try:
+            future = self._executor.submit(self._score, query, [str(row.get(text_key) or "") for row in rows[:count]])
+        except RuntimeError:
+            self._busy.release()
+            return None
+        return future, count, time.perf_counter()
+
+    @staticmethod
+    def _fallback(rows: List[Dict[str, Any]], keep: int) -> List[Dict[str, Any]]:
+        """Thứ tự ANN; kết quả này không được lưu vào cache kết quả truy xuất."""
+        from src.core.retrieval_cache import skip_store
+
+        skip_store()
+        return rows[:keep]
+
+    def _merge(self, rows: List[Dict[str, Any]], scores: np.ndarray, count: int, keep: int,
+               start: float) -> List[Dict[str, Any]]:
+        self._latencies.append((time.perf_counter() - start) * 1000)
+        self._count("reranked")
+        order = np.argsort(-scores, kind="stable")
+        return ([rows[i] for i in order] + rows[count:])[:keep]
+
+    def rerank(self, query: str, rows: List[Dict[str, Any]], top_k: int,
+               text_key: str = "chunk_text", keep: int = None) -> List[Dict[str, Any]]:
+        """
+        `top_k` dòng tốt nhất của `rows` (đang theo thứ tự ANN) theo điểm cross-encoder,
+        trong ngân sách. `keep` (>= top_k): trả về nhiều dòng hơn cho bước sau (vd: MMR);
+        ngân sách vẫn chỉ cần đủ để chấm `top_k` ứng viên.
+        """
+        keep = max(keep or top_k, top_k)
+        if len(rows) <= 1:
+            return rows[:keep]
+        submitted = self._submit(query, rows, top_k, text_key)
+        if submitted is None:
+            return self._fallback(rows, keep)
+        future, count, start = submitted
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000)
+        except FutureTimeoutError:
+            self._count("timeouts")
+            return self._fallback(rows, keep)
+        except Exception as e:
+            self._count("errors")
+            print(f"[Rerank] Lỗi khi chấm điểm: {e}")
+            return self._fallback(rows, keep)
+        return self._merge(rows, scores, count, keep, start)
+
+    async def arerank(self, query: str, rows: List[Dict[str, Any]], top_k: int,
+                      text_key: str = "chunk_text", keep: int = None) -> List[Dict[str, Any]]:
+        """Bản bất đồng bộ của rerank(): chờ worker mà không chặn event loop."""
+        keep = max(keep or top_k, top_k)
+        if len(rows) <= 1:
+            return rows[:keep]
+        submitted = self._submit(query, rows, top_k, text_key)
+        if submitted is None:
+            return self._fallback(rows, keep)
+        future, count, start = submitted
+        try:
+            # shield: hết ngân sách thì chỉ bỏ kết quả, lượt chấm điểm vẫn chạy xong rồi nhả _busy
+            scores = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.budget_ms / 1000)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            return self._fallback(rows, keep)
+        except Exception as e:
+            self._count("errors")
+            print(f"[Rerank] Lỗi khi chấm điểm: {e}")
+            return self._fallback(rows, keep)
+        return self._merge(rows, scores, count, keep, start)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self._latencies)
+        return {
+            "model": self.model_name, "loaded": self._model is not None, "budget_ms": self.budget_ms,
+            "ms_per_pair": round(self.ms_per_pair, 3) if self.ms_per_pair else None,
+            "calls": self.calls, "reranked": self.reranked, "trimmed": self.trimmed, "timeouts": self.timeouts,
+            "skipped_cold": self.skipped_cold, "skipped_busy": self.skipped_busy,
+            "skipped_budget": self.skipped_budget, "probes": self.probes, "errors": self.errors,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies else 0.0,
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3) if latencies else 0.0,
+        }
+
+
+reranker = CrossEncoderReranker(
+    model_name=settings.RERANK_MODEL_NAME,
+    budget_ms=settings.RERANK_BUDGET_MS,
+    max_length=settings.RERANK_MAX_LENGTH,
+    probe_interval=settings.RERANK_PROBE_SECONDS
+) if settings.RERANK_ENABLED else None
+
+
+def rerank_candidates(top_k: int) -> int:
+    """Số ứng viên cần lấy để xếp hạng lại thành `top_k` dòng (top_k nếu rerank bị tắt)."""
+    return max(top_k, settings.RERANK_CANDIDATES) if reranker else top_k
+
+
+def rerank_rows(query: str, rows: List[Dict[str, Any]], top_k: int, text_key: str = "chunk_text",
+                keep: int = None) -> List[Dict[str, Any]]:
+    if reranker:
+        return reranker.rerank(query, rows, top_k, text_key, keep)
+    return rows[:max(keep or top_k, top_k)]
+
+
+async def arerank_rows(query: str, rows: List[Dict[str, Any]], top_k: int, text_key: str = "chunk_text",
+                       keep: int = None) -> List[Dict[str, Any]]:
+    if reranker:
+        return await reranker.arerank(query, rows, top_k, text_key, keep)
+    return rows[:max(keep or top_k, top_k)]
@@ -0,0 +1,264 @@
+# src/core/retrieval_cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable, Awaitable
+
+from src.config import settings
+from src.core.database import execute_sql_query, canonical_filter_value
+from src.core.embedding import normalize_query_text
+
+# Cache kết quả truy xuất chunk (sau khi encode + tìm top-k) trong tiến trình,
+# khóa theo (namespace, bảng, câu truy vấn đã chuẩn hóa, bộ lọc, top_k).
+# Mỗi mục được gắn "thế hệ" của bộ tài liệu: bảng corpus_generation (migration
+# 0009) giữ một bộ đếm cho mỗi bảng chunk, tăng bởi trigger mỗi khi bảng bị
+# INSERT / UPDATE / DELETE / TRUNCATE (tức mỗi lần nạp tài liệu). Khi thế hệ
+# đọc được khác thế hệ đã biết, toàn bộ mục của bảng đó bị bỏ, không cần theo
+# dõi từng khóa. Thế hệ chỉ được đọc lại sau mỗi
+# RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS giây, nên kết quả có thể cũ tối đa
+# chừng đó sau khi nạp tài liệu. Không đọc được thế hệ (chưa chạy migration,
+# lỗi kết nối) thì bỏ qua cache.
+
+GENERATION_QUERY = (
+    "SELECT COALESCE((SELECT generation FROM corpus_generation WHERE table_name = %s), 0) AS generation;"
+)
+
+CacheKey = Tuple[str, str, str, Tuple[Tuple[str, Any], ...], int]
+
+# Đặt bởi skip_store() trong lúc tính kết quả: kết quả của lượt này không được lưu
+_skip_store: ContextVar[bool] = ContextVar("retrieval_cache_skip_store", default=False)
+
+
+def skip_store():
+    """
+    Gọi trong lúc tính kết quả (compute của cached_retrieval) khi kết quả chỉ là
+    phương án dự phòng (vd: rerank quá ngân sách), để lượt sau tính lại.
+    """
+    _skip_store.set(True)
+
+
+def retrieval_key(namespace: str, table: str, query: str, filters: Dict[str, Any] = None, top_k: int = 3,
+                  ignore_case: Sequence[str] = ()) -> CacheKey:
+    """Khóa cache; giá trị lọc của các cột trong `ignore_case` được đưa về dạng chuẩn (canonical_filter_value)."""
+    normalized_filters = tuple(sorted(
+        (column, canonical_filter_value(value) if column in ignore_case else value)
+        for column, value in (filters or {}).items()
+    ))
+    return namespace, table, normalize_query_text(query or ""), normalized_filters, top_k
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: int, generation_check_interval: float):
+        self.max_entries = max_entries
+        self.generation_check_interval = generation_check_interval
+        self._entries: "OrderedDict[CacheKey, Tuple[int, Any]]" = OrderedDict()
+        # bảng -> (thời điểm kiểm tra, thế hệ)
+        self._generations: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation_checks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _known_generation(self, table: str) -> Optional[int]:
+        with self._lock:
+            known = self._generations.get(table)
+        if known is not None and time.monotonic() - known[0] < self.generation_check_interval:
+            return known[1]
+        return None
+
+    def _set_generation(self, table: str, rows: List[Dict[str, Any]]) -> Optional[int]:
+        if not rows:
+            return None
+        generation = int(rows[0]["generation"])
+        with self._lock:
+            self.generation_checks += 1
+            previous = self._generations.get(table)
+            self._generations[table] = (time.monotonic(), generation)
+        if previous is not None and previous[1] != generation:
+            self.invalidate(table)
+        return generation
+
+    def generation(self, table: str) -> Optional[int]:
+        """Thế hệ hiện tại của bảng (đọc lại từ database khi đã quá hạn kiểm tra); None nếu không đọc được."""
+        generation = self._known_generation(table)
+        if generation is None:
+            generation = self._set_generation(table, execute_sql_query(GENERATION_QUERY, (table,)))
+        return generation
+
+    async def ageneration(self, table: str) -> Optional[int]:
+        """Bản bất đồng bộ của generation()."""
+        from src.core import async_database
+
+        generation = self._known_generation(table)
+        if generation is None:
+            generation = self._set_generation(
+                table, await async_database.execute_sql_query(GENERATION_QUERY, (table,)))
+        return generation
+
+    def get(self, key: CacheKey, generation: int) -> Tuple[bool, Any]:
+        """Trả về (True, kết quả) nếu có mục cùng thế hệ, ngược lại (False, None)."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] != generation:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = item[1]
+        return True, copy.deepcopy(value)
+
+    def put(self, key: CacheKey, generation: int, value: Any):
+        if not self.enabled:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str = None):
+        """Bỏ mọi mục của một bảng (hoặc của tất cả các bảng)."""
+        with self._lock:
+            for key in [key for key in self._entries if table is None or key[1] == table]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                    "invalidations": self.invalidations, "generation_checks": self.generation_checks,
+                    "generations": {table: generation for table, (_, generation) in self._generations.items()}}
+
+
+retrieval_cache = RetrievalCache(
+    max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+    generation_check_interval=settings.RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS
+)
+
+
+def _store(key: CacheKey, generation: int, value: Any):
+    # Kết quả rỗng không được lưu: execute_sql_query trả về [] khi lỗi database,
+    # nên một lỗi tạm thời không bị giữ lại cho tới khi bộ tài liệu đổi thế hệ
+    if value and not _skip_store.get():
+        retrieval_cache.put(key, generation, value)
+
+
+def _compute(key: CacheKey, generation: Optional[int], compute: Callable[[], Any]) -> Any:
+    """Chạy `compute()` và lưu kết quả (trừ khi compute gọi skip_store()); không lưu nếu `generation` là None."""
+    token = _skip_store.set(False)
+    try:
+        value = compute()
+        if generation is not None:
+            _store(key, generation, value)
+    finally:
+        _skip_store.reset(token)
+    return value
+
+
+async def _acompute(key: CacheKey, generation: Optional[int], compute: Callable[[], Awaitable[Any]]) -> Any:
+    token = _skip_store.set(False)
+    try:
+        value = await compute()
+        if generation is not None:
+            _store(key, generation, value)
+    finally:
+        _skip_store.reset(token)
+    return value
+
+
+def _lookup_many(keys: List[CacheKey], generation: Optional[int]) -> Tuple[List[Any], Dict[CacheKey, List[int]]]:
+    """Kết quả lấy được từ cache (None ở vị trí chưa có) và vị trí của từng khóa còn thiếu."""
+    results: List[Any] = [None] * len(keys)
+    missing: Dict[CacheKey, List[int]] = {}
+    for position, key in enumerate(keys):
+        if key in missing:
+            missing[key].append(position)
+            continue
+        found, value = retrieval_cache.get(key, generation) if generation is not None else (False, None)
+        if found:
+            results[position] = value
+        else:
+            missing[key] = [position]
+    return results, missing
+
+
+def _fill(results: List[Any], positions: List[int], value: Any):
+    results[positions[0]] = value
+    for position in positions[1:]:
+        results[position] = copy.deepcopy(value)
+
+
+def cached_retrieval(namespace: str, table: str, query: str, filters: Dict[str, Any], top_k: int,
+                     compute: Callable[[], Any], ignore_case: Sequence[str] = ()) -> Any:
+    """Kết quả của `compute()` cho câu truy vấn này, lấy từ cache nếu bộ tài liệu chưa đổi."""
+    if not retrieval_cache.enabled:
+        return compute()
+    generation = retrieval_cache.generation(table)
+    if generation is None:
+        return compute()
+    key = retrieval_key(namespace, table, query, filters, top_k, ignore_case)
+    found, value = retrieval_cache.get(key, generation)
+    if found:
+        return value
+    return _compute(key, generation, compute)
+
+
+def cached_retrieval_many(namespace: str, table: str, queries: List[str], filters: Dict[str, Any], top_k: int,
+                          search_many: Callable[[List[str]], List[Any]], finish: Callable[[str, Any], Any],
+                          ignore_case: Sequence[str] = ()) -> List[Any]:
+    """
+    Như cached_retrieval cho nhiều câu truy vấn cùng bộ lọc, với cùng khóa cache
+    của từng câu. Các câu chưa có trong cache (bỏ trùng) được tìm chung một lượt
+    bằng `search_many(các câu)` (một kết quả cho mỗi câu), rồi `finish(câu, kết
+    quả)` của từng câu đóng vai trò compute của cached_retrieval.
+    """
+    generation = retrieval_cache.generation(table) if retrieval_cache.enabled else None
+    keys = [retrieval_key(namespace, table, query, filters, top_k, ignore_case) for query in queries]
+    results, missing = _lookup_many(keys, generation)
+    if missing:
+        pending = [(key, positions, queries[positions[0]]) for key, positions in missing.items()]
+        for (key, positions, query), rows in zip(pending, search_many([query for _, _, query in pending])):
+            _fill(results, positions, _compute(key, generation, lambda: finish(query, rows)))
+    return results
+
+
+async def acached_retrieval(namespace: str, table: str, query: str, filters: Dict[str, Any], top_k: int,
+                            compute: Callable[[], Awaitable[Any]], ignore_case: Sequence[str] = ()) -> Any:
+    """Bản bất đồng bộ của cached_retrieval; `compute` là hàm trả về coroutine."""
+    if not retrieval_cache.enabled:
+        return await compute()
+    generation = await retrieval_cache.ageneration(table)
+    if generation is None:
+        return await compute()
+    key = retrieval_key(namespace, table, query, filters, top_k, ignore_case)
+    found, value = retrieval_cache.get(key, generation)
+    if found:
+        return value
+    return await _acompute(key, generation, compute)
+
+
+async def acached_retrieval_many(namespace: str, table: str, queries: List[str], filters: Dict[str, Any],
+                                 top_k: int, search_many: Callable[[List[str]], Awaitable[List[Any]]],
+                                 finish: Callable[[str, Any], Awaitable[Any]],
+                                 ignore_case: Sequence[str] = ()) -> List[Any]:
+    """Bản bất đồng bộ của cached_retrieval_many; `search_many` và `finish` trả về coroutine."""
+    generation = await retrieval_cache.ageneration(table) if retrieval_cache.enabled else None
+    keys = [retrieval_key(namespace, table, query, filters, top_k, ignore_case) for query in queries]
+    results, missing = _lookup_many(keys, generation)
+    if missing:
+        pending = [(key, positions, queries[positions[0]]) for key, positions in missing.items()]
+        for (key, positions, query), rows in zip(pending, await search_many([query for _, _, query in pending])):
+            _fill(results, positions, await _acompute(key, generation, lambda: finish(query, rows)))
+    return results
@@ -1,8 +1,151 @@
+import base64
 import json
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 import psycopg2
+from src.config import settings
 from .database import get_db_connection
+from .history_cache import history_cache, history_window, CachedSession
+from .context_manager import task_context_cache
+from .write_behind import WriteBehindQueue
+
+
+def row_to_message(msg_type: str, content: str) -> BaseMessage:
+    """Chuyển một dòng của bảng chat_messenger thành đối tượng tin nhắn LangChain."""
+    if msg_type == 'human':
+        return HumanMessage(content=content)
+    return AIMessage(content=content)
+
+
+def message_type_of(msg: BaseMessage) -> str:
+    """Giá trị cột messenger_type tương ứng với một tin nhắn LangChain."""
+    return 'human' if isinstance(msg, HumanMessage) else 'ai'
+
+
+# Đọc phần đuôi lịch sử (lần đầu gặp phiên): lấy N dòng cuối theo messenger_order,
+# kèm tổng số dòng của phiên (message_count của cache) trong cùng một lượt đọc
+TAIL_HISTORY_SQL = """
+    SELECT messenger_order, messenger_type, content, count(*) OVER () AS message_count
+    FROM chat_messenger
+    WHERE session_id = %s
+    ORDER BY messenger_order DESC
+    LIMIT %s;
+"""
+
+# Đọc tiếp các dòng mới hơn con trỏ của cache. LEFT JOIN với chat_session để
+# trong cùng một lượt đọc biết được phiên còn tồn tại hay không; cột cuối là số
+# dòng còn lại có messenger_order <= con trỏ (ít hơn cache = đã bị xóa ở nơi khác).
+# Tham số: (last_order, last_order, session_id).
+NEW_HISTORY_SQL = """
+    SELECT m.messenger_order, m.messenger_type, m.content,
+           (SELECT count(*) FROM chat_messenger o
+            WHERE o.session_id = s.id AND o.messenger_order <= %s) AS stored_count
+    FROM chat_session s
+    LEFT JOIN chat_messenger m ON m.session_id = s.id AND m.messenger_order > %s
+    WHERE s.id = %s
+    ORDER BY m.messenger_order ASC;
+"""
+
+# Thêm một loạt tin nhắn trong một câu lệnh duy nhất. Số thứ tự được cấp phía
+# server từ bộ đếm chat_session.last_messenger_order: UPDATE khóa dòng của phiên
+# nên các lượt ghi đồng thời vào cùng một phiên được xếp hàng và không bao giờ
+# trùng messenger_order. Cùng câu lệnh cũng cập nhật updated_at của phiên.
+# Tham số: (số tin nhắn, session_id, số tin nhắn, [messenger_type], [content]).
+APPEND_MESSAGES_SQL = """
+    WITH counter AS (
+        UPDATE chat_session
+        SET last_messenger_order = last_messenger_order + %s,
+            updated_at = NOW()
+        WHERE id = %s
+        RETURNING id, last_messenger_order - %s AS base_order
+    )
+    INSERT INTO chat_messenger (session_id, messenger_type, content, messenger_order)
+    SELECT c.id, m.messenger_type, m.content, c.base_order + m.ord
+    FROM counter c,
+         unnest(%s::text[], %s::text[]) WITH ORDINALITY AS m(messenger_type, content, ord)
+    RETURNING messenger_order;
+"""
+
+
+def append_messages_params(session_id: int, new_messages: List[BaseMessage]) -> tuple:
+    """Tham số cho APPEND_MESSAGES_SQL."""
+    count = len(new_messages)
+    return (
+        count, session_id, count,
+        [message_type_of(msg) for msg in new_messages],
+        [msg.content for msg in new_messages]
+    )
+
+
+def append_messages_with_cursor(cur, session_id: int, new_messages: List[BaseMessage]) -> List[int]:
+    """Chạy APPEND_MESSAGES_SQL, trả về các messenger_order đã cấp ([] nếu phiên không tồn tại)."""
+    cur.execute(APPEND_MESSAGES_SQL, append_messages_params(session_id, new_messages))
+    return [row[0] for row in cur.fetchall()]
+
+
+# Hàng đợi ghi trễ dùng chung cho session_manager và async_session_manager
+# (None nếu CHAT_WRITE_BEHIND_ENABLED tắt).
+write_behind_queue = WriteBehindQueue(
+    writer=append_messages_with_cursor,
+    on_flushed=history_cache.append_messages,
+    flush_interval=settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.CHAT_WRITE_BEHIND_MAX_BATCH,
+    max_attempts=settings.CHAT_WRITE_BEHIND_MAX_ATTEMPTS
+) if settings.CHAT_WRITE_BEHIND_ENABLED else None
+
+
+def pending_batches(session_id: int) -> list:
+    """Các lô tin nhắn đang chờ ghi của phiên; phải lấy TRƯỚC khi đọc database."""
+    return write_behind_queue.pending_batches(session_id) if write_behind_queue else []
+
+
+def merge_pending(messages: List[BaseMessage], last_order: int, batches: list) -> List[BaseMessage]:
+    """Ghép thêm các tin nhắn đang chờ ghi mà lượt đọc database (tới `last_order`) chưa thấy."""
+    if batches:
+        messages = messages + write_behind_queue.unseen(batches, last_order)
+    return messages
+
+
+def cached_history(entry: CachedSession, batches: list) -> List[BaseMessage]:
+    """Lịch sử trong cache của phiên, đã ghép các tin nhắn đang chờ ghi."""
+    messages, last_order = history_cache.snapshot(entry)
+    return merge_pending(messages, last_order, batches)
+
+
+def _load_cached_session(cur, session_id: int) -> Optional[CachedSession]:
+    """
+    Lấy trạng thái phiên từ cache và đọc thêm các tin nhắn mới (nếu có);
+    nếu chưa có trong cache (hoặc tin nhắn trong cache đã bị xóa ở tiến trình
+    khác) thì tải thông tin phiên và phần đuôi lịch sử.
+    Trả về None nếu phiên không tồn tại.
+    """
+    entry = history_cache.get(session_id)
+    if entry is not None:
+        last_order, message_count = history_cache.position(entry)
+        cur.execute(NEW_HISTORY_SQL, (last_order, last_order, session_id))
+        rows = cur.fetchall()
+        if not rows:
+            history_cache.invalidate(session_id)
+            return None
+        if rows[0][3] >= message_count:
+            history_cache.extend(session_id, [row[:3] for row in rows if row[0] is not None], row_to_message)
+            return entry
+        # Tin nhắn trong cache đã bị xóa (rewind_last_turn ở tiến trình khác): tải lại
+        history_cache.invalidate(session_id)
+
+    cur.execute(
+        "SELECT user_id, session_type, context FROM chat_session WHERE id = %s;",
+        (session_id,)
+    )
+    session_info = cur.fetchone()
+    if not session_info:
+        return None
+    user_id, session_type, context = session_info
+    cur.execute(TAIL_HISTORY_SQL, (session_id, history_cache.max_messages))
+    rows = list(reversed(cur.fetchall()))
+    return history_cache.store(session_id, user_id, session_type, context, [row[:3] for row in rows],
+                               row_to_message, rows[-1][3] if rows else 0)
 
 
 def get_or_create_user(user_id: str) -> bool:
@@ -29,16 +172,67 @@ def get_or_create_user(user_id: str) -> bool:
         if conn: conn.close()
 
 
-def list_sessions_for_user(user_id: str) -> List[Dict[str, Any]]:
-    """Lấy danh sách các phiên làm việc của một người dùng,
-    sắp xếp theo thời gian cập nhật gần nhất."""
+# Phân trang keyset theo (updated_at, id): trang sau bắt đầu ngay sau dòng cuối
+# của trang trước, dùng index chat_session(user_id, updated_at DESC, id DESC)
+# nên chi phí mỗi trang không phụ thuộc vào tổng số phiên của người dùng.
+LIST_SESSIONS_SQL = """
+    SELECT id, session_name, updated_at
+    FROM chat_session
+    WHERE user_id = %s {keyset}
+    ORDER BY updated_at DESC, id DESC
+    {limit};
+"""
+
+
+def encode_session_cursor(session: Dict[str, Any]) -> str:
+    """Con trỏ trang (chuỗi an toàn cho URL) trỏ tới một phiên trong danh sách."""
+    raw = f"{session['updated_at'].isoformat()}|{session['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_session_cursor(cursor: str) -> Optional[tuple]:
+    """Giải mã con trỏ trang thành (updated_at, id). Trả về None nếu con trỏ không hợp lệ."""
+    try:
+        updated_at, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(session_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def list_sessions_query(user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> tuple:
+    """Câu lệnh và tham số liệt kê phiên; ném ValueError nếu con trỏ không hợp lệ."""
+    params = [user_id]
+    keyset = ""
+    if cursor:
+        position = decode_session_cursor(cursor)
+        if position is None:
+            raise ValueError(f"Con trỏ trang không hợp lệ: {cursor}")
+        keyset = "AND (updated_at, id) < (%s, %s)"
+        params.extend(position)
+    limit_sql = ""
+    if limit:
+        limit_sql = "LIMIT %s"
+        params.append(limit)
+    return LIST_SESSIONS_SQL.format(keyset=keyset, limit=limit_sql), tuple(params)
+
+
+def list_sessions_for_user(
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Lấy danh sách các phiên làm việc của một người dùng, sắp xếp theo thời gian
+    cập nhật gần nhất. Truyền `limit` để lấy từng trang và `cursor`
+    (= encode_session_cursor(phiên cuối của trang trước)) để lấy trang tiếp theo.
+    """
+    query, params = list_sessions_query(user_id, limit, cursor)
     conn = get_db_connection()
     if not conn: return []
     sessions = []
     try:
         with conn.cursor() as cur:
-            query = "SELECT id, session_name, updated_at FROM chat_session WHERE user_id = %s ORDER BY updated_at DESC;"
-            cur.execute(query, (user_id,))
+            cur.execute(query, params)
             rows = cur.fetchall()
             for row in rows:
                 sessions.append({"id": row[0], "session_name": row[1], "updated_at": row[2]})
@@ -83,9 +277,16 @@ def create_new_session(
     return session_id
 
 
-def load_session_data(session_id: int) -> Optional[Dict[str, Any]]:
+def load_session_data(
+        session_id: int,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
     """
-    Tải toàn bộ dữ liệu của một phiên, bao gồm cả lịch sử chat, loại và context.
+    Tải dữ liệu của một phiên: loại, context và phần đuôi lịch sử chat.
+    Lịch sử được giới hạn theo số lượt / ngân sách token (mặc định lấy từ settings)
+    và được phục vụ từ cache trong tiến trình, nên chi phí mỗi lượt không tăng
+    theo độ dài cuộc hội thoại.
     """
     conn = get_db_connection()
     if not conn: return None
@@ -93,38 +294,19 @@ def load_session_data(session_id: int) -> Optional[Dict[str, Any]]:
     session_data = None
     try:
         with conn.cursor() as cur:
-            # Lấy thông tin session và context
-            cur.execute(
-                "SELECT user_id, session_type, context FROM chat_session WHERE id = %s;",
-                (session_id,)
-            )
-            session_info = cur.fetchone()
-            if not session_info:
+            batches = pending_batches(session_id)
+            entry = _load_cached_session(cur, session_id)
+            if not entry:
                 print(f"[Lỗi] Không tìm thấy session với ID {session_id}")
                 return None
 
-            user_id, session_type, context = session_info
-
-            # Lấy lịch sử chat
-            history = []
-            cur.execute(
-                "SELECT messenger_type, content FROM chat_messenger WHERE session_id = %s ORDER BY messenger_order ASC;",
-                (session_id,)
-            )
-            for row in cur.fetchall():
-                msg_type, content = row
-                if msg_type == 'human':
-                    history.append(HumanMessage(content=content))
-                else:
-                    history.append(AIMessage(content=content))
-
             session_data = {
-                "user_id": user_id,
-                "type": session_type,
-                "context": context or {},
-                "history": history
+                "user_id": entry.user_id,
+                "type": entry.session_type,
+                "context": entry.context,
+                "history": history_window(cached_history(entry, batches), max_turns, max_tokens)
             }
-            print(f"[Thông báo] Đã tải thành công dữ liệu cho phiên {session_id} (Loại: {session_type})")
+            print(f"[Thông báo] Đã tải thành công dữ liệu cho phiên {session_id} (Loại: {entry.session_type})")
 
     except psycopg2.Error as e:
         print(f"Lỗi] Không thể tải dữ liệu phiên: {e}")
@@ -134,6 +316,31 @@ def load_session_data(session_id: int) -> Optional[Dict[str, Any]]:
     return session_data
 
 
+def load_recent_history(
+        session_id: int,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None
+) -> List[BaseMessage]:
+    """
+    Tải phần đuôi lịch sử chat của một phiên (tối đa `max_turns` lượt và
+    `max_tokens` token ước lượng, mặc định lấy từ settings).
+    """
+    conn = get_db_connection()
+    if not conn: return []
+    history = []
+    try:
+        with conn.cursor() as cur:
+            batches = pending_batches(session_id)
+            entry = _load_cached_session(cur, session_id)
+            if entry:
+                history = history_window(cached_history(entry, batches), max_turns, max_tokens)
+    except psycopg2.Error as e:
+        print(f"Lỗi khi tải lịch sử chat: {e}")
+    finally:
+        if conn: conn.close()
+    return history
+
+
 def load_chat_history(session_id: int) -> List[BaseMessage]:
     """Tải lịch sử chat của một phiên từ database bằng ID số của phiên."""
     conn = get_db_connection()
@@ -141,16 +348,15 @@ def load_chat_history(session_id: int) -> List[BaseMessage]:
     history = []
     try:
         with conn.cursor() as cur:
+            batches = pending_batches(session_id)
             cur.execute(
-                "SELECT messenger_type, content FROM chat_messenger WHERE session_id = %s ORDER BY messenger_order ASC;",
+                "SELECT messenger_order, messenger_type, content FROM chat_messenger WHERE session_id = %s ORDER BY messenger_order ASC;",
                 (session_id,)
             )
-            for row in cur.fetchall():
-                msg_type, content = row
-                if msg_type == 'human':
-                    history.append(HumanMessage(content=content))
-                else:
-                    history.append(AIMessage(content=content))
+            rows = cur.fetchall()
+            for _, msg_type, content in rows:
+                history.append(row_to_message(msg_type, content))
+            history = merge_pending(history, rows[-1][0] if rows else 0, batches)
     except psycopg2.Error as e:
         print(f"Lỗi khi tải lịch sử chat: {e}")
     finally:
@@ -159,25 +365,24 @@ def load_chat_history(session_id: int) -> List[BaseMessage]:
 
 
 def add_new_messages(session_id: int, new_messages: List[BaseMessage]):
-    """Thêm các tin nhắn mới vào một phiên đã có."""
+    """
+    Thêm các tin nhắn mới vào một phiên đã có (một câu lệnh, an toàn khi ghi đồng thời).
+    Khi bật write-behind, tin nhắn chỉ được đưa vào hàng đợi và ghi sau theo lô.
+    """
+    if not new_messages: return
+    if write_behind_queue:
+        write_behind_queue.enqueue(session_id, new_messages)
+        return
     conn = get_db_connection()
     if not conn: return
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT COALESCE(MAX(messenger_order), 0) FROM chat_messenger WHERE session_id = %s;",
-                        (session_id,))
-            last_order = cur.fetchone()[0]
-
-            for i, msg in enumerate(new_messages):
-                message_type = 'human' if isinstance(msg, HumanMessage) else 'ai'
-                cur.execute(
-                    "INSERT INTO chat_messenger (session_id, messenger_type, content, messenger_order) VALUES (%s, %s, %s, %s);",
-                    (session_id, message_type, msg.content, last_order + i + 1)
-                )
-
-            # Cập nhật lại thời gian 'updated_at' của session cha
-            cur.execute("UPDATE chat_session SET updated_at = NOW() WHERE id = %s;", (session_id,))
+            orders = append_messages_with_cursor(cur, session_id, new_messages)
             conn.commit()
+        if not orders:
+            print(f"[Lỗi] Không tìm thấy session với ID {session_id}")
+            return
+        history_cache.append_messages(session_id, min(orders), new_messages)
     except psycopg2.Error as e:
         print(f"Lỗi khi thêm tin nhắn mới: {e}")
         conn.rollback()
@@ -219,6 +424,8 @@ def delete_session(session_id: int) -> bool:
     Xóa một phiên trò chuyện và tất cả các tin nhắn liên quan khỏi database.
     Trả về True nếu xóa thành công, False nếu không tìm thấy phiên.
     """
+    if write_behind_queue:
+        write_behind_queue.discard(session_id)
     conn = get_db_connection()
     if not conn: return False
 
@@ -228,6 +435,8 @@ def delete_session(session_id: int) -> bool:
             cur.execute("DELETE FROM chat_session WHERE id = %s;", (session_id,))
             deleted_rows = cur.rowcount
             conn.commit()
+            history_cache.invalidate(session_id)
+            task_context_cache.invalidate_session(session_id)
             if deleted_rows > 0:
                 print(f"[Thông báo] Đã xóa thành công phiên có ID: {session_id}")
     except psycopg2.Error as e:
@@ -272,6 +481,9 @@ def rewind_last_turn(session_id: int) -> bool:
     Hàm này thực hiện hành động "tua lại" một lượt nói.
     Trả về True nếu xóa thành công, False nếu có lỗi hoặc không có đủ tin nhắn để xóa.
     """
+    if write_behind_queue:
+        # Lượt cuối có thể vẫn đang nằm trong hàng đợi ghi trễ
+        write_behind_queue.flush(session_id)
     conn = get_db_connection()
     if not conn:
         print("[Lỗi] Không thể kết nối DB để tua lại phiên.")
@@ -304,6 +516,7 @@ def rewind_last_turn(session_id: int) -> bool:
                             """, (session_id, session_id))
 
                 conn.commit()
+                history_cache.invalidate(session_id)
                 print(f"[Thông báo] Đã tua lại lượt nói cuối cùng cho phiên {session_id}")
                 success = True
             else:
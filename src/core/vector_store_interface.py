@@ -1,88 +1,87 @@
 # src/core/vector_store_interface.py
-import psycopg2
-from psycopg2.sql import SQL, Identifier, Literal
 from src.config import settings
-from src.core.embedding import encode_text
-
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            dbname=settings.DB_NAME,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD
-        )
-        return conn
-    except psycopg2.Error as e:
-        print(f"Database connection error: {e}")
-        return None
-
+from src.core.database import (
+    get_db_connection, search_chunk_rows, search_chunk_rows_many, lexical_chunk_rows, hybrid_search_chunk_rows,
+    chunk_row_to_item, CHUNK_RESULT_COLUMNS, CANONICAL_FILTER_COLUMNS
+)
+from src.core.embedding import encode_query, encode_queries
+from src.core.retrieval_cache import cached_retrieval, cached_retrieval_many
+from src.core.diversity import retrieval_candidates, retrieval_columns, select_rows
+from src.core.vocabulary_index import vocabulary_index, vocabulary_source
 
 def retrieve_relevant_documents_from_db(
     query_text: str,
     top_k: int = 3,
     table_name: str = "contentchunks", # Sử dụng tên bảng trực tiếp hoặc từ settings
-    filters: dict = None
+    filters: dict = None,
+    term: str = None
 ) -> list[dict]:
     """
     Truy xuất các tài liệu liên quan từ CSDL với logic xây dựng query đã được sửa lỗi.
+    Kết quả được cache theo thế hệ bộ tài liệu (retrieval_cache.py); level /
+    skill_type được so sánh ở dạng chuẩn (canonical_filter_value).
     """
-    query_embedding = encode_text(query_text)
-    embedding_str = str(list(query_embedding))
-
-    conn = get_db_connection()
-    if not conn:
-        return []
-
-    retrieved_items = []
-
-    where_clauses = []
-    where_params = []
-    if filters:
-        for key, value in filters.items():
-            where_clauses.append(SQL("{}=%s").format(Identifier(key)))
-            where_params.append(value)
+    namespace = f"documents:{term}" if term else "documents"
+    return cached_retrieval(namespace, table_name, query_text, filters, top_k,
+                            lambda: _retrieve_documents(query_text, top_k, table_name, filters, term),
+                            ignore_case=CANONICAL_FILTER_COLUMNS)
 
-    where_sql = SQL(" WHERE {}").format(SQL(" AND ").join(where_clauses)) if where_clauses else SQL("")
+def _retrieve_documents(query_text: str, top_k: int, table_name: str, filters: dict, term: str) -> list[dict]:
+    if term:
+        rows = lexical_chunk_rows(table_name, CHUNK_RESULT_COLUMNS, term, top_k, filters,
+                                  ignore_case=CANONICAL_FILTER_COLUMNS, exact=True)
+        if rows:
+            return [chunk_row_to_item(row) for row in rows]
 
-    sql_query = SQL("""
-        SELECT chunk_text, source_document_name, original_page_number, level, skill_type, metadata_json
-        FROM {table}
-        {where_clause}
-        ORDER BY embedding <=> %s
-        LIMIT %s;
-    """).format(
-        table=Identifier(table_name),
-        where_clause=where_sql
-    )
+    candidates, columns = retrieval_candidates(top_k), retrieval_columns(CHUNK_RESULT_COLUMNS)
+    if settings.RAG_HYBRID_SEARCH:
+        rows = hybrid_search_chunk_rows(table_name, columns, query_text, candidates, filters,
+                                        ignore_case=CANONICAL_FILTER_COLUMNS, lexical_text=term)
+    else:
+        rows = search_chunk_rows(table_name, columns, encode_query(query_text), candidates, filters,
+                                 ignore_case=CANONICAL_FILTER_COLUMNS)
+    return _finish_documents(query_text, rows, top_k)
 
-    final_params = where_params + [embedding_str, top_k]
+def _finish_documents(query_text: str, rows: list[dict], top_k: int) -> list[dict]:
+    return [chunk_row_to_item(row) for row in select_rows(query_text, rows, top_k)]
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql_query, final_params)
-            results = cur.fetchall()
-            for row in results:
-                 retrieved_items.append({
-                    "text": row[0],
-                    "metadata": {"document": row[1], "page": row[2], "level": row[3], "skill": row[4], "lesson": (row[5] or {}).get('lesson')}
-                })
-    except Exception as e:
-        print(f"Lỗi truy xuất chunk từ bảng {table_name}: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-    return retrieved_items
+def retrieve_many(
+    queries: list[str],
+    filters: dict = None,
+    top_k: int = 3,
+    table_name: str = settings.RAG_CONTENT_CHUNK_TABLE
+) -> list[list[dict]]:
+    """
+    Truy xuất cho nhiều câu truy vấn cùng lúc (cùng bộ lọc), cho cùng kết quả
+    và dùng chung cache với retrieve_relevant_documents_from_db: các câu chưa có
+    trong cache được encode trong một batch và lấy ứng viên trong một lượt truy
+    vấn CSDL, rồi từng câu qua select_rows. Kết quả theo đúng thứ tự của `queries`.
+    Khi bật RAG_HYBRID_SEARCH thì tra từng câu.
+    """
+    if not queries:
+        return []
+    if settings.RAG_HYBRID_SEARCH:
+        return [retrieve_relevant_documents_from_db(query, top_k, table_name, filters) for query in queries]
+    columns = retrieval_columns(CHUNK_RESULT_COLUMNS)
+    return cached_retrieval_many(
+        "documents", table_name, queries, filters, top_k,
+        lambda pending: search_chunk_rows_many(table_name, columns, encode_queries(pending),
+                                               retrieval_candidates(top_k), filters,
+                                               ignore_case=CANONICAL_FILTER_COLUMNS),
+        lambda query, rows: _finish_documents(query, rows, top_k),
+        ignore_case=CANONICAL_FILTER_COLUMNS)
 
 def find_precise_definitional_source_from_db(
     japanese_term: str,
     table_name: str = settings.RAG_CONTENT_CHUNK_TABLE
 ) -> dict | None:
     if not japanese_term: return None
+    entries = vocabulary_index.lookup(japanese_term)
+    if entries:
+        return vocabulary_source(entries[0])
     targeted_query = f"Định nghĩa và vị trí của từ tiếng Nhật: {japanese_term}"
-    definitional_chunks = retrieve_relevant_documents_from_db(targeted_query, top_k=1, table_name=table_name)
+    definitional_chunks = retrieve_relevant_documents_from_db(targeted_query, top_k=1, table_name=table_name,
+                                                              term=japanese_term)
     if definitional_chunks:
         return definitional_chunks[0].get("metadata")
     return None
\ No newline at end of file
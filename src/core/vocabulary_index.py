@@ -0,0 +1,166 @@
+# src/core/vocabulary_index.py
+import re
+import threading
+import time
+import unicodedata
+from typing import List, Dict, Any, Optional
+
+from src.core.database import execute_sql_query
+from src.core.retrieval_cache import retrieval_cache
+
+# Tra cứu chính xác từ vựng của giáo trình: bảng vocabulary_entries (migration
+# 0011, nạp bởi data_processing/vocabulary_loader.py từ VocabularyParser) được
+# giữ trong bộ nhớ dưới dạng dictionary khóa theo từ (surface form) và cách đọc
+# đã chuẩn hóa, nên tra một từ không cần model embedding hay round trip tới
+# database. Bảng được nạp lại khi thế hệ của nó trong corpus_generation thay
+# đổi (đọc qua retrieval_cache, tối đa mỗi RETRIEVAL_CACHE_GENERATION_CHECK_SECONDS
+# giây). Không đọc được thế hệ (chưa chạy migration 0009) thì tra bằng SQL qua
+# index idx_vocabulary_entries_term / _reading. Lần nạp lại bị lỗi thì giữ bản
+# đã nạp; chỉ một luồng nạp lại tại một thời điểm, các lượt tra khác dùng bản cũ.
+
+VOCABULARY_TABLE = "vocabulary_entries"
+VOCABULARY_COLUMNS = ("id", "term", "reading", "meaning", "lesson", "course_id", "level",
+                      "source_document_name", "original_page_number", "honorific_prefix")
+
+# Sau một lần nạp lại bị lỗi, chờ chừng này giây mới thử lại
+RELOAD_RETRY_SECONDS = 5.0
+
+_WHITESPACE = re.compile(r"\s+")
+# Động từ trong giáo trình có dạng "磨きます[磨く]1": thêm khóa cho dạng masu và dạng từ điển
+_VERB_FORMS = re.compile(r"^([^\[]+)\[([^\]]+)\]")
+
+
+def vocabulary_key(text: Optional[str]) -> Optional[str]:
+    """Dạng chuẩn của từ / cách đọc: NFKC (full-width -> half-width...), bỏ khoảng trắng; rỗng thành None."""
+    if text is None:
+        return None
+    return _WHITESPACE.sub("", unicodedata.normalize("NFKC", str(text))) or None
+
+
+def entry_keys(term: Optional[str], reading: Optional[str], honorific_prefix: Optional[str] = None) -> List[str]:
+    """
+    Các khóa tra cứu của một mục: từ, cách đọc, (với động từ) dạng masu / dạng từ
+    điển và, với mục giáo trình ghi kèm tiền tố （お）, từ / cách đọc có tiền tố (お名前).
+    """
+    keys = [term, reading]
+    match = _VERB_FORMS.match(term or "")
+    if match:
+        keys += [match.group(1), match.group(2)]
+    if honorific_prefix:
+        keys += [honorific_prefix + key for key in (term, reading) if key]
+    return [key for key in dict.fromkeys(keys) if key]
+
+
+class VocabularyIndex:
+    def __init__(self, table: str = VOCABULARY_TABLE):
+        self.table = table
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._retry_at = 0.0
+        self.rows = 0
+        self.loads = 0
+        self.lookups = 0
+        self.hits = 0
+        self.sql_lookups = 0
+        self.load_errors = 0
+
+    def _select(self) -> str:
+        # LEFT JOIN từ một dòng hằng: bảng rỗng trả về một dòng toàn NULL, còn lỗi
+        # database thì execute_sql_query trả về [] - để không thay index bằng bản rỗng khi lỗi
+        return (f'SELECT v.* FROM (SELECT 1) AS loaded LEFT JOIN '
+                f'(SELECT {", ".join(VOCABULARY_COLUMNS)} FROM "{self.table}") AS v ON true ORDER BY v.id;')
+
+    def _build(self, rows: List[Dict[str, Any]], generation: int):
+        """Thay index bằng các dòng của _select(); giữ bản cũ nếu lượt đọc bị lỗi (rows rỗng)."""
+        if not rows:
+            print(f"[Vocabulary index] Không đọc được bảng {self.table}, giữ bản đã nạp.")
+            self.load_errors += 1
+            self._retry_at = time.monotonic() + RELOAD_RETRY_SECONDS
+            return
+        rows = [row for row in rows if row["id"] is not None]
+        entries: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            for key in entry_keys(row["term"], row["reading"], row["honorific_prefix"]):
+                entries.setdefault(key, []).append(row)
+        with self._lock:
+            self._entries = entries
+            self._generation = generation
+            self.rows = len(rows)
+            self.loads += 1
+
+    def _find(self, term: str) -> List[Dict[str, Any]]:
+        self.lookups += 1
+        entries = self._entries.get(vocabulary_key(term))
+        if entries:
+            self.hits += 1
+            return [dict(entry) for entry in entries]
+        return []
+
+    def _lookup_sql(self, term: str) -> Optional[tuple]:
+        """Câu tra bằng SQL và tham số: từ / cách đọc trùng, hoặc trùng sau tiền tố kính ngữ đã ghi của mục."""
+        key = vocabulary_key(term)
+        if not key:
+            return None
+        query = (f'SELECT {", ".join(VOCABULARY_COLUMNS)} FROM "{self.table}" '
+                 f'WHERE term = %s OR reading = %s '
+                 f'OR (honorific_prefix = left(%s, 1) AND (term = substr(%s, 2) OR reading = substr(%s, 2))) '
+                 f'ORDER BY id;')
+        return query, (key,) * 5
+
+    def _should_reload(self, generation: Optional[int]) -> bool:
+        """True nếu cần nạp lại và luồng này giữ được _reload_lock (không chờ luồng đang nạp)."""
+        if generation is None or generation == self._generation or time.monotonic() < self._retry_at:
+            return False
+        return self._reload_lock.acquire(blocking=False)
+
+    def lookup(self, term: str) -> List[Dict[str, Any]]:
+        """Các mục từ vựng có từ hoặc cách đọc trùng với `term` (theo thứ tự nạp)."""
+        generation = retrieval_cache.generation(self.table)
+        # Không chờ: nếu luồng khác đang nạp lại thì dùng bản hiện có
+        if self._should_reload(generation):
+            try:
+                if generation != self._generation:
+                    self._build(execute_sql_query(self._select()), generation)
+            finally:
+                self._reload_lock.release()
+        if self._generation is None:
+            # Chưa có bản nào trong bộ nhớ (chưa chạy migration 0009, lỗi khi nạp, hoặc đang nạp lần đầu)
+            self.sql_lookups += 1
+            sql = self._lookup_sql(term)
+            return execute_sql_query(*sql) if sql else []
+        return self._find(term)
+
+    async def alookup(self, term: str) -> List[Dict[str, Any]]:
+        """Bản bất đồng bộ của lookup(): chỉ chờ database khi phải đọc thế hệ / nạp lại bảng."""
+        from src.core import async_database
+
+        generation = await retrieval_cache.ageneration(self.table)
+        if self._should_reload(generation):
+            try:
+                if generation != self._generation:
+                    self._build(await async_database.execute_sql_query(self._select()), generation)
+            finally:
+                self._reload_lock.release()
+        if self._generation is None:
+            self.sql_lookups += 1
+            sql = self._lookup_sql(term)
+            return await async_database.execute_sql_query(*sql) if sql else []
+        return self._find(term)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"table": self.table, "generation": self._generation, "rows": self.rows, "keys": len(self._entries),
+                "loads": self.loads, "lookups": self.lookups, "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "sql_lookups": self.sql_lookups, "load_errors": self.load_errors}
+
+
+vocabulary_index = VocabularyIndex()
+
+
+def vocabulary_source(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata nguồn của một mục từ vựng, cùng dạng với metadata của chunk_row_to_item."""
+    return {"document": entry["source_document_name"], "page": entry["original_page_number"],
+            "level": entry["level"], "skill": "VOCABULARY", "lesson": entry["lesson"],
+            "course": entry["course_id"]}
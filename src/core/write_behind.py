@@ -0,0 +1,248 @@
+# src/core/write_behind.py
+import atexit
+import threading
+from typing import List, Dict, Optional, Callable
+
+import psycopg2
+from langchain_core.messages import BaseMessage
+
+from .database import get_db_connection
+
+# Hàng đợi ghi trễ (write-behind) cho tin nhắn chat. Khi bật, add_new_messages
+# chỉ đưa tin nhắn vào hàng đợi trong tiến trình rồi trả về ngay; một luồng nền
+# ghi dồn các lượt của nhiều phiên trong một giao dịch sau mỗi
+# `flush_interval` giây hoặc khi số tin nhắn chờ đạt `max_batch`.
+#
+# Để các lượt đọc vẫn thấy tin nhắn đang chờ, mỗi lô ghi nhận messenger_order
+# được cấp (trước khi commit). Người đọc lấy danh sách lô đang chờ, đọc lịch sử
+# từ database (con trỏ `last_order` = order lớn nhất đã thấy) rồi ghép thêm các
+# lô chưa được cấp order hoặc có order > last_order, nên không bị trùng hay
+# thiếu tin nhắn dù lượt ghi đang diễn ra song song.
+
+# writer(cur, session_id, messages) -> danh sách messenger_order đã cấp ([] nếu phiên không tồn tại)
+Writer = Callable[[object, int, List[BaseMessage]], List[int]]
+# on_flushed(session_id, first_order, messages) được gọi sau khi commit
+OnFlushed = Callable[[int, int, List[BaseMessage]], None]
+
+
+class _Batch:
+    __slots__ = ("messages", "first_order", "attempts")
+
+    def __init__(self, messages: List[BaseMessage]):
+        self.messages = messages
+        self.first_order: Optional[int] = None
+        # Số lần ghi lỗi riêng của phiên này (không tính lỗi kết nối / commit chung)
+        self.attempts = 0
+
+
+class WriteBehindQueue:
+    def __init__(self, writer: Writer, on_flushed: OnFlushed, flush_interval: float, max_batch: int,
+                 max_attempts: int = 5):
+        self.writer = writer
+        self.on_flushed = on_flushed
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        # Lô của một phiên ghi lỗi quá số lần này thì bị bỏ để không chặn hàng đợi mãi
+        self.max_attempts = max_attempts
+
+        self._pending: Dict[int, List[_Batch]] = {}
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._atexit_registered = False
+
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.failures = 0
+        self.session_failures = 0
+        self.dropped_messages = 0
+
+    def enqueue(self, session_id: int, messages: List[BaseMessage]):
+        """Đưa các tin nhắn của một lượt vào hàng đợi."""
+        with self._lock:
+            self._pending.setdefault(session_id, []).append(_Batch(list(messages)))
+            self._pending_count += len(messages)
+            full = self._pending_count >= self.max_batch
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wakeup.set()
+
+    def pending_batches(self, session_id: int) -> List[_Batch]:
+        """
+        Các lô đang chờ của một phiên. Người đọc phải lấy danh sách này TRƯỚC khi
+        đọc database rồi lọc bằng unseen() sau khi đọc xong.
+        """
+        with self._lock:
+            return list(self._pending.get(session_id, ()))
+
+    def unseen(self, batches: List[_Batch], last_order: int) -> List[BaseMessage]:
+        """Tin nhắn của các lô mà lượt đọc database có con trỏ `last_order` chưa thấy."""
+        with self._lock:
+            return [
+                msg
+                for batch in batches
+                if batch.first_order is None or batch.first_order > last_order
+                for msg in batch.messages
+            ]
+
+    def discard(self, session_id: int):
+        """Bỏ các tin nhắn đang chờ của một phiên (vd: khi phiên bị xóa)."""
+        with self._lock:
+            batches = self._pending.pop(session_id, [])
+            self._pending_count -= sum(len(b.messages) for b in batches)
+
+    def _write_session(self, cur, sid: int, batches: List[_Batch]) -> Optional[tuple]:
+        """
+        Ghi các lô của một phiên trong một savepoint. Trả về (first_order, messages),
+        None nếu phiên không còn tồn tại; lỗi của phiên này chỉ rollback savepoint.
+        """
+        messages = [msg for batch in batches for msg in batch.messages]
+        cur.execute("SAVEPOINT write_behind_session;")
+        try:
+            orders = self.writer(cur, sid, messages)
+        except Exception:
+            cur.execute("ROLLBACK TO SAVEPOINT write_behind_session;")
+            raise
+        cur.execute("RELEASE SAVEPOINT write_behind_session;")
+        if not orders:
+            print(f"[Write-behind] Bỏ {len(messages)} tin nhắn của phiên {sid} không còn tồn tại.")
+            return None
+        first_order = min(orders)
+        with self._lock:
+            offset = 0
+            for batch in batches:
+                batch.first_order = first_order + offset
+                offset += len(batch.messages)
+        return first_order, messages
+
+    def flush(self, session_id: Optional[int] = None) -> int:
+        """
+        Ghi các tin nhắn đang chờ (của một phiên hoặc tất cả) trong một giao dịch,
+        mỗi phiên trong một savepoint. Trả về số tin nhắn đã ghi. Lô của phiên ghi
+        lỗi được giữ lại để thử lại lần sau (tối đa `max_attempts` lần) mà không
+        ảnh hưởng các phiên khác; lỗi kết nối / commit giữ lại tất cả.
+        """
+        with self._flush_lock:
+            with self._lock:
+                targets = {
+                    sid: list(batches) for sid, batches in self._pending.items()
+                    if session_id is None or sid == session_id
+                }
+            if not targets:
+                return 0
+
+            conn = get_db_connection()
+            if not conn:
+                with self._lock:
+                    self.failures += 1
+                return 0
+            written, failed = {}, set()
+            try:
+                with conn.cursor() as cur:
+                    for sid, batches in targets.items():
+                        try:
+                            result = self._write_session(cur, sid, batches)
+                        except psycopg2.OperationalError:
+                            # Mất kết nối: không phải lỗi riêng của phiên này
+                            raise
+                        except Exception as e:
+                            failed.add(sid)
+                            self._record_session_failure(sid, batches, e)
+                            continue
+                        if result is not None:
+                            written[sid] = result
+                conn.commit()
+            except Exception as e:
+                print(f"[Write-behind] Lỗi khi ghi hàng đợi, sẽ thử lại: {e}")
+                conn.rollback()
+                with self._lock:
+                    for batches in targets.values():
+                        for batch in batches:
+                            batch.first_order = None
+                    self.failures += 1
+                return 0
+            finally:
+                conn.close()
+
+            with self._lock:
+                for sid, batches in targets.items():
+                    if sid in failed and batches[0].attempts < self.max_attempts:
+                        continue
+                    done = {id(batch) for batch in batches}
+                    current = self._pending.get(sid, [])
+                    remaining = [batch for batch in current if id(batch) not in done]
+                    self._pending_count -= sum(len(batch.messages) for batch in current if id(batch) in done)
+                    if remaining:
+                        self._pending[sid] = remaining
+                    else:
+                        self._pending.pop(sid, None)
+                count = sum(len(messages) for _, messages in written.values())
+                self.flushes += 1
+                self.flushed_messages += count
+            for sid, (first_order, messages) in written.items():
+                try:
+                    self.on_flushed(sid, first_order, messages)
+                except Exception as e:
+                    print(f"[Write-behind] Lỗi khi cập nhật cache của phiên {sid}: {e}")
+            return count
+
+    def _record_session_failure(self, sid: int, batches: List[_Batch], error: Exception):
+        with self._lock:
+            self.session_failures += 1
+            for batch in batches:
+                batch.first_order = None
+                batch.attempts += 1
+            if batches[0].attempts >= self.max_attempts:
+                dropped = sum(len(batch.messages) for batch in batches)
+                self.dropped_messages += dropped
+                print(f"[Write-behind] Bỏ {dropped} tin nhắn của phiên {sid} sau "
+                      f"{batches[0].attempts} lần ghi lỗi: {error}")
+            else:
+                print(f"[Write-behind] Lỗi khi ghi phiên {sid}, sẽ thử lại: {error}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pending_sessions": len(self._pending),
+                "pending_messages": self._pending_count,
+                "flushes": self.flushes,
+                "flushed_messages": self.flushed_messages,
+                "failures": self.failures,
+                "session_failures": self.session_failures,
+                "dropped_messages": self.dropped_messages,
+            }
+
+    def close(self):
+        """Dừng luồng nền và ghi nốt các tin nhắn còn lại (gọi khi tắt ứng dụng)."""
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def _start(self):
+        # Gọi khi đang giữ self._lock
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                # Không để luồng nền chết: tin nhắn còn trong hàng đợi sẽ được ghi ở lượt sau
+                print(f"[Write-behind] Lỗi không mong đợi khi ghi hàng đợi: {e}")
@@ -0,0 +1,189 @@
+# src/data_processing/disk_embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import time
+from typing import List, Dict, Optional, Callable
+
+import numpy as np
+
+from src.config import settings
+from src.core.embedding import get_embedding_model, embedding_model_id
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Cache embedding trên đĩa cho các script nạp dữ liệu, khóa theo
+# (tên model, sha256(chunk_text)). Chạy lại việc nạp một bộ tài liệu hoặc thêm
+# một PDF mới chỉ phải encode các chunk mới / đã thay đổi.
+#
+# Mỗi model có một thư mục riêng gồm:
+# - vectors.f32: ma trận float32 (số dòng x số chiều), đọc bằng np.memmap
+# - keys.txt:    sha256 của chunk ở dòng tương ứng trong vectors.f32
+# - meta.json:   tên model, số chiều và tổng thời gian encode (để ước tính thời gian tiết kiệm)
+# Vector được ghi (append) trước rồi mới tới khóa, nên nếu tiến trình dừng giữa
+# chừng thì lần mở sau chỉ cần cắt bỏ các dòng vector thừa. Chỉ một tiến trình
+# được ghi vào cache tại một thời điểm.
+
+# encode_batch(texts) -> ma trận (len(texts), số chiều)
+EncodeBatch = Callable[[List[str]], np.ndarray]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name).strip("_") or "model"
+
+
+class DiskEmbeddingCache:
+    def __init__(self, directory: str, model_name: str):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, _model_slug(model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.txt")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+
+        self.dim: Optional[int] = None
+        self._meta: Dict[str, object] = {}
+        self._index: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            # meta.json được ghi sau lô đầu tiên: nếu thiếu thì vector / khóa (nếu có)
+            # là của một lần chạy dừng giữa chừng, bỏ đi để lần append sau không lệch dòng
+            for path in (self.vectors_path, self.keys_path):
+                if os.path.exists(path):
+                    open(path, "wb").close()
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self._meta = json.load(f)
+        self.dim = self._meta["dim"]
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r", encoding="ascii") as f:
+                keys = [line.strip() for line in f if line.strip()]
+        row_bytes = self.dim * 4
+        rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        if rows != len(keys):
+            # Dừng giữa chừng ở lần chạy trước: giữ phần vector và khóa khớp nhau
+            rows = min(rows, len(keys))
+            keys = keys[:rows]
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                f.truncate(rows * row_bytes)
+            with open(self.keys_path, "w", encoding="ascii") as f:
+                f.writelines(key + "\n" for key in keys)
+        self._index = {key: row for row, key in enumerate(keys)}
+
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) != len(self._index):
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                     shape=(len(self._index), self.dim))
+        return self._matrix
+
+    def _write_meta(self, encoded: int, seconds: float):
+        self._meta = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "encoded": int(self._meta.get("encoded", 0)) + encoded,
+            "encode_seconds": float(self._meta.get("encode_seconds", 0.0)) + seconds,
+        }
+        # Ghi ra file tạm rồi đổi tên để meta.json không bao giờ bị ghi dở
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def _append(self, keys: List[str], vectors: np.ndarray, seconds: float):
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            os.makedirs(self.directory, exist_ok=True)
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.keys_path, "a", encoding="ascii") as f:
+            f.writelines(key + "\n" for key in keys)
+        self._write_meta(len(keys), seconds)
+        start = len(self._index)
+        for offset, key in enumerate(keys):
+            self._index[key] = start + offset
+        self._matrix = None
+
+    def encode_many(self, texts: List[str], encode_batch: EncodeBatch, batch_size: int = 64) -> np.ndarray:
+        """
+        Embedding của danh sách văn bản (ma trận float32 theo đúng thứ tự);
+        chỉ các văn bản chưa có trong cache mới được encode, theo lô `batch_size`.
+        """
+        hashes = [content_hash(text) for text in texts]
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in self._index and key not in missing:
+                missing[key] = text
+        new = sum(1 for key in hashes if key in missing)
+        self.hits += len(hashes) - new
+        self.misses += new
+
+        keys = list(missing)
+        for i in range(0, len(keys), batch_size):
+            batch_keys = keys[i:i + batch_size]
+            start = time.perf_counter()
+            vectors = np.asarray(encode_batch([missing[key] for key in batch_keys]), dtype=np.float32)
+            seconds = time.perf_counter() - start
+            self.encode_seconds += seconds
+            self._append(batch_keys, vectors, seconds)
+
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        matrix = self._vectors()
+        return np.asarray(matrix[[self._index[key] for key in hashes]])
+
+    def report(self, label: str = "Embedding cache"):
+        """In tỉ lệ hit và thời gian encode ước tính đã tiết kiệm được."""
+        total = self.hits + self.misses
+        if not total:
+            return
+        line = f"[{label}] {self.hits}/{total} chunk dùng lại từ cache ({self.hits / total:.0%}), " \
+               f"encode mới {self.misses} chunk trong {self.encode_seconds:.1f}s"
+        # Ước tính theo thời gian encode trung bình mỗi chunk của mọi lần chạy
+        encoded = int(self._meta.get("encoded", 0))
+        if encoded:
+            saved = self.hits * float(self._meta["encode_seconds"]) / encoded
+            line += f", tiết kiệm ~{saved:.1f}s"
+        print(line + ".")
+
+
+def _encode_with_model(texts: List[str]) -> np.ndarray:
+    return get_embedding_model().encode(texts, batch_size=64)
+
+
+def encode_chunks(texts: List[str], cache: Optional[DiskEmbeddingCache] = None) -> np.ndarray:
+    """Embedding của các chunk, qua cache trên đĩa nếu có, ngược lại encode trực tiếp theo lô."""
+    if cache is not None:
+        return cache.encode_many(texts, _encode_with_model)
+    if not texts:
+        return np.empty((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+    return np.asarray(_encode_with_model(texts), dtype=np.float32)
+
+
+def open_disk_embedding_cache(model_name: str = None) -> Optional[DiskEmbeddingCache]:
+    """
+    Cache theo EMBEDDING_DISK_CACHE_DIR (đường dẫn tương đối tính từ thư mục gốc
+    của dự án); None nếu bị tắt (thư mục rỗng).
+    """
+    if not settings.EMBEDDING_DISK_CACHE_DIR:
+        return None
+    directory = os.path.join(PROJECT_ROOT, settings.EMBEDDING_DISK_CACHE_DIR)
+    return DiskEmbeddingCache(directory, model_name or embedding_model_id())
@@ -10,11 +10,9 @@ from psycopg2.extras import execute_values
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
-from src.core.embedding import get_embedding_model
-from src.core.database import get_db_connection
-
-# --- KHỞI TẠO CÁC THÀNH PHẦN CỐT LÕI ---
-embedding_model = get_embedding_model()
+from src.core.database import get_db_connection, canonical_filter_value
+from src.core.embedding import to_pgvector
+from src.data_processing.disk_embedding_cache import encode_chunks, open_disk_embedding_cache
 
 
 def process_and_insert_data():
@@ -45,7 +43,7 @@ def process_and_insert_data():
                 course_id = course_info['course_id']
                 start_page = course_info['start_page']
                 end_page = course_info.get('end_page', 'all')
-                skill_type = course_info.get('skill_type', 'GENERAL')
+                skill_type = canonical_filter_value(course_info.get('skill_type', 'GENERAL'))
 
                 print(f"Đang xử lý cho Course ID: {course_id} | Trang: {start_page}-{end_page}")
 
@@ -57,18 +55,24 @@ def process_and_insert_data():
                     page_text = page.extract_text() or ""
 
                     if page_text.strip():
-                        chunk_text = page_text
-                        embedding = embedding_model.encode(chunk_text).tolist()
-
                         all_chunks_to_insert.append((
-                            chunk_text,
-                            embedding,
+                            page_text,
+                            None,  # embedding, được điền sau theo lô
                             course_id,
                             os.path.basename(pdf_path),
                             i + 1,
                             skill_type
                         ))
 
+    # Tạo embedding theo lô; các trang đã encode ở lần chạy trước lấy từ cache trên đĩa
+    disk_cache = open_disk_embedding_cache()
+    vectors = encode_chunks([chunk[0] for chunk in all_chunks_to_insert], disk_cache)
+    all_chunks_to_insert = [
+        (chunk[0], to_pgvector(vector)) + chunk[2:] for chunk, vector in zip(all_chunks_to_insert, vectors)
+    ]
+    if disk_cache:
+        disk_cache.report()
+
     # Chèn toàn bộ dữ liệu vào database
     conn = get_db_connection()
     if not conn:
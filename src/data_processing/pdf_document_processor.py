@@ -5,16 +5,16 @@ import pdfplumber
 import psycopg2
 import json
 from psycopg2.extras import execute_values
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from src.config import settings
-from src.core.embedding import get_embedding_model
-from src.core.vector_store_interface import get_db_connection
+from src.core.database import get_db_connection, canonical_filter_value
+from src.core.embedding import to_pgvector
+from src.data_processing.disk_embedding_cache import DiskEmbeddingCache, encode_chunks, open_disk_embedding_cache
 
 # --- Khởi tạo các đối tượng dùng chung ---
-embedding_model = get_embedding_model()
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=500,  # Giảm chunk size để mỗi chunk tập trung hơn vào một chủ đề
     chunk_overlap=100,
@@ -26,10 +26,13 @@ text_splitter = RecursiveCharacterTextSplitter(
 def process_pdf_to_chunks(
     pdf_path: str,
     level: str, # 'N5', 'N4', 'N3'
-    skill_type: str = 'Vocabulary' # Mặc định là từ vựng cho các file hiện tại
+    skill_type: str = 'Vocabulary', # Mặc định là từ vựng cho các file hiện tại
+    embedding_cache: Optional[DiskEmbeddingCache] = None
 ) -> List[Dict[str, Any]]:
     """
     Đọc PDF, chunking, tạo embedding và gán metadata quan trọng (level, skill_type).
+    Embedding được tạo theo lô sau khi chunking xong; chunk đã có trong
+    `embedding_cache` (cache trên đĩa) sẽ không phải encode lại.
     """
     if not os.path.exists(pdf_path):
         print(f"Lỗi: Không tìm thấy file tại {pdf_path}")
@@ -56,21 +59,23 @@ def process_pdf_to_chunks(
                     chunk_text = chunk_text.strip()
                     if len(chunk_text) < 30: continue
 
-                    embedding_vector = embedding_model.encode(chunk_text).tolist()
-
                     chunk_record = {
                         "chunk_text": chunk_text,
-                        "embedding": embedding_vector,
                         "source_document_name": doc_name,
                         "original_page_number": page_num,
-                        "level": level, # <<< THÊM LEVEL
-                        "skill_type": skill_type, # <<< THÊM SKILL TYPE
+                        "level": canonical_filter_value(level), # <<< THÊM LEVEL ('N5')
+                        "skill_type": canonical_filter_value(skill_type), # <<< THÊM SKILL TYPE ('VOCABULARY')
                         "metadata_json": json.dumps({ # <<< Chuyển sang JSON string
                             "lesson": current_lesson_identifier
                         }),
                     }
                     all_chunks_data.append(chunk_record)
 
+        vectors = encode_chunks([chunk["chunk_text"] for chunk in all_chunks_data], embedding_cache)
+        for chunk, vector in zip(all_chunks_data, vectors):
+            # Literal pgvector float32 ('[0.1,...]') thay vì list float64 (ARRAY[...]) gọn hơn khi gửi
+            chunk["embedding"] = to_pgvector(vector)
+
         print(f"Hoàn tất {doc_name}. Tạo ra {len(all_chunks_data)} chunks.")
         return all_chunks_data
 
@@ -131,6 +136,7 @@ if __name__ == "__main__":
     if not db_conn:
         print("Dừng xử lý do không thể kết nối DB.")
         exit()
+    disk_cache = open_disk_embedding_cache()
 
     try:
         for filename, level in file_to_level_map.items():
@@ -138,7 +144,8 @@ if __name__ == "__main__":
             if os.path.exists(full_pdf_path):
                 print(f"\n{'='*20} Bắt đầu xử lý: {filename} (Level: {level}) {'='*20}")
                 # Giả định tất cả đều là sách từ vựng
-                processed_chunks = process_pdf_to_chunks(full_pdf_path, level=level, skill_type="Vocabulary")
+                processed_chunks = process_pdf_to_chunks(full_pdf_path, level=level, skill_type="Vocabulary",
+                                                         embedding_cache=disk_cache)
                 batch_insert_chunks_to_db(processed_chunks, db_conn)
             else:
                 print(f"\nCảnh báo: Không tìm thấy file {filename} trong thư mục input_pdfs.")
@@ -147,5 +154,7 @@ if __name__ == "__main__":
         if db_conn:
             db_conn.close()
             print(f"\n{'='*20} Đã đóng kết nối Database. {'='*20}")
+        if disk_cache:
+            disk_cache.report()
 
     print("\nQuy trình xử lý dữ liệu đã kết thúc.")
\ No newline at end of file
@@ -0,0 +1,117 @@
+# src/data_processing/vocabulary_loader.py
+
+import json
+import os
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+# Thêm thư mục gốc vào system path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from src.core.database import get_db_connection, canonical_filter_value
+from src.core.vocabulary_index import VOCABULARY_TABLE, vocabulary_key
+from src.data_processing.vocabulary_parser import VocabularyParser
+
+# Nạp các mục từ vựng (từ, cách đọc, nghĩa, bài) mà VocabularyParser trích ra
+# từ các file PDF trong manifest.json vào bảng vocabulary_entries (migration
+# 0011). Mỗi trang được gán course_id theo khoảng trang của các course trong
+# manifest. Các mục của một file được thay toàn bộ trong một giao dịch nên chạy
+# lại script là an toàn:
+#     python -m src.data_processing.vocabulary_loader
+
+INSERT_COLUMNS = ("term", "reading", "meaning", "lesson", "chapter", "course_id", "level",
+                  "source_document_name", "original_page_number", "honorific_prefix")
+
+
+def course_for_page(courses: List[Dict[str, Any]], page: int) -> Optional[str]:
+    """course_id của course (trong manifest) có khoảng trang chứa `page`."""
+    for course in courses:
+        end_page = course.get('end_page', 'all')
+        if course['start_page'] <= page and (end_page == 'all' or page <= end_page):
+            return course['course_id']
+    return None
+
+
+def vocabulary_records(items: List[Dict[str, Any]], document_name: str, level: str = None,
+                       courses: List[Dict[str, Any]] = ()) -> List[Tuple]:
+    """Các dòng cần chèn (theo INSERT_COLUMNS) từ kết quả của VocabularyParser.parse."""
+    records = []
+    for item in items:
+        reading = vocabulary_key(item.get("cách đọc"))
+        meaning = (item.get("nghĩa") or "").strip()
+        if not reading or not meaning:
+            continue
+        page = item.get("page")
+        records.append((
+            vocabulary_key(item.get("từ vựng")),
+            reading,
+            meaning,
+            item.get("lesson"),
+            item.get("chapter"),
+            course_for_page(courses, page) if page else None,
+            canonical_filter_value(level),
+            document_name,
+            page,
+            item.get("tiền tố"),
+        ))
+    return records
+
+
+def replace_document_vocabulary(conn, document_name: str, records: List[Tuple]) -> int:
+    """Thay toàn bộ mục từ vựng của một file bằng `records` trong một giao dịch. Trả về số dòng đã chèn."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'DELETE FROM "{VOCABULARY_TABLE}" WHERE source_document_name = %s;', (document_name,))
+            if records:
+                execute_values(
+                    cur,
+                    f'INSERT INTO "{VOCABULARY_TABLE}" ({", ".join(INSERT_COLUMNS)}) VALUES %s;',
+                    records, page_size=1000
+                )
+        conn.commit()
+        return len(records)
+    except Exception as e:
+        print(f"Lỗi khi ghi từ vựng của {document_name}: {e}")
+        conn.rollback()
+        return 0
+
+
+def load_vocabulary_from_manifest(manifest_path: str = None):
+    """Parse các file PDF từ vựng trong manifest và nạp vào bảng vocabulary_entries."""
+    manifest_path = manifest_path or os.path.join(project_root, 'data', 'manifest.json')
+    if not os.path.exists(manifest_path):
+        print(f"Lỗi: Không tìm thấy file 'manifest.json' tại '{manifest_path}'")
+        return
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest_data = json.load(f)
+
+    conn = get_db_connection()
+    if not conn:
+        print("Lỗi: Không thể kết nối DB.")
+        return
+
+    parser = VocabularyParser()
+    try:
+        for item in manifest_data:
+            courses = [course for course in item['courses']
+                       if canonical_filter_value(course.get('skill_type', 'GENERAL')) == 'VOCABULARY']
+            if not courses:
+                continue
+            pdf_path = os.path.join(project_root, item['pdf_path'])
+            if not os.path.exists(pdf_path):
+                print(f"Cảnh báo: Bỏ qua vì không tìm thấy file tại '{pdf_path}'")
+                continue
+            document_name = os.path.basename(pdf_path)
+            records = vocabulary_records(parser.parse(pdf_path), document_name, item.get('level'), courses)
+            inserted = replace_document_vocabulary(conn, document_name, records)
+            print(f"--- {document_name}: đã nạp {inserted} mục từ vựng. ---")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    load_vocabulary_from_manifest()
@@ -94,7 +94,9 @@ class VocabularyParser:
             return {
                 "từ vựng": vocabulary,
                 "cách đọc": reading,
-                "nghĩa": meaning
+                "nghĩa": meaning,
+                # Giáo trình ghi （お）名前: lưu tiền tố đã bỏ để tra được cả "お名前"
+                "tiền tố": "お" if any(re.match(r'^(\(お\)|（お）)', token) for token in jp_tokens) else None
             }
 
         return None
@@ -113,7 +115,7 @@ class VocabularyParser:
         print(f"Bắt đầu xử lý file: {os.path.basename(file_path)}...")
         try:
             with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
+                for page_num, page in enumerate(pdf.pages, 1):
                     page_text = page.extract_text(x_tolerance=2, layout=True) or ""
                     for line in page_text.split('\n'):
 
@@ -132,6 +134,7 @@ class VocabularyParser:
                         if parsed_item:
                             parsed_item['lesson'] = self.current_lesson
                             parsed_item['chapter'] = self.current_chapter
+                            parsed_item['page'] = page_num
                             extracted_data.append(parsed_item)
 
             print(f"Xử lý xong. Trích xuất được {len(extracted_data)} mục từ vựng.")
@@ -0,0 +1,570 @@
+# src/dbtools/migrations.py
+import argparse
+import re
+import time
+from typing import List, NamedTuple, Tuple, Union, Callable
+
+import psycopg2
+from psycopg2.sql import SQL, Identifier, Literal
+
+from src.config import settings
+from src.core.database import get_db_connection, JLPT_LEVELS
+
+# Các thay đổi schema được đánh số phiên bản và áp dụng theo thứ tự. Phiên bản
+# đã chạy được ghi vào bảng schema_migrations nên chạy lại script là an toàn.
+# Chạy trước khi triển khai code mới:
+#     python -m src.dbtools.migrations
+# Xem kích thước / trạng thái các index do migration tạo:
+#     python -m src.dbtools.migrations --report
+# Tạo lại index vector partial sau khi nạp tài liệu có level / skill_type mới:
+#     python -m src.dbtools.migrations --rebuild-partial-indexes
+
+# Một bước migration: câu SQL hoặc hàm nhận cursor (cho các bước cần kiểm tra trước).
+Step = Union[str, Callable[[object], None]]
+
+CONTENT_CHUNK_TABLES = ("content_chunks", "contentchunks")
+
+
+class Migration(NamedTuple):
+    version: str
+    description: str
+    statements: Tuple[Step, ...]
+    # False cho các lệnh không chạy được trong giao dịch (vd: CREATE INDEX CONCURRENTLY).
+    # Các lệnh như vậy phải idempotent (IF NOT EXISTS) vì không thể rollback.
+    transactional: bool = True
+    # Các index được tạo, để báo cáo kích thước sau khi build
+    indexes: Tuple[str, ...] = ()
+
+
+def vector_index_name(table: str) -> str:
+    return f"idx_{table}_embedding_{settings.VECTOR_INDEX_TYPE}"
+
+
+def _create_vector_index(table: str) -> Step:
+    """
+    Bước tạo index ANN (HNSW hoặc IVFFlat theo VECTOR_INDEX_TYPE) cho cột embedding
+    với toán tử cosine (khớp với `ORDER BY embedding <=> %s`). Bỏ qua nếu bảng không tồn tại.
+    """
+    def step(cur):
+        cur.execute("SELECT to_regclass(%s);", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[Migration] Bỏ qua {table}: bảng không tồn tại.")
+            return
+        # Build index vector cần nhiều bộ nhớ; chỉ đặt cho phiên hiện tại rồi trả lại
+        cur.execute("SELECT set_config('maintenance_work_mem', %s, false);",
+                    (settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM,))
+        try:
+            cur.execute(SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} USING {};").format(
+                Identifier(vector_index_name(table)), Identifier(table), _vector_index_method()))
+        finally:
+            cur.execute("RESET maintenance_work_mem;")
+    return step
+
+
+def _vector_index_method() -> SQL:
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        return SQL("ivfflat (embedding vector_cosine_ops) WITH (lists = {})").format(
+            SQL(str(int(settings.VECTOR_INDEX_IVFFLAT_LISTS))))
+    return SQL("hnsw (embedding vector_cosine_ops) WITH (m = {}, ef_construction = {})").format(
+        SQL(str(int(settings.VECTOR_INDEX_HNSW_M))),
+        SQL(str(int(settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION))))
+
+
+def quantized_index_names(table: str) -> Tuple[str, str]:
+    return f"idx_{table}_embedding_halfvec", f"idx_{table}_embedding_binary"
+
+
+def pgvector_version(cur) -> Tuple[int, ...]:
+    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+    row = cur.fetchone()
+    return tuple(int(part) for part in row[0].split(".")) if row else ()
+
+
+def _create_quantized_indexes(table: str) -> Step:
+    """
+    Bước tạo các index HNSW trên biểu thức embedding::halfvec(n) (cosine) và
+    binary_quantize(embedding)::bit(n) (Hamming) cho VECTOR_SEARCH_MODE
+    "halfvec" / "binary". Biểu thức phải khớp với database.chunk_search_query.
+    Cần pgvector >= 0.7; bỏ qua nếu bảng không tồn tại hoặc pgvector cũ hơn.
+    """
+    def step(cur):
+        cur.execute("SELECT to_regclass(%s);", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[Migration] Bỏ qua {table}: bảng không tồn tại.")
+            return
+        if pgvector_version(cur) < (0, 7):
+            print(f"[Migration] Bỏ qua index halfvec / binary cho {table}: cần pgvector >= 0.7 "
+                  f"(sau khi nâng cấp, xóa dòng 0007 trong schema_migrations rồi chạy lại).")
+            return
+        dim = SQL(str(int(settings.EMBEDDING_DIMENSION)))
+        halfvec_index, binary_index = quantized_index_names(table)
+        cur.execute("SELECT set_config('maintenance_work_mem', %s, false);",
+                    (settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM,))
+        try:
+            cur.execute(SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} "
+                            "USING hnsw ((embedding::halfvec({})) halfvec_cosine_ops);").format(
+                Identifier(halfvec_index), Identifier(table), dim))
+            cur.execute(SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} "
+                            "USING hnsw ((binary_quantize(embedding)::bit({})) bit_hamming_ops);").format(
+                Identifier(binary_index), Identifier(table), dim))
+        finally:
+            cur.execute("RESET maintenance_work_mem;")
+    return step
+
+
+# Số dòng mỗi lần gán change_version cho các dòng đang có (mỗi lô một giao dịch ngắn)
+CHANGE_VERSION_BACKFILL_BATCH = 5000
+
+
+def _add_change_version(table: str) -> Step:
+    """
+    Bước thêm cột change_version cho bảng chunk: số tăng dần lấy từ một sequence,
+    gán khi INSERT (DEFAULT) và khi UPDATE (trigger). Index vector trong bộ nhớ
+    (memory_index.py) dùng cột này để chỉ nạp lại các dòng mới / đã sửa.
+
+    Chạy ngoài giao dịch và không viết lại bảng: thêm cột không có DEFAULT (chỉ
+    đổi metadata), đặt DEFAULT cho dòng mới, gán giá trị cho các dòng đang có
+    theo lô, rồi NOT NULL qua một CHECK đã VALIDATE (không giữ ACCESS EXCLUSIVE
+    trong lúc quét bảng) và index tạo CONCURRENTLY.
+    """
+    def step(cur):
+        cur.execute("SELECT to_regclass(%s);", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[Migration] Bỏ qua {table}: bảng không tồn tại.")
+            return
+        sequence = f"{table}_change_seq"
+        check = f"{table}_change_version_not_null"
+        cur.execute(SQL("CREATE SEQUENCE IF NOT EXISTS {};").format(Identifier(sequence)))
+        cur.execute(SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS change_version BIGINT;").format(Identifier(table)))
+        cur.execute(SQL("ALTER TABLE {} ALTER COLUMN change_version SET DEFAULT nextval({});").format(
+            Identifier(table), Literal(sequence)))
+        cur.execute(SQL("DROP TRIGGER IF EXISTS {} ON {};").format(
+            Identifier(f"trg_{table}_change_version"), Identifier(table)))
+        cur.execute(SQL("CREATE TRIGGER {} BEFORE UPDATE ON {} FOR EACH ROW "
+                        "EXECUTE FUNCTION bump_change_version({});").format(
+            Identifier(f"trg_{table}_change_version"), Identifier(table), Literal(sequence)))
+        # Gán giá trị cho các dòng đang có theo lô (keyset theo id), mỗi lô tự commit
+        last_id, backfilled = None, 0
+        while True:
+            cur.execute(SQL("""
+                WITH batch AS (
+                    SELECT id FROM {table} WHERE change_version IS NULL AND ({last} IS NULL OR id > {last})
+                    ORDER BY id LIMIT {size}
+                )
+                UPDATE {table} SET change_version = nextval({sequence})
+                FROM batch WHERE {table}.id = batch.id
+                RETURNING {table}.id;
+            """).format(table=Identifier(table), last=Literal(last_id), size=Literal(CHANGE_VERSION_BACKFILL_BATCH),
+                        sequence=Literal(sequence)))
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                break
+            last_id, backfilled = max(ids), backfilled + len(ids)
+        cur.execute(SQL("ALTER TABLE {} DROP CONSTRAINT IF EXISTS {};").format(Identifier(table), Identifier(check)))
+        cur.execute(SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK (change_version IS NOT NULL) NOT VALID;").format(
+            Identifier(table), Identifier(check)))
+        cur.execute(SQL("ALTER TABLE {} VALIDATE CONSTRAINT {};").format(Identifier(table), Identifier(check)))
+        # Postgres dùng CHECK đã VALIDATE để bỏ qua bước quét bảng của SET NOT NULL
+        cur.execute(SQL("ALTER TABLE {} ALTER COLUMN change_version SET NOT NULL;").format(Identifier(table)))
+        cur.execute(SQL("ALTER TABLE {} DROP CONSTRAINT {};").format(Identifier(table), Identifier(check)))
+        cur.execute(SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} (change_version);").format(
+            Identifier(f"idx_{table}_change_version"), Identifier(table)))
+        print(f"[Migration] {table}: gán change_version cho {backfilled} dòng.")
+    return step
+
+
+def _add_corpus_generation_trigger(table: str) -> Step:
+    """
+    Bước gắn trigger tăng thế hệ bộ tài liệu (corpus_generation) sau mỗi câu lệnh
+    INSERT / UPDATE / DELETE / TRUNCATE trên bảng chunk (hoặc bảng từ vựng). Cache
+    kết quả truy xuất (retrieval_cache.py) bỏ toàn bộ mục của bảng khi thế hệ
+    thay đổi; index từ vựng (vocabulary_index.py) nạp lại.
+    """
+    def step(cur):
+        cur.execute("SELECT to_regclass(%s);", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[Migration] Bỏ qua {table}: bảng không tồn tại.")
+            return
+        cur.execute(SQL("DROP TRIGGER IF EXISTS {} ON {};").format(
+            Identifier(f"trg_{table}_corpus_generation"), Identifier(table)))
+        cur.execute(SQL("CREATE TRIGGER {} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {} "
+                        "FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_generation();").format(
+            Identifier(f"trg_{table}_corpus_generation"), Identifier(table)))
+    return step
+
+
+def partial_vector_index_name(table: str, level: str = None, skill_type: str = None) -> str:
+    """Tên index vector partial cho một level và / hoặc một skill_type (đã chuẩn hóa)."""
+    parts = [f"idx_{table}_embedding_{settings.VECTOR_INDEX_TYPE}"]
+    if level:
+        parts.append("lv_" + re.sub(r"[^a-z0-9]+", "_", level.lower()).strip("_"))
+    if skill_type:
+        parts.append("sk_" + re.sub(r"[^a-z0-9]+", "_", skill_type.lower()).strip("_"))
+    return "_".join(parts)[:63]
+
+
+def partial_vector_index_names(cur, table: str) -> Tuple[str, ...]:
+    """Các index vector partial (level / skill_type) đang có của bảng."""
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname ~ %s ORDER BY indexname;",
+                (table, f"^idx_{re.escape(table)}_embedding_[a-z]+_(lv|sk)_"))
+    return tuple(row[0] for row in cur.fetchall())
+
+
+def _canonicalize_chunk_filters(table: str) -> Step:
+    """Bước đưa level / skill_type của các dòng đang có về dạng chuẩn (canonical_filter_value)."""
+    def step(cur):
+        cur.execute("SELECT to_regclass(%s);", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[Migration] Bỏ qua {table}: bảng không tồn tại.")
+            return
+        cur.execute(SQL(
+            "UPDATE {} SET level = NULLIF(UPPER(BTRIM(level)), ''), skill_type = NULLIF(UPPER(BTRIM(skill_type)), '') "
+            "WHERE level IS DISTINCT FROM NULLIF(UPPER(BTRIM(level)), '') "
+            "OR skill_type IS DISTINCT FROM NULLIF(UPPER(BTRIM(skill_type)), '');").format(Identifier(table)))
+        print(f"[Migration] {table}: chuẩn hóa level / skill_type của {cur.rowcount} dòng.")
+    return step
+
+
+def _partial_vector_index_targets(cur, table: str) -> List[Tuple[Tuple[Tuple[str, str], ...], str]]:
+    """(điều kiện (cột, giá trị), tên index) của các index partial cần có theo dữ liệu hiện tại của bảng."""
+    cur.execute(SQL("SELECT DISTINCT level, skill_type FROM {} WHERE skill_type IS NOT NULL;").format(
+        Identifier(table)))
+    pairs = sorted(cur.fetchall(), key=lambda pair: (pair[0] or "", pair[1]))
+    targets = [((("level", level),), partial_vector_index_name(table, level=level)) for level in JLPT_LEVELS]
+    targets += [((("skill_type", skill),), partial_vector_index_name(table, skill_type=skill))
+                for skill in dict.fromkeys(skill for _, skill in pairs)]
+    targets += [((("level", level), ("skill_type", skill)), partial_vector_index_name(table, level, skill))
+                for level, skill in pairs if level in JLPT_LEVELS]
+    return targets
+
+
+def _create_partial_vector_indexes(table: str, drop_obsolete: bool = False) -> Step:
+    """
+    Bước tạo index ANN partial cho từng level (N1-N5), từng skill_type và từng cặp
+    (level, skill_type) đang có trong bảng. Với bộ lọc `level = ...` (và / hoặc
+    `skill_type = ...`), planner quét index chỉ chứa các dòng khớp thay vì lọc
+    sau trên index của cả bảng (vốn có thể trả về ít hơn top-k dòng).
+    Với `drop_obsolete`, bỏ các index partial của giá trị không còn trong bảng.
+    """
+    def step(cur):
+        cur.execute("SELECT to_regclass(%s);", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[Migration] Bỏ qua {table}: bảng không tồn tại.")
+            return
+        targets = _partial_vector_index_targets(cur, table)
+        cur.execute("SELECT set_config('maintenance_work_mem', %s, false);",
+                    (settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM,))
+        try:
+            for conditions, name in targets:
+                where = SQL(" AND ").join(
+                    SQL("{} = {}").format(Identifier(column), Literal(value)) for column, value in conditions)
+                cur.execute(SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} USING {} WHERE {};").format(
+                    Identifier(name), Identifier(table), _vector_index_method(), where))
+        finally:
+            cur.execute("RESET maintenance_work_mem;")
+        if drop_obsolete:
+            names = {name for _, name in targets}
+            for name in partial_vector_index_names(cur, table):
+                if name not in names:
+                    cur.execute(SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(Identifier(name)))
+                    print(f"[Migration] {table}: bỏ index partial {name}.")
+        print(f"[Migration] {table}: {len(targets)} index vector partial.")
+    return step
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        "0001",
+        "Bộ đếm messenger_order theo từng phiên",
+        (
+            "ALTER TABLE chat_session ADD COLUMN IF NOT EXISTS last_messenger_order INTEGER NOT NULL DEFAULT 0;",
+            """
+            UPDATE chat_session s
+            SET last_messenger_order = m.max_order
+            FROM (SELECT session_id, MAX(messenger_order) AS max_order
+                  FROM chat_messenger
+                  GROUP BY session_id) m
+            WHERE m.session_id = s.id AND m.max_order > s.last_messenger_order;
+            """,
+        ),
+    ),
+    Migration(
+        "0002",
+        "Index chat_messenger(session_id, messenger_order)",
+        (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_messenger_session_order "
+            "ON chat_messenger (session_id, messenger_order);",
+        ),
+        transactional=False,
+        indexes=("idx_chat_messenger_session_order",),
+    ),
+    Migration(
+        "0003",
+        "Covering index cho danh sách phiên phân trang keyset",
+        (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_session_user_updated "
+            "ON chat_session (user_id, updated_at DESC, id DESC) INCLUDE (session_name);",
+        ),
+        transactional=False,
+        indexes=("idx_chat_session_user_updated",),
+    ),
+    Migration(
+        "0004",
+        "Index ANN cho cột embedding của các bảng content chunk",
+        tuple(_create_vector_index(table) for table in CONTENT_CHUNK_TABLES),
+        transactional=False,
+        indexes=tuple(vector_index_name(table) for table in CONTENT_CHUNK_TABLES),
+    ),
+    Migration(
+        "0005",
+        "GIN jsonb_path_ops cho chat_session.context (find_session dùng context @> ...)",
+        (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_session_context "
+            "ON chat_session USING gin (context jsonb_path_ops);",
+        ),
+        transactional=False,
+        indexes=("idx_chat_session_context",),
+    ),
+    Migration(
+        "0006",
+        "Expression index cho context->>'exam_result_id' và context->>'essay_result_id'",
+        (
+            # Partial index: chỉ chứa các phiên chữa bài; điều kiện `= %s` của truy vấn
+            # đã bao hàm IS NOT NULL nên planner vẫn dùng được index.
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_session_exam_result "
+            "ON chat_session ((context->>'exam_result_id')) WHERE context->>'exam_result_id' IS NOT NULL;",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_session_essay_result "
+            "ON chat_session ((context->>'essay_result_id')) WHERE context->>'essay_result_id' IS NOT NULL;",
+        ),
+        transactional=False,
+        indexes=("idx_chat_session_exam_result", "idx_chat_session_essay_result"),
+    ),
+    Migration(
+        "0007",
+        "Index halfvec và nhị phân cho tìm ứng viên hai bước (VECTOR_SEARCH_MODE)",
+        tuple(_create_quantized_indexes(table) for table in CONTENT_CHUNK_TABLES),
+        transactional=False,
+        indexes=tuple(name for table in CONTENT_CHUNK_TABLES for name in quantized_index_names(table)),
+    ),
+    Migration(
+        "0008",
+        "Cột change_version cho các bảng content chunk (nạp lại index trong bộ nhớ theo phần thay đổi)",
+        (
+            """
+            CREATE OR REPLACE FUNCTION bump_change_version() RETURNS trigger AS $$
+            BEGIN
+                NEW.change_version := nextval(TG_ARGV[0]);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+        ) + tuple(_add_change_version(table) for table in CONTENT_CHUNK_TABLES),
+        transactional=False,
+        indexes=tuple(f"idx_{table}_change_version" for table in CONTENT_CHUNK_TABLES),
+    ),
+    Migration(
+        "0009",
+        "Bảng corpus_generation và trigger tăng thế hệ khi bảng content chunk thay đổi",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS corpus_generation (
+                table_name TEXT PRIMARY KEY,
+                generation BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """,
+            """
+            CREATE OR REPLACE FUNCTION bump_corpus_generation() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO corpus_generation (table_name, generation) VALUES (TG_TABLE_NAME, 1)
+                ON CONFLICT (table_name) DO UPDATE
+                    SET generation = corpus_generation.generation + 1, updated_at = now();
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+        ) + tuple(_add_corpus_generation_trigger(table) for table in CONTENT_CHUNK_TABLES),
+    ),
+    Migration(
+        "0010",
+        "Chuẩn hóa level / skill_type và index vector partial theo level / skill_type",
+        tuple(_canonicalize_chunk_filters(table) for table in CONTENT_CHUNK_TABLES)
+        + tuple(_create_partial_vector_indexes(table) for table in CONTENT_CHUNK_TABLES),
+        transactional=False,
+        indexes=tuple(partial_vector_index_name(table, level=level)
+                      for table in CONTENT_CHUNK_TABLES for level in JLPT_LEVELS),
+    ),
+    Migration(
+        "0011",
+        "Bảng vocabulary_entries (từ vựng của VocabularyParser) và index theo từ / cách đọc",
+        (
+            # term / reading được lưu ở dạng chuẩn (vocabulary_key); term NULL khi chỉ có cách đọc
+            """
+            CREATE TABLE IF NOT EXISTS vocabulary_entries (
+                id BIGSERIAL PRIMARY KEY,
+                term TEXT,
+                reading TEXT NOT NULL,
+                meaning TEXT NOT NULL,
+                lesson TEXT,
+                chapter TEXT,
+                course_id TEXT,
+                level TEXT,
+                source_document_name TEXT NOT NULL,
+                original_page_number INTEGER
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_vocabulary_entries_term ON vocabulary_entries (term);",
+            "CREATE INDEX IF NOT EXISTS idx_vocabulary_entries_reading ON vocabulary_entries (reading);",
+            "CREATE INDEX IF NOT EXISTS idx_vocabulary_entries_document ON vocabulary_entries (source_document_name);",
+            # Index tra cứu trong bộ nhớ (vocabulary_index.py) nạp lại khi thế hệ của bảng thay đổi
+            _add_corpus_generation_trigger("vocabulary_entries"),
+        ),
+        indexes=("idx_vocabulary_entries_term", "idx_vocabulary_entries_reading",
+                 "idx_vocabulary_entries_document"),
+    ),
+    Migration(
+        "0012",
+        "Cột honorific_prefix của vocabulary_entries (tiền tố （お） mà parser bỏ khỏi từ / cách đọc)",
+        (
+            # Thêm cột cho phép NULL, không DEFAULT: chỉ đổi metadata. Chạy lại vocabulary_loader để điền giá trị.
+            "ALTER TABLE vocabulary_entries ADD COLUMN IF NOT EXISTS honorific_prefix TEXT;",
+        ),
+    ),
+]
+
+
+def _ensure_migrations_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """)
+    conn.commit()
+
+
+def applied_versions(conn) -> List[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations ORDER BY version;")
+        return [row[0] for row in cur.fetchall()]
+
+
+def _apply(conn, migration: Migration):
+    conn.autocommit = not migration.transactional
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.statements:
+                if callable(statement):
+                    statement(cur)
+                else:
+                    cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                (migration.version, migration.description)
+            )
+        if migration.transactional:
+            conn.commit()
+    finally:
+        conn.autocommit = False
+
+
+def index_sizes(conn, names: Tuple[str, ...]) -> List[tuple]:
+    """(tên index, kích thước, còn hợp lệ) của các index đang tồn tại trong danh sách."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, pg_size_pretty(pg_relation_size(c.oid)), i.indisvalid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = ANY(%s)
+            ORDER BY c.relname;
+        """, (list(names),))
+        return cur.fetchall()
+
+
+def _print_index_sizes(conn, names: Tuple[str, ...]):
+    for name, size, valid in index_sizes(conn, names):
+        # Index tạo CONCURRENTLY bị lỗi giữa chừng sẽ ở trạng thái INVALID và cần DROP rồi chạy lại
+        print(f"    {name}: {size}{'' if valid else ' (INVALID)'}")
+
+
+def report_indexes():
+    """In kích thước và trạng thái của tất cả index do migration tạo."""
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        names = tuple(name for m in MIGRATIONS for name in m.indexes)
+        with conn.cursor() as cur:
+            partial = tuple(name for table in CONTENT_CHUNK_TABLES for name in partial_vector_index_names(cur, table))
+        _print_index_sizes(conn, tuple(dict.fromkeys(names + partial)))
+    except psycopg2.Error as e:
+        print(f"[Lỗi] Không thể đọc thông tin index: {e}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def rebuild_partial_vector_indexes():
+    """
+    Tạo lại index vector partial (migration 0010) theo dữ liệu hiện tại: thêm index
+    cho level / skill_type mới xuất hiện sau khi nạp tài liệu và bỏ index của giá
+    trị không còn. Các index được tạo / bỏ CONCURRENTLY nên chạy được khi API đang phục vụ.
+    """
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in CONTENT_CHUNK_TABLES:
+                _create_partial_vector_indexes(table, drop_obsolete=True)(cur)
+                _print_index_sizes(conn, partial_vector_index_names(cur, table))
+    except psycopg2.Error as e:
+        print(f"[Lỗi] Không thể tạo lại index partial: {e}")
+    finally:
+        conn.autocommit = False
+        conn.close()
+
+
+def run_migrations() -> List[str]:
+    """Áp dụng các migration chưa chạy. Trả về danh sách phiên bản đã áp dụng trong lần chạy này."""
+    applied = []
+    conn = get_db_connection()
+    if not conn: return applied
+    try:
+        _ensure_migrations_table(conn)
+        done = set(applied_versions(conn))
+        conn.commit()  # kết thúc giao dịch đọc trước khi đổi chế độ autocommit
+        for migration in MIGRATIONS:
+            if migration.version in done:
+                continue
+            start = time.perf_counter()
+            _apply(conn, migration)
+            applied.append(migration.version)
+            print(f"[Migration] {migration.version} - {migration.description} "
+                  f"({time.perf_counter() - start:.2f}s)")
+            if migration.indexes:
+                _print_index_sizes(conn, migration.indexes)
+                conn.commit()
+        if not applied:
+            print("[Migration] Schema đã ở phiên bản mới nhất.")
+    except psycopg2.Error as e:
+        print(f"[Lỗi] Migration thất bại: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Áp dụng các migration của database.")
+    parser.add_argument("--report", action="store_true", help="Chỉ in kích thước các index do migration tạo.")
+    parser.add_argument("--rebuild-partial-indexes", action="store_true",
+                        help="Tạo lại index vector partial theo level / skill_type đang có (sau khi nạp tài liệu).")
+    args = parser.parse_args()
+    if args.report:
+        report_indexes()
+    elif args.rebuild_partial_indexes:
+        rebuild_partial_vector_indexes()
+    else:
+        run_migrations()
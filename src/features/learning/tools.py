@@ -1,13 +1,14 @@
 # src/features/learning/tools.py
 
-from langchain.tools import tool
+from langchain.tools import tool, StructuredTool
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
 
-from ...core.database import execute_sql_query
-from ...core.embedding import get_embedding_model
-
-embedding_model = get_embedding_model()
+from ...core.database import execute_sql_query, search_chunk_rows
+from ...core import async_database
+from ...core.embedding import encode_query, aencode_query
+from ...core.retrieval_cache import cached_retrieval, acached_retrieval
+from ...core.diversity import retrieval_candidates, retrieval_columns, select_rows, aselect_rows
 
 
 class ContextualSearchInput(BaseModel):
@@ -15,29 +16,7 @@ class ContextualSearchInput(BaseModel):
     material_id: str = Field(description="ID của tài liệu học tập đang xem để giới hạn phạm vi tìm kiếm.")
 
 
-@tool(args_schema=ContextualSearchInput)
-def contextual_knowledge_retriever(query: str, material_id: str) -> str:
-    """
-    Công cụ RAG theo ngữ cảnh. Chỉ tìm kiếm kiến thức trong phạm vi một
-    tài liệu (Material) cụ thể.
-    """
-    print(f"--- Tool Learning: Đang tra cứu '{query}' trong Material ID '{material_id}' ---")
-    if not embedding_model:
-        return "Lỗi: Model embedding chưa được khởi tạo."
-
-    query_embedding = embedding_model.encode(query).tolist()
-
-    # Câu lệnh SQL có bộ lọc cứng theo material_id (hoặc unit_id tùy thiết kế)
-    query_sql = """
-                SELECT chunk_text
-                FROM "content_chunks"
-                WHERE material_id = %s -- Lọc cứng theo ngữ cảnh
-                ORDER BY embedding <=> %s
-                    LIMIT 3; \
-                """
-    params = (material_id, str(query_embedding))
-    results = execute_sql_query(query_sql, params)
-
+def _format_contextual(results: List[Dict[str, Any]]) -> str:
     if not results:
         return "Không tìm thấy thông tin liên quan trong bài học này."
 
@@ -46,3 +25,42 @@ def contextual_knowledge_retriever(query: str, material_id: str) -> str:
         formatted_context += f"--- Trích đoạn {i + 1} ---\n{doc.get('chunk_text')}\n\n"
 
     return formatted_context
+
+
+def contextual_retriever(query: str, material_id: str) -> str:
+    """
+    Công cụ RAG theo ngữ cảnh. Chỉ tìm kiếm kiến thức trong phạm vi một
+    tài liệu (Material) cụ thể.
+    """
+    print(f"--- Tool Learning: Đang tra cứu '{query}' trong Material ID '{material_id}' ---")
+    # Bộ lọc cứng theo material_id (hoặc unit_id tùy thiết kế)
+    filters = {"material_id": material_id}
+
+    def compute():
+        rows = search_chunk_rows("content_chunks", retrieval_columns(("chunk_text",)), encode_query(query),
+                                 retrieval_candidates(3), filters)
+        return select_rows(query, rows, 3)
+
+    return _format_contextual(cached_retrieval("contextual", "content_chunks", query, filters, 3, compute))
+
+
+async def acontextual_retriever(query: str, material_id: str) -> str:
+    """Bản bất đồng bộ (khi agent chạy bằng ainvoke)."""
+    print(f"--- Tool Learning: Đang tra cứu '{query}' trong Material ID '{material_id}' ---")
+    filters = {"material_id": material_id}
+
+    async def compute():
+        rows = await async_database.search_chunk_rows("content_chunks", retrieval_columns(("chunk_text",)),
+                                                      await aencode_query(query), retrieval_candidates(3), filters)
+        return await aselect_rows(query, rows, 3)
+
+    return _format_contextual(await acached_retrieval("contextual", "content_chunks", query, filters, 3, compute))
+
+
+contextual_knowledge_retriever = StructuredTool.from_function(
+    func=contextual_retriever,
+    coroutine=acontextual_retriever,
+    name="contextual_knowledge_retriever",
+    description=contextual_retriever.__doc__.strip(),
+    args_schema=ContextualSearchInput
+)
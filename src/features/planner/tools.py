@@ -3,8 +3,7 @@ from langchain.tools import tool
 from psycopg2.extras import execute_values
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
-from src.core.vector_store_interface import get_db_connection
-from ...core.database import execute_sql_query
+from ...core.database import get_db_connection, execute_sql_query
 
 # =====================
 # SCHEMA INPUTS
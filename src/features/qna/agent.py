@@ -4,7 +4,9 @@ from langchain.agents import create_openai_tools_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.memory import ConversationBufferMemory
 
-from .tools import knowledge_retriever_tool, get_course_context_tool
+from .tools import (
+    knowledge_retriever_tool, knowledge_batch_retriever_tool, vocabulary_lookup_tool, get_course_context_tool
+)
 from ...core.llm import get_llm
 
 def initialize_qna_agent():
@@ -15,7 +17,7 @@ def initialize_qna_agent():
     llm_instance = get_llm()
     if not llm_instance: return None
 
-    tools = [knowledge_retriever_tool, get_course_context_tool]
+    tools = [knowledge_retriever_tool, knowledge_batch_retriever_tool, vocabulary_lookup_tool, get_course_context_tool]
 
     system_prompt = """
     Bạn là một Gia sư AI tiếng Nhật toàn năng, thông thái và chính xác. Nhiệm vụ của bạn là trả lời mọi yêu cầu của người học bằng cách suy luận theo quy trình bắt buộc bên dưới.
@@ -44,6 +46,8 @@ def initialize_qna_agent():
             - Nếu cả `level` và `hobby` có → Dùng cả 2 làm điều kiện tìm kiếm
             - Nếu chỉ có `level` → Dùng `level`
             - Nếu chỉ có `hobby` hoặc không có gì → Tạo quiz ngẫu nhiên phù hợp
+    - Nếu cần tra cứu nhiều chủ đề / từ cùng lúc: Dùng một lần `knowledge_batch_retriever_tool(queries)` thay vì gọi `knowledge_retriever_tool` nhiều lần.
+    - Nếu người dùng hỏi nghĩa / cách đọc của một từ cụ thể: Gọi `vocabulary_lookup_tool(term)` trước; chỉ dùng `knowledge_retriever_tool` khi không tìm thấy.
 
     **BƯỚC 3: XỬ LÝ NỘI DUNG YÊU CẦU**
     - `Thought`: Tôi đã có đủ thông tin từ RAG (nếu cần). Giờ tôi sẽ xử lý yêu cầu theo `task_type`.
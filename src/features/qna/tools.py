@@ -1,14 +1,16 @@
 # src/features/qna/tools.py
 
-from langchain.tools import tool
+from langchain.tools import tool, StructuredTool
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 
 # Import các thành phần cốt lõi
-from ...core.database import execute_sql_query
-from ...core.embedding import get_embedding_model
-
-embedding_model = get_embedding_model()
+from ...core.database import execute_sql_query, search_chunk_rows, search_chunk_rows_many
+from ...core import async_database
+from ...core.embedding import encode_query, aencode_query, encode_queries, aencode_queries
+from ...core.retrieval_cache import cached_retrieval, acached_retrieval, cached_retrieval_many, acached_retrieval_many
+from ...core.diversity import retrieval_candidates, retrieval_columns, select_rows, aselect_rows
+from ...core.vocabulary_index import vocabulary_index
 
 
 # --- Tool 1: Lấy hồ sơ người dùng ---
@@ -37,42 +39,17 @@ class KnowledgeSearchInput(BaseModel):
     skill_type: str = Field(default=None, description="Lọc theo loại kỹ năng, ví dụ: 'VOCABULARY'.")
 
 
-@tool(args_schema=KnowledgeSearchInput)
-def knowledge_retriever_tool(query: str, course_id: str = None, level: str = None, skill_type: str = None) -> str:
-    """
-    Truy xuất các mẩu kiến thức (chunks) liên quan nhất từ database.
-    Có thể lọc theo mã môn, cấp độ, hoặc kỹ năng.
-    """
-    print(f"--- Tool RAG: Đang tra cứu cho query '{query}' với các bộ lọc: course_id={course_id}, level={level} ---")
-    if not embedding_model:
-        return "Lỗi: Model embedding chưa được khởi tạo."
-
-    query_embedding = embedding_model.encode(query).tolist()
-
-    # Xây dựng câu lệnh SQL linh hoạt
-    base_query = 'SELECT chunk_text, course_id FROM "content_chunks"'
-    where_clauses = []
-    params = []
-
-    # Thêm các điều kiện lọc vào mệnh đề WHERE
-    if course_id:
-        where_clauses.append('"course_id" = %s')
-        params.append(course_id)
-    if level:
-        where_clauses.append("LOWER(level) = LOWER(%s)")
-        params.append(level)
-    if skill_type:
-        where_clauses.append("LOWER(skill_type) = LOWER(%s)")
-        params.append(skill_type)
+def _knowledge_filters(course_id: str = None, level: str = None, skill_type: str = None) -> Dict[str, Any]:
+    """Các bộ lọc của knowledge_retriever_tool (level / skill_type không phân biệt hoa thường)."""
+    filters = {"course_id": course_id, "level": level, "skill_type": skill_type}
+    return {column: value for column, value in filters.items() if value}
 
-    if where_clauses:
-        base_query += " WHERE " + " AND ".join(where_clauses)
 
-    base_query += " ORDER BY embedding <=> %s LIMIT 3;"
-    params.append(str(query_embedding))
+KNOWLEDGE_COLUMNS = ("chunk_text", "course_id")
+KNOWLEDGE_IGNORE_CASE = ("level", "skill_type")
 
-    results = execute_sql_query(base_query, tuple(params))
 
+def _format_knowledge(results: List[Dict[str, Any]]) -> str:
     if not results:
         return "Không tìm thấy thông tin liên quan trong cơ sở tri thức."
 
@@ -85,6 +62,143 @@ def knowledge_retriever_tool(query: str, course_id: str = None, level: str = Non
     return formatted_context
 
 
+def knowledge_retriever(query: str, course_id: str = None, level: str = None, skill_type: str = None) -> str:
+    """
+    Truy xuất các mẩu kiến thức (chunks) liên quan nhất từ database.
+    Có thể lọc theo mã môn, cấp độ, hoặc kỹ năng.
+    """
+    print(f"--- Tool RAG: Đang tra cứu cho query '{query}' với các bộ lọc: course_id={course_id}, level={level} ---")
+    filters = _knowledge_filters(course_id, level, skill_type)
+
+    def compute():
+        rows = search_chunk_rows("content_chunks", retrieval_columns(KNOWLEDGE_COLUMNS), encode_query(query),
+                                 retrieval_candidates(3), filters, ignore_case=KNOWLEDGE_IGNORE_CASE)
+        return select_rows(query, rows, 3)
+
+    return _format_knowledge(cached_retrieval(
+        "knowledge", "content_chunks", query, filters, 3, compute, ignore_case=KNOWLEDGE_IGNORE_CASE))
+
+
+async def aknowledge_retriever(query: str, course_id: str = None, level: str = None, skill_type: str = None) -> str:
+    """Bản bất đồng bộ (khi agent chạy bằng ainvoke): encode và truy vấn không chặn event loop."""
+    print(f"--- Tool RAG: Đang tra cứu cho query '{query}' với các bộ lọc: course_id={course_id}, level={level} ---")
+    filters = _knowledge_filters(course_id, level, skill_type)
+
+    async def compute():
+        rows = await async_database.search_chunk_rows(
+            "content_chunks", retrieval_columns(KNOWLEDGE_COLUMNS), await aencode_query(query),
+            retrieval_candidates(3), filters, ignore_case=KNOWLEDGE_IGNORE_CASE)
+        return await aselect_rows(query, rows, 3)
+
+    return _format_knowledge(await acached_retrieval(
+        "knowledge", "content_chunks", query, filters, 3, compute, ignore_case=KNOWLEDGE_IGNORE_CASE))
+
+
+knowledge_retriever_tool = StructuredTool.from_function(
+    func=knowledge_retriever,
+    coroutine=aknowledge_retriever,
+    name="knowledge_retriever_tool",
+    description=knowledge_retriever.__doc__.strip(),
+    args_schema=KnowledgeSearchInput
+)
+
+
+class KnowledgeBatchSearchInput(BaseModel):
+    queries: List[str] = Field(description="Danh sách các câu hỏi hoặc chủ đề cần tra cứu cùng lúc.")
+    course_id: str = Field(default=None, description="Lọc theo một mã môn học cụ thể, ví dụ: 'JPD113'.")
+    level: str = Field(default=None, description="Lọc theo cấp độ JLPT, ví dụ: 'N3'.")
+    skill_type: str = Field(default=None, description="Lọc theo loại kỹ năng, ví dụ: 'VOCABULARY'.")
+
+
+def _format_knowledge_batch(queries: List[str], results: List[List[Dict[str, Any]]]) -> str:
+    return "\n".join(f"### Tra cứu: {query}\n{_format_knowledge(rows)}" for query, rows in zip(queries, results))
+
+
+def knowledge_batch_retriever(queries: List[str], course_id: str = None, level: str = None,
+                              skill_type: str = None) -> str:
+    """
+    Như knowledge_retriever_tool nhưng tra cứu nhiều câu hỏi / chủ đề trong một
+    lần gọi (ví dụ nhiều từ vựng cần cho một quiz). Dùng tool này thay vì gọi
+    knowledge_retriever_tool nhiều lần liên tiếp.
+    """
+    print(f"--- Tool RAG: Đang tra cứu {len(queries)} query với các bộ lọc: course_id={course_id}, level={level} ---")
+    filters = _knowledge_filters(course_id, level, skill_type)
+
+    # Cùng khóa cache, bộ lọc và select_rows với knowledge_retriever; chỉ encode + tìm ứng viên là chung một lượt
+    def search_many(pending):
+        return search_chunk_rows_many("content_chunks", retrieval_columns(KNOWLEDGE_COLUMNS), encode_queries(pending),
+                                      retrieval_candidates(3), filters, ignore_case=KNOWLEDGE_IGNORE_CASE)
+
+    return _format_knowledge_batch(queries, cached_retrieval_many(
+        "knowledge", "content_chunks", queries, filters, 3, search_many,
+        lambda query, rows: select_rows(query, rows, 3), ignore_case=KNOWLEDGE_IGNORE_CASE))
+
+
+async def aknowledge_batch_retriever(queries: List[str], course_id: str = None, level: str = None,
+                                     skill_type: str = None) -> str:
+    """Bản bất đồng bộ của knowledge_batch_retriever."""
+    print(f"--- Tool RAG: Đang tra cứu {len(queries)} query với các bộ lọc: course_id={course_id}, level={level} ---")
+    filters = _knowledge_filters(course_id, level, skill_type)
+
+    async def search_many(pending):
+        return await async_database.search_chunk_rows_many(
+            "content_chunks", retrieval_columns(KNOWLEDGE_COLUMNS), await aencode_queries(pending),
+            retrieval_candidates(3), filters, ignore_case=KNOWLEDGE_IGNORE_CASE)
+
+    return _format_knowledge_batch(queries, await acached_retrieval_many(
+        "knowledge", "content_chunks", queries, filters, 3, search_many,
+        lambda query, rows: aselect_rows(query, rows, 3), ignore_case=KNOWLEDGE_IGNORE_CASE))
+
+
+knowledge_batch_retriever_tool = StructuredTool.from_function(
+    func=knowledge_batch_retriever,
+    coroutine=aknowledge_batch_retriever,
+    name="knowledge_batch_retriever_tool",
+    description=knowledge_batch_retriever.__doc__.strip(),
+    args_schema=KnowledgeBatchSearchInput
+)
+
+
+class VocabularyLookupInput(BaseModel):
+    term: str = Field(description="Từ vựng tiếng Nhật (chữ Kanji / Kana) hoặc cách đọc cần tra, ví dụ: '名前'.")
+
+
+def _format_vocabulary(term: str, entries: List[Dict[str, Any]]) -> str:
+    if not entries:
+        return f"Không tìm thấy từ '{term}' trong bảng từ vựng của giáo trình."
+    lines = [f"Kết quả tra từ '{term}' trong bảng từ vựng:"]
+    for entry in entries:
+        lines.append(f"- {entry.get('term') or entry.get('reading')} ({entry.get('reading')}): {entry.get('meaning')} "
+                     f"[{entry.get('lesson')}, môn {entry.get('course_id')}, "
+                     f"{entry.get('source_document_name')} trang {entry.get('original_page_number')}]")
+    return "\n".join(lines)
+
+
+def vocabulary_lookup(term: str) -> str:
+    """
+    Tra chính xác nghĩa, cách đọc và bài học của một từ vựng trong giáo trình
+    (theo chữ viết hoặc cách đọc). Nhanh hơn knowledge_retriever_tool; dùng khi
+    người dùng hỏi về một từ cụ thể.
+    """
+    print(f"--- Tool Vocabulary: Đang tra từ '{term}' ---")
+    return _format_vocabulary(term, vocabulary_index.lookup(term))
+
+
+async def avocabulary_lookup(term: str) -> str:
+    """Bản bất đồng bộ của vocabulary_lookup."""
+    print(f"--- Tool Vocabulary: Đang tra từ '{term}' ---")
+    return _format_vocabulary(term, await vocabulary_index.alookup(term))
+
+
+vocabulary_lookup_tool = StructuredTool.from_function(
+    func=vocabulary_lookup,
+    coroutine=avocabulary_lookup,
+    name="vocabulary_lookup_tool",
+    description=vocabulary_lookup.__doc__.strip(),
+    args_schema=VocabularyLookupInput
+)
+
+
 # --- Tool 3: Tra cứu thông tin khóa học ---
 @tool
 def get_course_context_tool(course_id: str) -> str:
@@ -0,0 +1,13 @@
+import unittest
+import src.core.async_database as async_database
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+    def test_import(self):
+        self.assertIsNotNone(async_database)
+    async def test_execute_sql_query(self):
+        result = await async_database.execute_sql_query('SELECT 1')
+        self.assertIsInstance(result, list)
+        await async_database.close_async_pool()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import gc
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from psycopg2 import extensions
+import src.core.connection_pool as connection_pool
+
+class FakeConnection:
+    closed = 0
+    autocommit = False
+    info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+    def close(self):
+        self.closed = 1
+
+class TestConnectionPool(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(connection_pool)
+    def test_pool_stats(self):
+        stats = connection_pool.get_pool_stats()
+        self.assertIsInstance(stats, dict)
+        self.assertIn("checkouts", stats)
+        self.assertIn("wait_avg_ms", stats)
+    def test_leaked_connection_returns_slot(self):
+        engine = connection_pool.ConnectionPoolEngine(0, 1, timeout=0.1, healthcheck_idle_seconds=60)
+        with mock.patch.object(connection_pool.psycopg2, "connect", side_effect=FakeConnection):
+            conn = engine.connect()
+            raw = conn.raw
+            del conn
+            gc.collect()
+            second = engine.connect()
+        self.assertIsNotNone(second)
+        self.assertEqual(raw.closed, 1)
+        self.assertEqual({key: engine.stats()[key] for key in ("leaked", "in_use", "size")},
+                         {"leaked": 1, "in_use": 1, "size": 1})
+        second.close()
+        self.assertEqual((engine.stats()["in_use"], engine.stats()["idle"]), (0, 1))
+
+if __name__ == "__main__":
+    unittest.main()
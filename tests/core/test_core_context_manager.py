@@ -4,6 +4,17 @@ import src.core.context_manager as context_manager
 class TestContextManager(unittest.TestCase):
     def test_import(self):
         self.assertIsNotNone(context_manager)
+    def test_jsonb_set_semantics(self):
+        data = {"answers": {"1": "A"}, "list": [1, 2]}
+        context_manager._jsonb_set(data, ["answers", "2"], "B")
+        context_manager._jsonb_set(data, ["list", "9"], 3)
+        context_manager._jsonb_set(data, ["missing", "x"], 1)
+        self.assertEqual(data, {"answers": {"1": "A", "2": "B"}, "list": [1, 2, 3]})
+    def test_build_update_query(self):
+        query, params, normalized = context_manager.build_update_query({"a.b": 1}, None)
+        self.assertIn("jsonb_set", query)
+        self.assertEqual(params, [["a", "b"], "1", None])
+        self.assertEqual(normalized, [(["a", "b"], 1)])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
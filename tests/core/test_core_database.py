@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 import src.core.database as database
 
 class TestDatabase(unittest.TestCase):
@@ -8,6 +9,53 @@ class TestDatabase(unittest.TestCase):
         if hasattr(database, 'execute_sql_query'):
             result = database.execute_sql_query('SELECT 1')
             self.assertIsInstance(result, list)
+    def test_stream_sql_query(self):
+        rows = list(database.stream_sql_query('SELECT 1 AS one', named=True))
+        self.assertIsInstance(rows, list)
+        if rows:
+            self.assertEqual(rows[0].one, 1)
+    def test_with_vector_search_settings(self):
+        query = database.with_vector_search_settings("SELECT 1")
+        self.assertTrue(query.endswith("SELECT 1"))
+        self.assertIn(database.vector_search_settings_sql(), query)
+    def test_chunk_search_query_modes(self):
+        query, params = database.chunk_search_query("t", ("id",), "[1,0]", 3, ["level = %s"], ["N5"], mode="exact")
+        self.assertEqual(params, ("N5", "[1,0]", 3))
+        query, params = database.chunk_search_query("t", ("id",), "[1,0]", 3, mode="binary")
+        self.assertIn("<~>", query)
+        self.assertEqual(params[-2:], ("[1,0]", 3))
+        with self.assertRaises(ValueError):
+            database.chunk_search_query("t", ("id",), "[1,0]", 3, mode="pq")
+    def test_chunk_filter_sql_canonical(self):
+        self.assertEqual(database.canonical_filter_value(" vocabulary "), "VOCABULARY")
+        self.assertIsNone(database.canonical_filter_value(" "))
+        clauses, params = database.chunk_filter_sql({"level": "n5", "course_id": "jpd113"}, ("level",))
+        self.assertEqual(clauses, ['"level" = %s', '"course_id" = %s'])
+        self.assertEqual(params, ["N5", "jpd113"])
+    def test_chunk_search_many_query(self):
+        query, params = database.chunk_search_many_query("t", ("id",), ["[1,0]", "[0,1]"], 3,
+                                                         ["level = %s"], ["N5"], mode="exact")
+        self.assertIn("CROSS JOIN LATERAL", query)
+        self.assertIn("row_number() OVER (ORDER BY c.distance)", query)
+        self.assertEqual(params, (["[1,0]", "[0,1]"], "N5", 3))
+        rows = [{"query_index": 2, "rank": 1, "id": 7}, {"query_index": 1, "rank": 1, "id": 5}]
+        self.assertEqual(database.group_ranked_rows(rows, 3, ("id",)), [[{"id": 5}], [{"id": 7}], []])
+    def test_chunk_search_query_distance_alias(self):
+        query, params = database.chunk_search_query("t", ("id",), "[1,0]", 3, ["level = %s"], ["N5"],
+                                                    mode="exact", distance_alias="distance")
+        self.assertTrue(query.startswith('SELECT "id", embedding <=> %s::vector AS "distance" FROM'))
+        self.assertEqual(params, ("[1,0]", "N5", "[1,0]", 3))
+    def test_chunk_search_query_embedding_column(self):
+        query, _ = database.chunk_search_query("t", ("id", "embedding"), "[1,0]", 3, mode="halfvec")
+        self.assertTrue(query.startswith('SELECT "id", embedding::real[] AS embedding FROM (SELECT "id", embedding '))
+    def test_hybrid_without_memory_index_uses_vector_only(self):
+        rows = [{"id": i, "chunk_text": str(i)} for i in range(3)]
+        with mock.patch.object(database, "search_chunk_rows", return_value=rows), \
+                mock.patch.object(database, "encode_query"), \
+                mock.patch.object(database, "execute_sql_query") as execute:
+            result = database.hybrid_search_chunk_rows("no_such_table", ("chunk_text",), "câu hỏi dài", 2)
+        execute.assert_not_called()
+        self.assertEqual(result, [{"chunk_text": "0"}, {"chunk_text": "1"}])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
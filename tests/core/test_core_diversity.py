@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+import numpy as np
+import src.core.diversity as diversity
+import src.core.reranker as reranker_module
+from src.config import settings
+from src.core.diversity import near_duplicate_mask, mmr, diversify_rows, select_rows
+
+class TestDiversity(unittest.TestCase):
+    def test_near_duplicate_mask(self):
+        page = "助詞「は」と「が」の違いは主題と主語です。" * 4
+        texts = [page[:60], "漢字の読み方: 山(やま)、川(かわ)。" * 3, page[2:62], page[:50]]
+        self.assertEqual(near_duplicate_mask(texts, 5, 0.8).tolist(), [False, False, True, True])
+    def test_mmr_skips_redundant(self):
+        embeddings = np.array([[1, 0, 0], [0.99, 0.1, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+        self.assertEqual(mmr(embeddings, np.array([1.0, 0.9, 0.8, 0.7]), 3, 0.7), [0, 2, 3])
+    def test_diversify_rows(self):
+        rows = [{"chunk_text": "a" * 20, "embedding": [1, 0]}, {"chunk_text": "a" * 20, "embedding": [1, 0]},
+                {"chunk_text": "b" * 20, "embedding": [0, 1]}]
+        self.assertEqual([row["chunk_text"][0] for row in diversify_rows(rows, 2, [1, 1])], ["a", "b"])
+    def test_relevance_is_query_similarity(self):
+        # Dòng 2 xếp sau nhưng gần câu truy vấn (cos 0.9) hơn hẳn dòng 3 (cos 0): độ liên
+        # quan theo thứ hạng (1, 0.67, 0.33) sẽ chọn dòng 3, cosine với câu truy vấn chọn dòng 2
+        rows = [{"chunk_text": "a" * 20, "embedding": [1, 0, 0]},
+                {"chunk_text": "b" * 20, "embedding": [0.9, 0.436, 0]},
+                {"chunk_text": "c" * 20, "embedding": [0, 0, 1]}]
+        with mock.patch.object(settings, "RAG_MMR_LAMBDA", 0.7):
+            self.assertEqual([row["chunk_text"][0] for row in diversify_rows(rows, 2, [1, 0, 0])], ["a", "b"])
+    def test_select_rows_reranks_with_top_k_budget(self):
+        class LengthModel:
+            def predict(self, pairs, show_progress_bar=False):
+                return np.array([float(len(text)) for _, text in pairs])
+        reranker = reranker_module.CrossEncoderReranker("unused", budget_ms=50, max_length=128)
+        reranker._model, reranker.ms_per_pair = LengthModel(), 10.0
+        rows = [{"chunk_text": chr(0x3042 + i) * (i + 5), "embedding": np.eye(12)[i]} for i in range(12)]
+        # Câu truy vấn cách đều mọi ứng viên: MMR chỉ còn phân định theo thứ tự sau rerank
+        with mock.patch.object(reranker_module, "reranker", reranker), \
+                mock.patch.object(diversity, "encode_query", lambda query: np.ones(12)), \
+                mock.patch.multiple(settings, RAG_DIVERSIFY=True, RAG_MMR_CANDIDATES=12):
+            selected = select_rows("q", rows, 3)
+        # Ngân sách đủ chấm 4 ứng viên (>= top_k): 4 dòng đầu được xếp lại theo điểm, MMR giữ thứ tự đó
+        self.assertEqual([len(row["chunk_text"]) for row in selected], [8, 7, 6])
+        self.assertNotIn("embedding", selected[0])
+        self.assertEqual((reranker.skipped_budget, reranker.reranked), (0, 1))
+
+if __name__ == "__main__":
+    unittest.main()
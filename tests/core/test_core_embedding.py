@@ -1,7 +1,120 @@
+import importlib.util
+import os
+import subprocess
+import sys
 import unittest
-from src.core.embedding import get_embedding_model
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from unittest import mock
+from src.config import settings
+from src.core import embedding
+from src.core.embedding import get_embedding_model, load_embedding_model, EmbeddingCache, EmbeddingBatcher, EmbeddingExecutor, normalize_query_text, to_pgvector
+
+def _model_cached() -> bool:
+    """Model embedding có sẵn trên máy (thư mục hoặc cache của Hugging Face) mà không cần tải về."""
+    if os.path.isdir(settings.EMBEDDING_MODEL_NAME):
+        return True
+    from huggingface_hub import snapshot_download
+    try:
+        snapshot_download(settings.EMBEDDING_MODEL_NAME, local_files_only=True)
+        return True
+    except Exception:
+        return False
+
+# Thay cho _process_worker_init / _process_encode trong tiến trình con (spawn import
+# lại theo tên module): vector 1 chiều, không nạp model thật
+def _stub_worker_init():
+    pass
+
+def _stub_process_encode(texts, shm_name):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        np.ndarray((len(texts), 1), dtype=np.float32, buffer=shm.buf)[:] = 1.0
+    finally:
+        shm.close()
+    return len(texts), 1
+
+MODEL_CACHED = _model_cached()
 
 class TestEmbeddingModel(unittest.TestCase):
+    def test_import_does_not_load_model(self):
+        code = ("import sys, src.core.embedding as e; "
+                "assert not e.is_embedding_model_loaded() and 'sentence_transformers' not in sys.modules")
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
+    def test_cache_evicts_by_bytes(self):
+        cache = EmbeddingCache(max_bytes=2 * (16 + 1), ttl=0)
+        for text in ("a", "b", "c"):
+            cache.put(("m", text), np.zeros(4, dtype=np.float32))
+        self.assertIsNone(cache.get(("m", "a")))
+        self.assertIsNotNone(cache.get(("m", "c")))
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.stats()["bytes"], 34)
+    def test_normalize_and_pgvector(self):
+        self.assertEqual(normalize_query_text("  ＡＢ  は\n何？ "), "AB は 何?")
+        self.assertEqual(to_pgvector(np.array([0.5, -1.0], dtype=np.float32)), "[0.5,-1]")
+    def test_encode_query_normalizes_only_cache_key(self):
+        calls = []
+        def encode_local(texts):
+            calls.append(list(texts))
+            return np.ones((len(texts), 2), dtype=np.float32)
+        with mock.patch.object(embedding, "_encode_local", encode_local), \
+                mock.patch.object(embedding, "embedding_batcher", None), \
+                mock.patch.object(embedding, "embedding_executor", None), \
+                mock.patch.object(embedding, "embedding_model_id", lambda: "test-model"), \
+                mock.patch.object(embedding, "embedding_cache", EmbeddingCache(max_bytes=1 << 20, ttl=0)):
+            embedding.encode_query("ＡＢ　は？")
+            embedding.encode_query("AB は?")
+            embedding.encode_queries(["ｃｄ", "cd", "ＡＢ　は？"])
+        self.assertEqual(calls, [["ＡＢ　は？"], ["ｃｄ"]])
+    def test_batcher_resolves_each_caller(self):
+        calls = []
+        def encode_batch(texts):
+            calls.append(list(texts))
+            return np.array([[float(len(t))] for t in texts])
+        batcher = EmbeddingBatcher(encode_batch, max_batch=8, max_wait=0.05)
+        futures = [batcher.submit(text) for text in ("a", "bb", "a")]
+        self.assertEqual([f.result(timeout=5)[0] for f in futures], [1.0, 2.0, 1.0])
+        self.assertEqual(calls, [["a", "bb"]])
+        batcher.close()
+    def test_batcher_accepts_future_from_executor(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        batcher = EmbeddingBatcher(lambda texts: pool.submit(lambda: np.ones((len(texts), 2))), max_batch=4, max_wait=0.01)
+        self.assertEqual(batcher.encode("x").tolist(), [1.0, 1.0])
+        batcher.close()
+        pool.shutdown()
+    def test_executor_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            EmbeddingExecutor("gpu", workers=1)
+        self.assertEqual(EmbeddingExecutor("thread", workers=2).stats()["queue_depth"], 0)
+    def test_executor_recreates_broken_process_pool(self):
+        with mock.patch.object(embedding, "_process_worker_init", _stub_worker_init), \
+                mock.patch.object(embedding, "_process_encode", _stub_process_encode):
+            executor = EmbeddingExecutor("process", workers=1)
+            executor.warm_up()
+            for process in list(executor._pool._processes.values()):
+                process.kill()
+                process.join()
+            self.assertEqual(executor.submit(["a", "b"]).result(timeout=60).shape, (2, 1))
+            self.assertEqual(executor.stats()["restarts"], 1)
+            executor.shutdown()
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime"), "cần optimum-onnx[onnxruntime]")
+    @unittest.skipUnless(MODEL_CACHED, "model embedding chưa có trong cache (không tải khi chạy test)")
+    def test_onnx_int8_parity(self):
+        sentences = ["Ngữ pháp て形 dùng thế nào?", "Từ vựng N5 về gia đình", "Phân biệt は và が"]
+        reference = load_embedding_model("torch").encode(sentences)
+        vectors = load_embedding_model("onnx").encode(sentences)
+        cosine = np.sum(reference * vectors, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1))
+        self.assertGreater(cosine.min(), 0.98)
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime"), "cần optimum-onnx[onnxruntime]")
+    @unittest.skipUnless(MODEL_CACHED, "model embedding chưa có trong cache (không tải khi chạy test)")
+    def test_onnx_encode_kwargs(self):
+        model = load_embedding_model("onnx")
+        vectors = model.encode(["a", "bb"], normalize_embeddings=True, show_progress_bar=False)
+        self.assertTrue(np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5))
+        with self.assertRaises(TypeError):
+            model.encode("a", output_value="token_embeddings")
     def test_model_load(self):
         model = get_embedding_model()
         self.assertIsNotNone(model)
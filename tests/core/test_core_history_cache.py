@@ -0,0 +1,34 @@
+import unittest
+from langchain_core.messages import HumanMessage, AIMessage
+import src.core.history_cache as history_cache
+
+class TestHistoryCache(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(history_cache)
+    def test_select_window_turns(self):
+        messages = [HumanMessage(content=str(i)) if i % 2 == 0 else AIMessage(content=str(i)) for i in range(10)]
+        window = history_cache.select_window(messages, max_turns=2)
+        self.assertEqual([m.content for m in window], ["6", "7", "8", "9"])
+    def test_select_window_tokens(self):
+        messages = [HumanMessage(content="a" * 40), AIMessage(content="b" * 40)]
+        window = history_cache.select_window(messages, max_tokens=15)
+        self.assertEqual(len(window), 1)
+    def test_select_window_keeps_latest(self):
+        messages = [HumanMessage(content="a" * 40), AIMessage(content="b" * 400)]
+        window = history_cache.select_window(messages, max_tokens=15)
+        self.assertEqual([m.content for m in window], ["b" * 60])
+    def test_append_gap_invalidates(self):
+        cache = history_cache.SessionHistoryCache(max_sessions=2, max_messages=10)
+        cache.store(1, "u", "GENERAL", {}, [(1, "human", "hi")], lambda t, c: HumanMessage(content=c))
+        cache.append_messages(1, 3, [AIMessage(content="x")])
+        self.assertIsNone(cache.get(1))
+    def test_message_count_follows_rows(self):
+        cache = history_cache.SessionHistoryCache(max_sessions=2, max_messages=2)
+        entry = cache.store(1, "u", "GENERAL", {}, [(4, "human", "a"), (5, "ai", "b")],
+                            lambda t, c: HumanMessage(content=c), message_count=5)
+        cache.extend(1, [(6, "human", "c")], lambda t, c: HumanMessage(content=c))
+        cache.append_messages(1, 7, [AIMessage(content="d")])
+        self.assertEqual(cache.position(entry), (7, 7))
+
+if __name__ == "__main__":
+    unittest.main()
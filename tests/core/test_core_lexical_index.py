@@ -0,0 +1,17 @@
+import unittest
+from src.core.lexical_index import BigramIndex, reciprocal_rank_fusion
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = BigramIndex(["家族: 父, 母, 兄", "父の日 と 父親", "Ngữ pháp てｶﾀ形", "母国語"])
+    def test_exact_term(self):
+        self.assertEqual([row for row, _ in self.index.exact("父")], [1, 0])
+        self.assertEqual([row for row, _ in self.index.exact("母国")], [3])
+        self.assertEqual([row for row, _ in self.index.exact("テカタ")], [])
+        self.assertEqual([row for row, _ in self.index.exact("てカ")], [2])
+    def test_rank_and_fusion(self):
+        self.assertEqual(self.index.rank("家族と父", 1)[0][0], 0)
+        self.assertEqual(reciprocal_rank_fusion([["a", "b"], ["b", "c"]])[0][0], "b")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import numpy as np
+from src.core.memory_index import IndexSnapshot
+
+def _row(chunk_id, version, vector, level="N5", material_id="m1"):
+    return (chunk_id, version, vector, f"chunk {chunk_id}", "c1", material_id, level, "vocab", "doc.pdf", 1, {})
+
+class TestMemoryIndex(unittest.TestCase):
+    def test_filtered_top_k(self):
+        snapshot = IndexSnapshot.build([
+            _row(1, 1, [1.0, 0.0]), _row(2, 2, [0.8, 0.6], level="N4"), _row(3, 3, [0.0, 1.0]),
+        ])
+        query = np.array([1.0, 0.1], dtype=np.float32)
+        hits = snapshot.search(query, 2)
+        self.assertEqual([snapshot.ids[p] for p, _ in hits], [1, 2])
+        hits = snapshot.search(query, 2, {"level": " n4 "}, ignore_case=("level",))
+        self.assertEqual([snapshot.ids[p] for p, _ in hits], [2])
+        self.assertEqual(snapshot.search(query, 2, {"level": "n4"}), [])
+    def test_apply_updates_and_appends(self):
+        snapshot = IndexSnapshot.build([_row(1, 1, [1.0, 0.0]), _row(2, 2, [0.0, 1.0])])
+        updated = snapshot.apply([_row(2, 5, [1.0, 0.0], material_id="m2"), _row(7, 6, [0.0, 1.0])])
+        self.assertEqual((len(updated), updated.version), (3, 6))
+        hits = updated.search(np.array([1.0, 0.0]), 1, {"material_id": "m2"})
+        self.assertEqual(updated.rows(hits, ("chunk_text",)), [{"chunk_text": "chunk 2"}])
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual((snapshot.version_sum, updated.version_sum), (3, 12))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+import src.core.query_metrics as query_metrics
+
+class TestQueryMetrics(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(query_metrics)
+    def test_fingerprint_strips_literals(self):
+        fp = query_metrics.fingerprint("SELECT *  FROM t\n WHERE a = 'x''y' AND b IN (1, 2, 3) AND c = %s;")
+        self.assertEqual(fp, "SELECT * FROM t WHERE a = ? AND b IN (?...) AND c = ?")
+    def test_record_and_slow_log(self):
+        metrics = query_metrics.QueryMetrics(slow_query_ms=50, slow_log_size=10)
+        metrics.record("SELECT 1", 3.0, rows=1)
+        metrics.record("SELECT 2", 80.0, rows=1, sample="SELECT 2")
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["queries"][0]["count"], 2)
+        self.assertEqual(snapshot["queries"][0]["buckets"]["le_5ms"], 1)
+        self.assertEqual(len(metrics.slow_queries()), 1)
+        self.assertEqual(metrics.slow_query(1)["sample"], "SELECT 2")
+    def test_explain_statement_keeps_set_local(self):
+        self.assertEqual(query_metrics.explain_statement("SET LOCAL hnsw.ef_search = 40; SELECT 1"),
+                         "SET LOCAL hnsw.ef_search = 40; EXPLAIN SELECT 1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import time
+import unittest
+import numpy as np
+from src.core.reranker import CrossEncoderReranker, rerank_rows
+from src.core.retrieval_cache import _skip_store
+
+class FakeModel:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+    def predict(self, pairs, show_progress_bar=False):
+        time.sleep(self.delay)
+        return np.array([float(len(text)) for _, text in pairs])
+
+def _fallback_skips_store(reranker, rows, top_k):
+    token = _skip_store.set(False)
+    try:
+        result = reranker.rerank("q", rows, top_k)
+        return result, _skip_store.get()
+    finally:
+        _skip_store.reset(token)
+
+class TestReranker(unittest.TestCase):
+    def test_disabled_passthrough(self):
+        rows = [{"chunk_text": str(i)} for i in range(5)]
+        self.assertEqual(rerank_rows("q", rows, 3), rows[:3])
+    def test_merge_keeps_unscored_tail(self):
+        reranker = CrossEncoderReranker("unused", budget_ms=100, max_length=128)
+        rows = [{"chunk_text": str(i)} for i in range(5)]
+        merged = reranker._merge(rows, np.array([0.1, 0.9, 0.5]), 3, 4, 0.0)
+        self.assertEqual([row["chunk_text"] for row in merged], ["1", "2", "0", "3"])
+    def test_budget_skip_then_probe(self):
+        reranker = CrossEncoderReranker("unused", budget_ms=100, max_length=128, probe_interval=3600)
+        reranker._model, reranker.ms_per_pair = FakeModel(), 1000.0
+        rows = [{"chunk_text": "a" * i} for i in range(1, 6)]
+        # Lượt đầu là lượt đo lại: chấm top_k ứng viên và sửa ms_per_pair
+        self.assertEqual([row["chunk_text"] for row in reranker.rerank("q", rows, 2)], ["aa", "a"])
+        self.assertLess(reranker.ms_per_pair, 1000.0)
+        reranker.ms_per_pair = 1000.0
+        result, skipped = _fallback_skips_store(reranker, rows, 2)
+        self.assertEqual((result, skipped), (rows[:2], True))
+        self.assertEqual((reranker.stats()["probes"], reranker.stats()["skipped_budget"]), (1, 1))
+    def test_timeout_falls_back_to_ann_order(self):
+        reranker = CrossEncoderReranker("unused", budget_ms=20, max_length=128)
+        reranker._model = FakeModel(delay=0.2)
+        rows = [{"chunk_text": "a" * i} for i in range(1, 4)]
+        result, skipped = _fallback_skips_store(reranker, rows, 2)
+        self.assertEqual((result, skipped), (rows[:2], True))
+        self.assertEqual(reranker.stats()["timeouts"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+from src.core.retrieval_cache import RetrievalCache, retrieval_key, retrieval_cache, cached_retrieval, cached_retrieval_many
+
+class TestRetrievalCache(unittest.TestCase):
+    def test_key_normalization(self):
+        self.assertEqual(retrieval_key("k", "t", "từ vựng  bài 5", {"level": "N5"}, 3, ("level",)),
+                         retrieval_key("k", "t", " từ vựng bài 5", {"level": " n5 "}, 3, ("level",)))
+        self.assertNotEqual(retrieval_key("k", "t", "a", None, 3), retrieval_key("k", "t", "a", None, 5))
+    def test_generation_and_lru(self):
+        cache = RetrievalCache(max_entries=2, generation_check_interval=60)
+        key = retrieval_key("k", "t", "a")
+        cache.put(key, 1, [{"chunk_text": "x"}])
+        self.assertEqual(cache.get(key, 1), (True, [{"chunk_text": "x"}]))
+        self.assertEqual(cache.get(key, 2), (False, None))
+        cache.put(retrieval_key("k", "t", "b"), 1, [])
+        cache.put(retrieval_key("k", "t", "c"), 1, [])
+        cache.put(retrieval_key("k", "t", "d"), 1, [])
+        self.assertEqual(cache.stats()["entries"], 2)
+        cache.invalidate("t")
+        self.assertEqual(cache.stats()["entries"], 0)
+    def test_empty_result_is_not_stored(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            return [] if len(calls) == 1 else [{"chunk_text": "x"}]
+        with mock.patch.object(retrieval_cache, "generation", return_value=1):
+            self.assertEqual(cached_retrieval("k", "t_empty", "a", None, 3, compute), [])
+            self.assertEqual(cached_retrieval("k", "t_empty", "a", None, 3, compute), [{"chunk_text": "x"}])
+            self.assertEqual(cached_retrieval("k", "t_empty", "a", None, 3, compute), [{"chunk_text": "x"}])
+        self.assertEqual(len(calls), 2)
+        retrieval_cache.invalidate("t_empty")
+    def test_many_shares_single_query_keys(self):
+        searched = []
+        def search_many(queries):
+            searched.append(list(queries))
+            return [[{"chunk_text": query}] for query in queries]
+        with mock.patch.object(retrieval_cache, "generation", return_value=1):
+            cached_retrieval("k", "t_many", "a", {"level": "N5"}, 3, lambda: [{"chunk_text": "cached"}], ("level",))
+            results = cached_retrieval_many("k", "t_many", ["a", "b", " b"], {"level": "n5"}, 3, search_many,
+                                            lambda query, rows: rows, ("level",))
+            self.assertEqual(cached_retrieval("k", "t_many", "b", {"level": "N5"}, 3, lambda: [], ("level",)),
+                             [{"chunk_text": "b"}])
+        self.assertEqual(results, [[{"chunk_text": "cached"}], [{"chunk_text": "b"}], [{"chunk_text": "b"}]])
+        self.assertEqual(searched, [["b"]])
+        retrieval_cache.invalidate("t_many")
+
+if __name__ == "__main__":
+    unittest.main()
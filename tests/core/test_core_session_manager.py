@@ -0,0 +1,15 @@
+import unittest
+from datetime import datetime, timezone
+import src.core.session_manager as session_manager
+
+class TestSessionManager(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(session_manager)
+    def test_session_cursor_roundtrip(self):
+        updated_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = session_manager.encode_session_cursor({"id": 42, "updated_at": updated_at})
+        self.assertEqual(session_manager.decode_session_cursor(cursor), (updated_at, 42))
+        self.assertIsNone(session_manager.decode_session_cursor("không-hợp-lệ"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import src.core.vector_store_interface as vsi
+from src.core.vector_store_interface import retrieve_many, find_precise_definitional_source_from_db
 
 class TestVectorStoreInterface(unittest.TestCase):
     def test_import(self):
@@ -8,6 +9,9 @@ class TestVectorStoreInterface(unittest.TestCase):
         if hasattr(vsi, 'get_db_connection'):
             conn = vsi.get_db_connection()
             self.assertTrue(conn is None or hasattr(conn, 'cursor'))
+    def test_empty_inputs(self):
+        self.assertEqual(retrieve_many([]), [])
+        self.assertIsNone(find_precise_definitional_source_from_db(""))
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
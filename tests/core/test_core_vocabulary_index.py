@@ -0,0 +1,29 @@
+import unittest
+from src.core.vocabulary_index import VocabularyIndex, vocabulary_key, entry_keys
+
+class TestVocabularyIndex(unittest.TestCase):
+    def test_keys(self):
+        self.assertEqual(vocabulary_key(" ｱﾒﾘｶ "), "アメリカ")
+        self.assertIsNone(vocabulary_key("  "))
+        self.assertEqual(entry_keys("磨きます[磨く]1", "みがきます"), ["磨きます[磨く]1", "みがきます", "磨きます", "磨く"])
+        self.assertEqual(entry_keys("名前", "なまえ", "お"), ["名前", "なまえ", "お名前", "おなまえ"])
+    def test_find(self):
+        index = VocabularyIndex()
+        index._build([{"id": 1, "term": "名前", "reading": "なまえ", "meaning": "tên", "honorific_prefix": "お"},
+                      {"id": 2, "term": "中", "reading": "なか", "meaning": "trong", "honorific_prefix": None}],
+                     generation=1)
+        self.assertEqual(index._find("お名前")[0]["meaning"], "tên")
+        self.assertEqual(index._find("なまえ")[0]["id"], 1)
+        self.assertEqual(index._find("本"), [])
+        # Chỉ mục được ghi kèm （お） mới tra được dạng có tiền tố
+        self.assertEqual(index._find("おなか"), [])
+    def test_failed_reload_keeps_entries(self):
+        index = VocabularyIndex()
+        index._build([{"id": 1, "term": "本", "reading": "ほん", "meaning": "sách", "honorific_prefix": None}], 1)
+        index._build([], 2)
+        self.assertEqual((index._find("本")[0]["id"], index.stats()["generation"]), (1, 1))
+        index._build([{"id": None, "term": None, "reading": None, "meaning": None, "honorific_prefix": None}], 3)
+        self.assertEqual((index._find("本"), index.stats()["generation"]), ([], 3))
+
+if __name__ == "__main__":
+    unittest.main()
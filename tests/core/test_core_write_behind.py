@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+from langchain_core.messages import HumanMessage, AIMessage
+import src.core.write_behind as write_behind
+
+class TestWriteBehind(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(write_behind)
+    def test_unseen_skips_batches_already_read(self):
+        queue = write_behind.WriteBehindQueue(writer=None, on_flushed=None, flush_interval=60, max_batch=1000)
+        queue._pending[1] = [write_behind._Batch([HumanMessage(content="q1"), AIMessage(content="a1")]),
+                             write_behind._Batch([HumanMessage(content="q2")])]
+        batches = queue.pending_batches(1)
+        batches[0].first_order = 5
+        self.assertEqual([m.content for m in queue.unseen(batches, 6)], ["q2"])
+        self.assertEqual([m.content for m in queue.unseen(batches, 4)], ["q1", "a1", "q2"])
+        queue.discard(1)
+        self.assertEqual(queue.pending_batches(1), [])
+    def test_failing_session_does_not_block_others(self):
+        class Cursor:
+            def __enter__(self): return self
+            def __exit__(self, *args): pass
+            def execute(self, sql): pass
+        class Conn:
+            def cursor(self): return Cursor()
+            def commit(self): pass
+            def rollback(self): pass
+            def close(self): pass
+        def writer(cur, sid, messages):
+            if sid == 2:
+                raise ValueError("poison")
+            return list(range(1, len(messages) + 1))
+        flushed = []
+        queue = write_behind.WriteBehindQueue(writer=writer, on_flushed=lambda sid, *args: flushed.append(sid),
+                                              flush_interval=60, max_batch=1000, max_attempts=2)
+        queue._pending[1] = [write_behind._Batch([HumanMessage(content="q1")])]
+        queue._pending[2] = [write_behind._Batch([HumanMessage(content="q2")])]
+        queue._pending_count = 2
+        with mock.patch.object(write_behind, "get_db_connection", return_value=Conn()):
+            self.assertEqual(queue.flush(), 1)
+            self.assertEqual(flushed, [1])
+            self.assertEqual(len(queue.pending_batches(2)), 1)
+            self.assertEqual(queue.flush(), 0)
+        self.assertEqual(queue.pending_batches(2), [])
+        self.assertEqual(queue.stats()["dropped_messages"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import src.data_processing.disk_embedding_cache as disk_embedding_cache
+
+def fake_encode(texts):
+    return np.array([[len(t), ord(t[0])] for t in texts], dtype=np.float32)
+
+class TestDiskEmbeddingCache(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(disk_embedding_cache)
+    def test_only_new_chunks_are_encoded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = disk_embedding_cache.DiskEmbeddingCache(directory, "org/model")
+            first = cache.encode_many(["ab", "c", "ab"], fake_encode)
+            self.assertEqual(first.tolist(), [[2, 97], [1, 99], [2, 97]])
+            reopened = disk_embedding_cache.DiskEmbeddingCache(directory, "org/model")
+            calls = []
+            second = reopened.encode_many(["c", "dde"], lambda texts: calls.append(texts) or fake_encode(texts))
+            self.assertEqual(calls, [["dde"]])
+            self.assertEqual(second.tolist(), [[1, 99], [3, 100]])
+            self.assertEqual((reopened.hits, reopened.misses), (1, 1))
+    def test_recovers_from_partial_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = disk_embedding_cache.DiskEmbeddingCache(directory, "m")
+            cache.encode_many(["a", "b"], fake_encode)
+            with open(cache.vectors_path, "ab") as f:
+                f.write(b"\0" * 8)
+            reopened = disk_embedding_cache.DiskEmbeddingCache(directory, "m")
+            self.assertEqual(len(reopened), 2)
+            self.assertEqual(os.path.getsize(reopened.vectors_path), 2 * 2 * 4)
+    def test_missing_meta_discards_orphan_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = disk_embedding_cache.DiskEmbeddingCache(directory, "m")
+            cache.encode_many(["a"], fake_encode)
+            os.remove(cache.meta_path)
+            reopened = disk_embedding_cache.DiskEmbeddingCache(directory, "m")
+            self.assertEqual(reopened.encode_many(["b"], fake_encode).tolist(), [[1, 98]])
+            self.assertEqual(len(disk_embedding_cache.DiskEmbeddingCache(directory, "m")), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,11 @@ class TestVocabularyParser(unittest.TestCase):
         if hasattr(vocabulary_parser, 'parse_vocabulary'):
             result = vocabulary_parser.parse_vocabulary('')
             self.assertIsInstance(result, list)
+    def test_parse_line_keeps_honorific_prefix(self):
+        parser = vocabulary_parser.VocabularyParser()
+        item = parser._parse_line("（お）名前 （お）なまえ tên")
+        self.assertEqual((item["từ vựng"], item["cách đọc"], item["tiền tố"]), ("名前", "なまえ", "お"))
+        self.assertIsNone(parser._parse_line("中 なか bên trong")["tiền tố"])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,18 @@
+import unittest
+from src.data_processing.vocabulary_loader import course_for_page, vocabulary_records
+
+class TestVocabularyLoader(unittest.TestCase):
+    def test_course_for_page(self):
+        courses = [{"course_id": "JPD113", "start_page": 1, "end_page": 11},
+                   {"course_id": "JPD123", "start_page": 12, "end_page": "all"}]
+        self.assertEqual(course_for_page(courses, 11), "JPD113")
+        self.assertEqual(course_for_page(courses, 40), "JPD123")
+    def test_vocabulary_records(self):
+        items = [{"từ vựng": "名前", "cách đọc": "なまえ", "nghĩa": "tên ", "lesson": "第1課", "chapter": None, "page": 2,
+                  "tiền tố": "お"},
+                 {"từ vựng": None, "cách đọc": "", "nghĩa": "x", "lesson": None, "chapter": None, "page": 2}]
+        records = vocabulary_records(items, "a.pdf", "n5", [{"course_id": "JPD113", "start_page": 1, "end_page": 11}])
+        self.assertEqual(records, [("名前", "なまえ", "tên", "第1課", None, "JPD113", "N5", "a.pdf", 2, "お")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,12 @@
+import unittest
+import src.dbtools.migrations as migrations
+
+class TestMigrations(unittest.TestCase):
+    def test_import(self):
+        self.assertIsNotNone(migrations)
+    def test_versions_ordered_and_unique(self):
+        versions = [m.version for m in migrations.MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+
+if __name__ == "__main__":
+    unittest.main()